@@ -37,14 +37,84 @@ class Settings(BaseSettings):
     MAX_CHAT_TURNS: int = 60
     MAX_RETRIES: int = 5
     E2B_API_KEY: Optional[str] = None
+    # E2B 沙箱文件同步：并发上传/下载数，超过该大小（MB）的文件分块流式传输
+    E2B_SYNC_CONCURRENCY: int = 4
+    E2B_SYNC_STREAM_MB: int = 8
+    # E2B 沙箱池：预创建的沙箱数量（0 关闭），沙箱存活时间（秒），任务结束后是否重置沙箱放回池中复用（仅适合单租户部署）
+    E2B_POOL_SIZE: int = 1
+    E2B_SANDBOX_TIMEOUT: int = 3000
+    E2B_POOL_RECYCLE: bool = False
     LANGUAGE: str = "zh"
     LOG_LEVEL: str = "DEBUG"
     DEBUG: bool = True
     REDIS_URL: str = "redis://redis:6379/0"
     REDIS_MAX_CONNECTIONS: int = 10
+    # Redis 后台健康检查间隔（秒）
+    REDIS_HEALTH_CHECK_INTERVAL: float = 15.0
+    # 每个任务事件流保留的最大消息数（近似裁剪）
+    REDIS_STREAM_MAXLEN: int = 5000
+    # 每个 WebSocket 连接的待发送队列长度，满时关闭连接，客户端经 last_id 重连补回
+    WS_SEND_QUEUE_SIZE: int = 1000
     CORS_ALLOW_ORIGINS: Annotated[list[str] | str, BeforeValidator(parse_cors)] = "*"
     SERVER_HOST: str = "http://localhost:8000"
     OPENALEX_EMAIL: Optional[str] = None
+    # OpenAlex 文献检索：请求超时（秒）与重试次数，检索结果缓存到磁盘（TTL 秒、容量 MB）
+    OPENALEX_BASE_URL: str = "https://api.openalex.org"
+    OPENALEX_TIMEOUT: float = 20.0
+    OPENALEX_MAX_RETRIES: int = 3
+    OPENALEX_CACHE_DIR: str = "cache/openalex"
+    OPENALEX_CACHE_TTL: float = 7 * 24 * 3600
+    OPENALEX_CACHE_MAX_MB: int = 64
+    # 文献检索后端：remote 只用 OpenAlex；local 先查本地索引，未命中回退 OpenAlex；
+    # local-only 只查本地索引（离线部署）。索引由 python -m app.tools.literature_index build 生成
+    LITERATURE_BACKEND: str = "remote"
+    LITERATURE_INDEX_DIR: str = "data/literature_index"
+    # 本地结果的最低 BM25 得分，低于该分数视为未命中
+    LITERATURE_MIN_SCORE: float = 1.0
+    # LLM 流式输出：边生成边推送增量片段到前端，推送间隔（秒）
+    LLM_STREAM: bool = True
+    LLM_STREAM_FLUSH_INTERVAL: float = 0.3
+    # 对话历史的 token 预算占模型上下文长度的比例；litellm 未收录的模型按此上下文长度估算
+    MEMORY_TOKEN_RATIO: float = 0.6
+    LLM_CONTEXT_WINDOW: int = 64000
+    # LLM 重试：最大退避（秒）、每个任务的基础重试预算、熔断阈值（连续失败次数）与冷却（秒）
+    LLM_RETRY_MAX_DELAY: float = 30.0
+    LLM_RETRY_BUDGET: int = 20
+    LLM_BREAKER_THRESHOLD: int = 5
+    LLM_BREAKER_COOLDOWN: float = 30.0
+    # LLM 限流（按 base_url + model，进程内所有任务共享）：最大并发请求数、每分钟请求数、
+    # 每分钟 token 数（0 表示不限）；LLM_PROVIDER_LIMITS 按模型名覆盖，如
+    # {"deepseek/deepseek-chat": {"concurrency": 4, "rpm": 60, "tpm": 200000}}
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_RPM: int = 0
+    LLM_TPM: int = 0
+    LLM_PROVIDER_LIMITS: dict[str, dict[str, int]] = {}
+    # LLM 共享 HTTP 连接池：是否启用、HTTP/2（需安装 h2）、每个上游主机的最大连接数、空闲连接保活秒数
+    LLM_HTTP_POOL: bool = True
+    LLM_HTTP2: bool = True
+    LLM_HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    # 任务启动前模型配置校验通过后的缓存时间（秒），期间再次启动任务不再请求上游；保存 API 配置时失效
+    MODEL_VALIDATION_TTL: float = 1800.0
+    # LLM 响应缓存：off | read-write | replay-only（只读缓存，未命中报错、不访问网络）
+    LLM_CACHE_MODE: str = "off"
+    LLM_CACHE_DIR: str = "cache/llm"
+    LLM_CACHE_MAX_MB: int = 512
+    # 求解阶段：sequential 共用一个代码手依次求解、写作；pipeline 共用一个代码手，
+    # 论文手写作与下一小节求解重叠；parallel 按依赖并发求解互不依赖的小节（同样流水线写作）。
+    # 默认 sequential，需要时在 .env.dev 中开启
+    SOLUTION_MODE: str = "sequential"
+    MAX_PARALLEL_SECTIONS: int = 3
+    # 流水线模式下已求解、等待写作的小节数上限
+    WRITER_QUEUE_SIZE: int = 2
+    # 写作阶段（摘要、问题重述、模型假设等）：sequential 共用一个论文手依次撰写；
+    # fanout 各部分使用独立的论文手并发撰写（并发请求数受 LLM_MAX_CONCURRENCY 限制）
+    WRITE_FLOWS_MODE: str = "sequential"
+    # 开启调试追踪的任务 id（逗号分隔，"*" 表示全部），运行时可通过 /trace 接口调整
+    TRACE_TASKS: str = ""
+    # 本地 Jupyter 内核池：预热数量（0 关闭），归还后是否重置复用
+    KERNEL_POOL_SIZE: int = 2
+    KERNEL_POOL_RECYCLE: bool = False
 
     model_config = SettingsConfigDict(
         env_file=".env.dev",
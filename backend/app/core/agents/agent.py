@@ -1,11 +1,21 @@
+import asyncio
 from app.core.llm.llm import LLM, simple_chat
+from app.core.llm.tokens import context_window, history_tokens, message_tokens
+from app.core.llm.history import HistoryIndex
+from app.config.setting import settings
 from app.utils.log_util import logger
-from icecream import ic
+from app.utils.trace import trace
 from app.services.task_control import TaskControl
 
-# TODO: Memory 的管理
 # TODO: 评估任务完成情况，rethinking
 
+# 历史 token 超过预算的该比例时，在后台提前总结较早的消息
+PRESUMMARY_RATIO = 0.7
+# 压缩后保留的最近消息所占预算比例
+TAIL_RATIO = 0.4
+# 截断较早的工具输出时保留的字符数
+TOOL_OUTPUT_KEEP_CHARS = 500
+
 
 class Agent:
     def __init__(
@@ -13,7 +23,8 @@ class Agent:
         task_id: str,
         model: LLM,
         max_chat_turns: int = 30,  # 单个agent最大对话轮次
-        max_memory: int = 12,  # 最大记忆轮次
+        max_memory: int = 12,  # 无法估算 token 时的后备阈值（消息条数）
+        max_context_tokens: int | None = None,  # 对话历史的 token 预算
     ) -> None:
         self.task_id = task_id
         self.model = model
@@ -21,6 +32,13 @@ class Agent:
         self.max_chat_turns = max_chat_turns  # 最大对话轮次
         self.current_chat_turns = 0  # 当前对话轮次计数器
         self.max_memory = max_memory  # 最大记忆轮次
+        # 默认取模型上下文长度的一定比例，为输出与工具定义留出空间
+        self.max_context_tokens = max_context_tokens or int(
+            context_window(model.model) * settings.MEMORY_TOKEN_RATIO
+        )
+        self._summary_task: asyncio.Task | None = None
+        self._history_index = HistoryIndex()  # 工具调用完整性索引，随历史增量更新
+        self._summary_range: tuple[dict, dict] | None = None  # 被总结的首尾消息
 
     async def _pause_guard(self):
         """若任务被暂停，在此阻塞直到继续。"""
@@ -61,32 +79,209 @@ class Agent:
             return error_msg
 
     async def append_chat_history(self, msg: dict) -> None:
-        ic(f"添加消息: role={msg.get('role')}, 当前历史长度={len(self.chat_history)}")
+        trace(self.task_id, "添加消息: role=%s, 当前历史长度=%d", msg.get("role"), len(self.chat_history))
         self.chat_history.append(msg)
-        ic(f"添加后历史长度={len(self.chat_history)}")
+        trace(self.task_id, "添加后历史长度=%d", len(self.chat_history))
 
         # 只有在添加非tool消息时才进行内存清理，避免在工具调用期间破坏消息结构
         if msg.get("role") != "tool":
-            ic("触发内存清理")
+            trace(self.task_id, "触发内存清理")
             await self.clear_memory()
         else:
-            ic("跳过内存清理(tool消息)")
+            trace(self.task_id, "跳过内存清理(tool消息)")
 
     async def clear_memory(self):
-        """当聊天历史超过最大记忆轮次时，使用 simple_chat 进行总结压缩"""
-        ic(f"检查内存清理: 当前={len(self.chat_history)}, 最大={self.max_memory}")
+        """按 token 预算压缩对话历史
+
+        1. 超过预算的 PRESUMMARY_RATIO 时，在后台提前总结较早的消息，不阻塞对话
+        2. 超过预算时，先截断较早的工具输出
+        3. 仍超出则用后台总结替换较早的消息；总结尚未就绪时等待其完成（没有则立即总结），
+           替换后仍超出再对剩余的较早消息总结一次
+        4. 只有总结失败或无可总结的消息时才丢弃最早的消息
+        系统消息与第一条用户消息（任务提示）始终保留，切割点保证工具调用完整
+        """
+        model = self.model.model
+        try:
+            tokens = history_tokens(model, self.chat_history)
+        except Exception as e:
+            logger.warning(f"估算历史 token 失败，按消息条数压缩: {e}")
+            await self._compact_by_count()
+            return
+
+        budget = self.max_context_tokens
+        trace(self.task_id, "检查内存清理: 当前 token=%d, 预算=%d", tokens, budget)
+        if tokens > budget * PRESUMMARY_RATIO:
+            self._schedule_summary()
+        if tokens <= budget:
+            return
+
+        logger.info(
+            f"{self.__class__.__name__}:历史超出 token 预算（{tokens}/{budget}），开始压缩"
+        )
+        tokens = self._truncate_tool_outputs(tokens, budget)
+        if tokens <= budget:
+            logger.info(f"{self.__class__.__name__}:截断工具输出后为 {tokens} token")
+            return
+
+        if self._apply_summary():
+            tokens = history_tokens(model, self.chat_history)
+            logger.info(f"{self.__class__.__name__}:应用后台总结后为 {tokens} token")
+            if tokens <= budget:
+                return
+
+        for _ in range(2):
+            if not await self._summarize_now():
+                break
+            tokens = history_tokens(model, self.chat_history)
+            logger.info(f"{self.__class__.__name__}:总结后为 {tokens} token")
+            if tokens <= budget:
+                return
+
+        self._drop_oldest(budget)
+        logger.warning(
+            f"{self.__class__.__name__}:总结后仍超出预算，丢弃最早的消息，剩余 {len(self.chat_history)} 条"
+        )
+
+    async def _summarize_now(self) -> bool:
+        """等待进行中的后台总结（没有则立即发起）并应用，返回是否压缩了历史"""
+        self._schedule_summary()
+        task = self._summary_task
+        if task is None:
+            return False
+        if not task.done():
+            logger.info(f"{self.__class__.__name__}:等待总结完成")
+            await asyncio.wait([task])
+        return self._apply_summary()
+
+    def _history_start(self) -> int:
+        """第一条可压缩消息的位置：跳过开头的系统消息与第一条用户消息（任务提示）"""
+        start = 0
+        while start < len(self.chat_history) and self.chat_history[start].get("role") == "system":
+            start += 1
+        if start < len(self.chat_history) and self.chat_history[start].get("role") == "user":
+            start += 1
+        return start
+
+    def _tail_start(self, tail_budget: int) -> int:
+        """从后往前累计 token，返回不超过 tail_budget 的最近消息的起始位置（安全切割点）"""
+        model = self.model.model
+        start = self._history_start()
+        total = 0
+        cut = len(self.chat_history)
+        while cut > start:
+            total += message_tokens(model, self.chat_history[cut - 1])
+            if total > tail_budget:
+                break
+            cut -= 1
+        # 向后移动到安全切割点，避免产生孤立的 tool 消息
+        safe = self._index().nearest_safe_cut(cut, backward=False)
+        return len(self.chat_history) if safe is None else safe
+
+    def _schedule_summary(self):
+        """在后台总结较早的消息，结果由 _apply_summary 使用"""
+        if self._summary_task is not None:
+            if not self._summary_task.done() or self._summary_is_valid():
+                return
+        start = self._history_start()
+        end = self._tail_start(int(self.max_context_tokens * TAIL_RATIO))
+        if end - start < 2:
+            return
+        snapshot = self.chat_history[start:end]
+        # 总结请求只带上开头的系统消息，任务提示不作为系统消息发送
+        summarize_history = []
+        for msg in self.chat_history[:start]:
+            if msg.get("role") != "system":
+                break
+            summarize_history.append(msg)
+        summarize_history.append(
+            {
+                "role": "user",
+                "content": f"请简洁总结以下对话的关键内容和重要结论，保留重要的上下文信息：\n\n{self._format_history_for_summary(snapshot)}",
+            }
+        )
+        self._summary_range = (snapshot[0], snapshot[-1])
+        self._summary_task = asyncio.create_task(simple_chat(self.model, summarize_history))
+        logger.info(f"{self.__class__.__name__}:后台总结前 {len(snapshot)} 条消息")
+
+    def _summary_is_valid(self) -> bool:
+        """被总结的消息仍位于历史开头（期间没有被丢弃或替换）"""
+        if self._summary_range is None:
+            return False
+        start = self._history_start()
+        first, _ = self._summary_range
+        return start < len(self.chat_history) and self.chat_history[start] is first
+
+    def _apply_summary(self) -> bool:
+        task = self._summary_task
+        if task is None or not task.done():
+            return False
+        self._summary_task = None
+        try:
+            summary = task.result()
+        except Exception as e:
+            logger.error(f"后台总结失败: {e}")
+            return False
+        if not self._summary_is_valid():
+            return False
+        _, last = self._summary_range
+        end = next(
+            (i + 1 for i, msg in enumerate(self.chat_history) if msg is last), None
+        )
+        if end is None:
+            return False
+
+        new_history = self.chat_history[: self._history_start()]
+        new_history.append({"role": "assistant", "content": f"[历史对话总结] {summary}"})
+        new_history.extend(self.chat_history[end:])
+        self.chat_history = new_history
+        self._summary_range = None
+        return True
+
+    def _truncate_tool_outputs(self, tokens: int, budget: int) -> int:
+        """从最早开始截断过长的工具输出（保留最近的消息），返回截断后的 token 数"""
+        model = self.model.model
+        protect_from = self._tail_start(int(budget * TAIL_RATIO))
+        for msg in self.chat_history[:protect_from]:
+            if tokens <= budget:
+                break
+            content = msg.get("content")
+            if msg.get("role") != "tool" or not isinstance(content, str):
+                continue
+            if len(content) <= TOOL_OUTPUT_KEEP_CHARS:
+                continue
+            before = message_tokens(model, msg)
+            # 原地修改，保持消息对象不变，后台总结的定位依然有效
+            msg["content"] = (
+                content[:TOOL_OUTPUT_KEEP_CHARS]
+                + f"\n...[工具输出过长，已省略 {len(content) - TOOL_OUTPUT_KEEP_CHARS} 字符]"
+            )
+            tokens -= before - message_tokens(model, msg)
+        return tokens
+
+    def _drop_oldest(self, budget: int):
+        cut = self._tail_start(int(budget * TAIL_RATIO))
+        if cut >= len(self.chat_history):
+            # 连最后一条都放不下时，至少保留安全的后备历史
+            self.chat_history = self._get_safe_fallback_history()
+            return
+        self.chat_history = self.chat_history[: self._history_start()] + self.chat_history[cut:]
+
+    async def _compact_by_count(self):
+        """后备策略：聊天历史超过最大记忆轮次时，使用 simple_chat 同步总结压缩"""
+        trace(self.task_id, "检查内存清理: 当前=%d, 最大=%d", len(self.chat_history), self.max_memory)
 
         if len(self.chat_history) <= self.max_memory:
-            ic("无需清理内存")
+            trace(self.task_id, "无需清理内存")
             return
 
-        ic("开始内存清理")
+        trace(self.task_id, "开始内存清理")
         logger.info(
             f"{self.__class__.__name__}:开始清除记忆，当前记录数：{len(self.chat_history)}"
         )
 
         try:
-            # 保留第一条系统消息
+            # 保留系统消息与第一条用户消息（任务提示）
+            head = self._history_start()
             system_msg = (
                 self.chat_history[0]
                 if self.chat_history and self.chat_history[0]["role"] == "system"
@@ -95,12 +290,12 @@ class Agent:
 
             # 查找需要保留的消息范围 - 保留最后几条完整的对话和工具调用
             preserve_start_idx = self._find_safe_preserve_point()
-            ic(f"保留起始索引: {preserve_start_idx}")
+            trace(self.task_id, "保留起始索引: %d", preserve_start_idx)
 
             # 确定需要总结的消息范围
-            start_idx = 1 if system_msg else 0
+            start_idx = head
             end_idx = preserve_start_idx
-            ic(f"总结范围: {start_idx} -> {end_idx}")
+            trace(self.task_id, "总结范围: %d -> %d", start_idx, end_idx)
 
             if end_idx > start_idx:
                 # 构造总结提示
@@ -118,10 +313,8 @@ class Agent:
                 # 调用 simple_chat 进行总结
                 summary = await simple_chat(self.model, summarize_history)
 
-                # 重构聊天历史：系统消息 + 总结 + 保留的消息
-                new_history = []
-                if system_msg:
-                    new_history.append(system_msg)
+                # 重构聊天历史：系统消息与任务提示 + 总结 + 保留的消息
+                new_history = list(self.chat_history[:head])
 
                 new_history.append(
                     {"role": "assistant", "content": f"[历史对话总结] {summary}"}
@@ -131,7 +324,7 @@ class Agent:
                 new_history.extend(self.chat_history[preserve_start_idx:])
 
                 self.chat_history = new_history
-                ic(f"内存清理完成，新历史长度: {len(self.chat_history)}")
+                trace(self.task_id, "内存清理完成，新历史长度: %d", len(self.chat_history))
                 logger.info(
                     f"{self.__class__.__name__}:记忆清除完成，压缩至：{len(self.chat_history)}条记录"
                 )
@@ -144,93 +337,48 @@ class Agent:
             safe_history = self._get_safe_fallback_history()
             self.chat_history = safe_history
 
+    def _index(self) -> HistoryIndex:
+        return self._history_index.sync(self.chat_history)
+
     def _find_safe_preserve_point(self) -> int:
         """找到安全的保留起始点，确保不会破坏工具调用序列"""
         # 最少保留最后3条消息，确保基本对话完整性
         min_preserve = min(3, len(self.chat_history))
         preserve_start = len(self.chat_history) - min_preserve
-        ic(
-            f"寻找安全保留点: 历史长度={len(self.chat_history)}, 最少保留={min_preserve}, 开始位置={preserve_start}"
-        )
 
         # 从后往前查找，确保不会在工具调用序列中间切断
-        for i in range(preserve_start, -1, -1):
-            if i >= len(self.chat_history):
-                continue
-
-            # 检查从这个位置开始是否是安全的（没有孤立的tool消息）
-            is_safe = self._is_safe_cut_point(i)
-            ic(f"检查位置 {i}: 安全={is_safe}")
-            if is_safe:
-                ic(f"找到安全保留点: {i}")
-                return i
+        cut = self._index().nearest_safe_cut(preserve_start, backward=True)
+        if cut is not None:
+            trace(self.task_id, "找到安全保留点: %d", cut)
+            return cut
 
         # 如果找不到安全点，至少保留最后1条消息
         fallback = len(self.chat_history) - 1
-        ic(f"未找到安全点，使用备用位置: {fallback}")
+        trace(self.task_id, "未找到安全点，使用备用位置: %d", fallback)
         return fallback
 
     def _is_safe_cut_point(self, start_idx: int) -> bool:
         """检查从指定位置开始切割是否安全（不会产生孤立的tool消息）"""
-        if start_idx >= len(self.chat_history):
-            ic(f"切割点 {start_idx} >= 历史长度，安全")
-            return True
-
-        # 检查切割后的消息序列是否有孤立的tool消息
-        tool_messages = []
-        for i in range(start_idx, len(self.chat_history)):
-            msg = self.chat_history[i]
-            if isinstance(msg, dict) and msg.get("role") == "tool":
-                tool_call_id = msg.get("tool_call_id")
-                tool_messages.append((i, tool_call_id))
-                ic(f"发现tool消息在位置 {i}, tool_call_id={tool_call_id}")
-
-                # 向前查找对应的tool_calls消息
-                if tool_call_id:
-                    found_tool_call = False
-                    for j in range(start_idx, i):
-                        prev_msg = self.chat_history[j]
-                        if (
-                            isinstance(prev_msg, dict)
-                            and "tool_calls" in prev_msg
-                            and prev_msg["tool_calls"]
-                        ):
-                            for tool_call in prev_msg["tool_calls"]:
-                                if tool_call.get("id") == tool_call_id:
-                                    found_tool_call = True
-                                    ic(f"找到对应的tool_call在位置 {j}")
-                                    break
-                            if found_tool_call:
-                                break
-
-                    if not found_tool_call:
-                        ic(
-                            f"❌ tool消息 {tool_call_id} 没有找到对应的tool_call，切割点不安全"
-                        )
-                        return False
-
-        ic(f"切割点 {start_idx} 安全，检查了 {len(tool_messages)} 个tool消息")
-        return True
+        return self._index().is_safe_cut(start_idx)
 
     def _get_safe_fallback_history(self) -> list:
         """获取安全的后备历史记录，确保不会有孤立的tool消息"""
         if not self.chat_history:
             return []
 
-        # 保留系统消息
-        safe_history = []
-        if self.chat_history and self.chat_history[0]["role"] == "system":
-            safe_history.append(self.chat_history[0])
+        # 保留系统消息与任务提示
+        head = self._history_start()
+        safe_history = list(self.chat_history[:head])
 
         # 从后往前查找安全的消息序列
-        for preserve_count in range(1, min(4, len(self.chat_history)) + 1):
+        for preserve_count in range(1, min(4, len(self.chat_history) - head) + 1):
             start_idx = len(self.chat_history) - preserve_count
             if self._is_safe_cut_point(start_idx):
                 safe_history.extend(self.chat_history[start_idx:])
                 return safe_history
 
         # 如果都不安全，只保留最后一条非tool消息
-        for i in range(len(self.chat_history) - 1, -1, -1):
+        for i in range(len(self.chat_history) - 1, head - 1, -1):
             msg = self.chat_history[i]
             if isinstance(msg, dict) and msg.get("role") != "tool":
                 safe_history.append(msg)
@@ -240,52 +388,22 @@ class Agent:
 
     def _find_last_unmatched_tool_call(self) -> int | None:
         """查找最后一个未匹配的tool call的索引"""
-        ic("开始查找未匹配的tool_call")
-
-        # 从后往前查找，寻找没有对应tool response的tool call
-        for i in range(len(self.chat_history) - 1, -1, -1):
-            msg = self.chat_history[i]
-
-            # 检查是否是包含tool_calls的消息
-            if isinstance(msg, dict) and "tool_calls" in msg and msg["tool_calls"]:
-                ic(f"在位置 {i} 发现tool_calls消息")
-
-                # 检查每个tool call是否都有对应的response
-                for tool_call in msg["tool_calls"]:
-                    tool_call_id = tool_call.get("id")
-                    ic(f"检查tool_call_id: {tool_call_id}")
-
-                    if tool_call_id:
-                        # 在后续消息中查找对应的tool response
-                        response_found = False
-                        for j in range(i + 1, len(self.chat_history)):
-                            response_msg = self.chat_history[j]
-                            if (
-                                isinstance(response_msg, dict)
-                                and response_msg.get("role") == "tool"
-                                and response_msg.get("tool_call_id") == tool_call_id
-                            ):
-                                ic(f"找到匹配的tool响应在位置 {j}")
-                                response_found = True
-                                break
-
-                        if not response_found:
-                            # 找到未匹配的tool call
-                            ic(f"❌ 发现未匹配的tool_call在位置 {i}, id={tool_call_id}")
-                            return i
-
-        ic("没有发现未匹配的tool_call")
-        return None
+        return self._index().last_unmatched_call()
 
     def _format_history_for_summary(self, history: list[dict]) -> str:
         """格式化历史记录用于总结"""
         formatted = []
         for msg in history:
             role = msg["role"]
+            content = msg.get("content") or ""
+            if not content and msg.get("tool_calls"):
+                # 只有工具调用的消息，记录调用参数
+                content = "; ".join(
+                    str((tc.get("function") or {}).get("arguments", ""))
+                    for tc in msg["tool_calls"]
+                )
             content = (
-                msg["content"][:500] + "..."
-                if len(msg["content"]) > 500
-                else msg["content"]
+                content[:500] + "..." if len(content) > 500 else content
             )  # 限制长度
             formatted.append(f"{role}: {content}")
         return "\n".join(formatted)
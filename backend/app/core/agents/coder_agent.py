@@ -11,7 +11,6 @@ from app.utils.common_utils import get_current_files
 import json
 from app.core.prompts import get_reflection_prompt, get_completion_check_prompt
 from app.core.functions import coder_tools
-from icecream import ic
 import re
 import uuid
 import ast
@@ -512,7 +511,7 @@ class CoderAgent(Agent):  # 同样继承自Agent类
                     except Exception:
                         pass
                     return CoderToWriter(
-                        coder_response=assistant_content,
+                        code_response=assistant_content,
                         created_images=await self.code_interpreter.get_created_images(
                             subtask_title
                         ),
@@ -537,7 +536,7 @@ class CoderAgent(Agent):  # 同样继承自Agent类
         except Exception:
             pass
         return CoderToWriter(
-            coder_response=response.choices[0].message.content,
+            code_response=response.choices[0].message.content,
             created_images=await self.code_interpreter.get_created_images(
                 subtask_title
             ),
@@ -5,7 +5,7 @@ from app.schemas.A2A import CoordinatorToModeler, ModelerToCoder
 from app.utils.log_util import logger
 from app.config.setting import settings
 import json
-from icecream import ic
+from app.utils.trace import trace
 from app.services.task_control import TaskControl
 
 # TODO: 提问工具tool
@@ -59,7 +59,7 @@ class ModelerAgent(Agent):  # 继承自Agent类
                         # 值必须是字符串
                         value_type_issue = [k for k, v in data.items() if not isinstance(v, str)]
                         if not missing and not value_type_issue:
-                            ic(data)
+                            trace(self.task_id, "建模输出: %s", data)
                             # 将助手输出加入对话历史，便于后续结合“用户反馈”继续对话
                             try:
                                 await self.append_chat_history({
@@ -8,7 +8,7 @@ from app.services.redis_manager import redis_manager
 from app.schemas.response import SystemMessage, WriterMessage
 import json
 from app.core.functions import writer_tools
-from icecream import ic
+from app.utils.trace import trace
 from app.schemas.A2A import WriterResponse
 from app.services.task_control import TaskControl
 
@@ -122,7 +122,8 @@ class WriterAgent(Agent):  # 同样继承自Agent类
 
                     # 更新对话历史 - 添加助手的响应
                     await self.append_chat_history(msg.model_dump())
-                    ic(msg.model_dump())
+                    if trace.enabled(self.task_id):
+                        trace(self.task_id, "工具调用消息: %s", msg.model_dump())
 
                     try:
                         papers = await self.scholar.search_papers(query)
@@ -58,6 +58,19 @@ class Flows:
         }
         return flows
 
+    def get_solution_dependencies(self, solution_flows: dict) -> dict[str, list[str]]:
+        """求解小节之间的依赖：各问题依赖 eda，灵敏度分析依赖所有问题"""
+        ques_keys = [key for key in solution_flows if key.startswith("ques")]
+        dependencies = {}
+        for key in solution_flows:
+            if key == "eda":
+                dependencies[key] = []
+            elif key == "sensitivity_analysis":
+                dependencies[key] = ques_keys
+            else:
+                dependencies[key] = ["eda"] if "eda" in solution_flows else []
+        return dependencies
+
     def get_write_flows(
         self, user_output: UserOutput, config_template: dict, bg_ques_all: str
     ):
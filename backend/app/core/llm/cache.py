@@ -0,0 +1,101 @@
+import hashlib
+import json
+from litellm import ModelResponse
+from app.config.setting import settings
+from app.utils.disk_cache import DiskCache
+from app.utils.log_util import logger
+
+
+class LLMCacheMiss(RuntimeError):
+    """replay-only 模式下缓存未命中"""
+
+
+def _jsonable(obj):
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "value"):  # Enum
+        return obj.value
+    return str(obj)
+
+
+class LLMCache:
+    """以请求内容哈希为键的 LLM 响应缓存
+
+    模式（settings.LLM_CACHE_MODE）：
+    - off: 不使用缓存
+    - read-write: 命中直接返回，未命中请求上游并写入
+    - replay-only: 只读缓存，未命中抛出 LLMCacheMiss，不访问网络
+    """
+
+    MODES = ("off", "read-write", "replay-only")
+
+    def __init__(self, mode: str | None = None, directory: str | None = None):
+        mode = settings.LLM_CACHE_MODE if mode is None else mode
+        if mode not in self.MODES:
+            logger.warning(f"未知的 LLM_CACHE_MODE: {mode}，按 off 处理")
+            mode = "off"
+        self.mode = mode
+        self.store = DiskCache(
+            directory or settings.LLM_CACHE_DIR,
+            max_bytes=settings.LLM_CACHE_MAX_MB * 1024 * 1024,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def writable(self) -> bool:
+        return self.mode == "read-write"
+
+    @staticmethod
+    def make_key(
+        model: str,
+        messages: list,
+        tools: list | None = None,
+        tool_choice: str | None = None,
+        top_p: float | None = None,
+    ) -> str:
+        """对请求做规范化序列化（键排序、紧凑分隔）后取 sha256"""
+        canonical = json.dumps(
+            {
+                "model": model,
+                "messages": messages,
+                "tools": tools,
+                "tool_choice": tool_choice,
+                "top_p": top_p,
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=_jsonable,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> ModelResponse | None:
+        if not self.enabled:
+            return None
+        data = await self.store.aget(key)
+        if data is None:
+            if self.mode == "replay-only":
+                raise LLMCacheMiss(f"replay-only 模式下缓存未命中: {key}")
+            return None
+        logger.info(f"LLM 缓存命中: {key[:12]}")
+        return ModelResponse(**data)
+
+    async def set(self, key: str, response):
+        if not self.writable or not isinstance(response, ModelResponse):
+            return
+        if not response.choices:
+            return
+        try:
+            await self.store.aset(key, response.model_dump())
+        except Exception as e:
+            # 缓存写入失败不影响主流程
+            logger.warning(f"写入 LLM 缓存失败: {e}")
+
+    def metrics(self) -> dict:
+        return {"mode": self.mode, **self.store.metrics()}
+
+
+llm_cache = LLMCache()
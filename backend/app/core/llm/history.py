@@ -0,0 +1,153 @@
+"""对话历史中工具调用完整性的线性时间检查
+
+OpenAI 风格的历史要求每个 assistant 的 tool_call 都有对应的 tool 响应，
+每条 tool 响应之前都有对应的 tool_call。这里用 id→位置 的索引代替逐条向前/
+向后扫描，修复、完整性判断与切割点查询都不再是平方复杂度。
+"""
+
+INF = float("inf")
+
+
+def _tool_calls(msg) -> list:
+    if isinstance(msg, dict):
+        return msg.get("tool_calls") or []
+    return []
+
+
+def _is_tool_response(msg) -> bool:
+    return isinstance(msg, dict) and msg.get("role") == "tool"
+
+
+def fix_tool_calls(history: list) -> list:
+    """移除没有响应的 tool_call 与没有对应调用的 tool 响应，O(n)
+
+    - tool_call 只有在其后存在同 id 的 tool 响应时才保留
+    - 一条消息的 tool_call 全部无效时去掉 tool_calls，内容为空则整条移除
+    - tool 响应只有在之前保留了同 id 的 tool_call 时才保留
+    """
+    # 每个 id 最后一条响应的位置：调用位置早于它即说明其后有响应
+    last_response: dict[str, int] = {}
+    for j, msg in enumerate(history):
+        if _is_tool_response(msg) and msg.get("tool_call_id"):
+            last_response[msg["tool_call_id"]] = j
+
+    fixed: list = []
+    kept_ids: set[str] = set()
+    for i, msg in enumerate(history):
+        tool_calls = _tool_calls(msg)
+        if tool_calls:
+            valid = [
+                tc
+                for tc in tool_calls
+                if tc.get("id") and last_response.get(tc["id"], -1) > i
+            ]
+            if valid:
+                if len(valid) == len(tool_calls):
+                    fixed.append(msg)
+                else:
+                    fixed_msg = msg.copy()
+                    fixed_msg["tool_calls"] = valid
+                    fixed.append(fixed_msg)
+                kept_ids.update(tc["id"] for tc in valid)
+            else:
+                cleaned = {k: v for k, v in msg.items() if k != "tool_calls"}
+                if cleaned.get("content"):
+                    fixed.append(cleaned)
+        elif _is_tool_response(msg):
+            if msg.get("tool_call_id") in kept_ids:
+                fixed.append(msg)
+        else:
+            fixed.append(msg)
+    return fixed
+
+
+class HistoryIndex:
+    """对话历史的增量索引
+
+    调用 sync(history) 与历史列表对齐：列表只追加时只索引新增的消息，
+    被替换（压缩、重建）时整体重建。之后可以 O(1) 判断历史是否完整，
+    O(1) 判断某位置能否作为切割点（切割点查询表在追加后首次查询时 O(n) 重建）。
+    """
+
+    def __init__(self):
+        self._reset(None)
+
+    def _reset(self, history: list | None):
+        self._history = history
+        self._n = 0
+        self._last = None
+        self._call_pos: dict[str, int] = {}  # id -> 最近一次调用的位置
+        self._pending: dict[str, int] = {}  # 尚无响应的调用 id -> 位置
+        self._orphans = 0  # 之前没有对应调用的 tool 响应数
+        self._malformed = 0  # 缺少 id 的调用/响应数
+        self._prev_call: list[float] = []  # 每条 tool 响应对应调用的位置，其他消息为 INF
+        self._suffix_min: list[float] | None = None
+
+    def sync(self, history: list) -> "HistoryIndex":
+        n = self._n
+        if (
+            history is not self._history
+            or len(history) < n
+            or (n and history[n - 1] is not self._last)
+        ):
+            self._reset(history)
+            n = 0
+        for msg in history[n:]:
+            self._append(msg)
+        return self
+
+    def _append(self, msg):
+        i = self._n
+        prev = INF
+        for tc in _tool_calls(msg):
+            tc_id = tc.get("id")
+            if not tc_id:
+                self._malformed += 1
+                continue
+            self._call_pos[tc_id] = i
+            self._pending[tc_id] = i
+        if _is_tool_response(msg):
+            tc_id = msg.get("tool_call_id")
+            if not tc_id:
+                self._malformed += 1
+            else:
+                prev = self._call_pos.get(tc_id, -1)
+                if prev < 0:
+                    self._orphans += 1
+                self._pending.pop(tc_id, None)
+        self._prev_call.append(prev)
+        self._n = i + 1
+        self._last = msg
+        self._suffix_min = None
+
+    def is_well_formed(self) -> bool:
+        """每个调用都有响应、每个响应都有调用"""
+        return not self._pending and not self._orphans and not self._malformed
+
+    def last_unmatched_call(self) -> int | None:
+        """最后一个没有响应的 tool_call 所在消息的位置"""
+        return max(self._pending.values()) if self._pending else None
+
+    def is_safe_cut(self, start: int) -> bool:
+        """从 start 开始保留消息时，不会留下找不到调用的 tool 响应"""
+        if start >= self._n:
+            return True
+        if self._suffix_min is None:
+            # suffix_min[k]：位置 k 及之后所有 tool 响应对应调用位置的最小值
+            suffix = [INF] * (self._n + 1)
+            for k in range(self._n - 1, -1, -1):
+                suffix[k] = min(suffix[k + 1], self._prev_call[k])
+            self._suffix_min = suffix
+        return self._suffix_min[start] >= start
+
+    def nearest_safe_cut(self, start: int, backward: bool = True) -> int | None:
+        """从 start 开始向前（backward）或向后查找最近的安全切割点"""
+        if backward:
+            for k in range(min(start, self._n), -1, -1):
+                if self.is_safe_cut(k):
+                    return k
+            return None
+        for k in range(max(start, 0), self._n + 1):
+            if self.is_safe_cut(k):
+                return k
+        return None
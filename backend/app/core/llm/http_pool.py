@@ -0,0 +1,143 @@
+import importlib.util
+from collections import Counter
+import httpx
+import litellm
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+def http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2（httpx[http2]）"""
+    return importlib.util.find_spec("h2") is not None
+
+
+class _PerHostTransport(httpx.AsyncBaseTransport):
+    """按目标主机分别维护连接池的传输层
+
+    每个 (scheme, host, port) 一个 AsyncHTTPTransport，连接数上限按主机计算，
+    某个上游排队不会占满其他上游的连接。通过 httpcore 的 trace 扩展统计新建连接
+    与 TLS 握手次数，请求数减去新建连接数即为复用连接（含 HTTP/2 多路复用）的请求数。
+    """
+
+    def __init__(self, http2: bool, max_connections: int, keepalive_expiry: float):
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._transports: dict[tuple[bytes, bytes, int | None], httpx.AsyncHTTPTransport] = {}
+        # 指标，按主机统计
+        self.requests: Counter = Counter()
+        self.connections: Counter = Counter()
+        self.tls_handshakes: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def _transport(self, url: httpx.URL) -> httpx.AsyncHTTPTransport:
+        key = (url.raw_scheme, url.raw_host, url.port)
+        transport = self._transports.get(key)
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=self.limits)
+            self._transports[key] = transport
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        self.requests[host] += 1
+
+        async def trace(event: str, info: dict):
+            if event == "connection.connect_tcp.complete":
+                self.connections[host] += 1
+            elif event == "connection.start_tls.complete":
+                self.tls_handshakes[host] += 1
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            return await self._transport(request.url).handle_async_request(request)
+        except httpx.TransportError:
+            self.errors[host] += 1
+            raise
+
+    async def aclose(self):
+        for transport in self._transports.values():
+            await transport.aclose()
+        self._transports.clear()
+
+    def metrics(self) -> dict:
+        hosts = {}
+        for host, requests in self.requests.items():
+            connections = self.connections[host]
+            hosts[host] = {
+                "requests": requests,
+                "new_connections": connections,
+                "tls_handshakes": self.tls_handshakes[host],
+                "reused": max(0, requests - connections),
+                "reuse_rate": round(1 - connections / requests, 4) if requests else 0.0,
+                "errors": self.errors[host],
+            }
+        return hosts
+
+
+class HttpPool:
+    """进程内共享的 LLM HTTP 客户端
+
+    keep-alive 连接池 + 可用时启用 HTTP/2，安装为 litellm.aclient_session 后，
+    OpenAI 兼容的上游请求都复用同一组连接，不再每次调用重新建连与 TLS 握手。
+    """
+
+    def __init__(self):
+        self._client: httpx.AsyncClient | None = None
+        self._transport: _PerHostTransport | None = None
+        # 安装前 litellm 使用的客户端，关闭时恢复
+        self._previous_session = None
+
+    @property
+    def client(self) -> httpx.AsyncClient | None:
+        return self._client
+
+    def install(self) -> httpx.AsyncClient | None:
+        """创建共享客户端并交给 litellm 使用，需在事件循环内（应用启动时）调用"""
+        if not settings.LLM_HTTP_POOL:
+            return None
+        if self._client is not None:
+            return self._client
+        http2 = settings.LLM_HTTP2 and http2_available()
+        if settings.LLM_HTTP2 and not http2:
+            logger.info("未安装 h2，LLM 连接池使用 HTTP/1.1")
+        self._transport = _PerHostTransport(
+            http2=http2,
+            max_connections=settings.LLM_HTTP_MAX_CONNECTIONS_PER_HOST,
+            keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self._client = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=httpx.Timeout(600.0, connect=10.0),
+            follow_redirects=True,
+        )
+        self._previous_session = litellm.aclient_session
+        litellm.aclient_session = self._client
+        logger.info(
+            f"LLM 连接池已启用（HTTP/2: {http2}，每主机连接数: {settings.LLM_HTTP_MAX_CONNECTIONS_PER_HOST}）"
+        )
+        return self._client
+
+    async def close(self):
+        if self._client is None:
+            return
+        if litellm.aclient_session is self._client:
+            litellm.aclient_session = self._previous_session
+        self._previous_session = None
+        await self._client.aclose()
+        self._client = None
+
+    def metrics(self) -> dict:
+        if self._transport is None:
+            return {"enabled": False}
+        return {
+            "enabled": self._client is not None,
+            "http2": self._transport.http2,
+            "hosts": self._transport.metrics(),
+        }
+
+
+http_pool = HttpPool()
@@ -0,0 +1,232 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+class TokenBucket:
+    """每分钟 rate 个令牌的令牌桶，容量为一分钟的额度；rate<=0 表示不限"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """取出 amount 个令牌前需要等待的秒数；超过容量的请求按容量计，避免永远等不到"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if not self.unlimited:
+            self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float):
+        """按实际用量修正预扣的令牌（delta>0 表示多用了），余额可为负，之后的请求等待补足"""
+        if not self.unlimited:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+@dataclass
+class _Waiter:
+    future: asyncio.Future
+    tokens: int
+    enqueued: float = field(default_factory=time.monotonic)
+
+
+class ProviderLimiter:
+    """单个上游（base_url, model）的并发与速率限制
+
+    - 同时进行的请求数不超过 max_concurrency
+    - 请求数与 token 数分别受 rpm / tpm 令牌桶限制（token 按估算值预扣，完成后按实际用量修正）
+    - 排队的请求按任务轮转放行：每次放行后该任务排到队尾，单个任务的大量并发请求不会饿死其他任务
+    """
+
+    def __init__(self, max_concurrency: int, rpm: int = 0, tpm: int = 0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests = TokenBucket(rpm)
+        self.token_bucket = TokenBucket(tpm)
+        self._queues: OrderedDict[str, deque[_Waiter]] = OrderedDict()
+        self._in_flight = 0
+        self._timer: asyncio.TimerHandle | None = None
+        # 指标
+        self.granted = 0
+        self.rate_limited = 0
+        self.wait_seconds = 0.0
+        self.waits: deque[float] = deque(maxlen=500)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    async def acquire(self, task_id: str, tokens: int):
+        if not self._queues and self._ready_in(tokens) == 0:
+            self._grant(tokens, 0.0)
+            return
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(loop.create_future(), tokens)
+        self._queues.setdefault(task_id, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 已放行但调用方被取消，归还名额
+                self.release(tokens)
+            else:
+                self._remove(task_id, waiter)
+                self._dispatch()
+            raise
+
+    def release(self, estimated_tokens: int, used_tokens: int | None = None):
+        self._in_flight -= 1
+        if used_tokens is not None:
+            self.token_bucket.adjust(used_tokens - min(estimated_tokens, self.token_bucket.capacity))
+        self._dispatch()
+
+    def _ready_in(self, tokens: int) -> float | None:
+        """距离可以放行一个需要 tokens 的请求还需等待的秒数；并发已满返回 None"""
+        if self._in_flight >= self.max_concurrency:
+            return None
+        now = time.monotonic()
+        return max(self.requests.delay(1, now), self.token_bucket.delay(tokens, now))
+
+    def _grant(self, tokens: int, waited: float):
+        self._in_flight += 1
+        self.requests.take(1)
+        self.token_bucket.take(tokens)
+        self.granted += 1
+        self.wait_seconds += waited
+        self.waits.append(waited)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues:
+            task_id, queue = next(iter(self._queues.items()))
+            waiter = queue[0]
+            if waiter.future.done():
+                self._remove(task_id, waiter)
+                continue
+            delay = self._ready_in(waiter.tokens)
+            if delay is None:
+                return  # 等待有请求完成
+            if delay > 0:
+                # 等待令牌桶补足后再放行
+                self.rate_limited += 1
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            self._remove(task_id, waiter)
+            if task_id in self._queues:
+                self._queues.move_to_end(task_id)
+            self._grant(waiter.tokens, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    def _remove(self, task_id: str, waiter: _Waiter):
+        queue = self._queues.get(task_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._queues[task_id]
+
+    def metrics(self) -> dict:
+        waits = sorted(self.waits)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            "max_concurrency": self.max_concurrency,
+            "rpm": self.requests.capacity,
+            "tpm": self.token_bucket.capacity,
+            "in_flight": self._in_flight,
+            "queued": self.queued,
+            "queued_tasks": len(self._queues),
+            "granted": self.granted,
+            "rate_limited": self.rate_limited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "wait_p95": round(p95, 3),
+            "wait_max": round(waits[-1], 3) if waits else 0.0,
+        }
+
+
+class _Lease:
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.used_tokens: int | None = None
+
+    def record(self, response):
+        """记录响应中的实际 token 用量，用于修正 TPM 令牌桶"""
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if total:
+            self.used_tokens = int(total)
+
+
+class LLMLimiter:
+    """进程内共享的 LLM 调用限流器，按上游（base_url, model）分别限制
+
+    默认限制取 LLM_MAX_CONCURRENCY / LLM_RPM / LLM_TPM，
+    LLM_PROVIDER_LIMITS 可按模型名覆盖，例如
+    {"deepseek/deepseek-chat": {"concurrency": 4, "rpm": 60, "tpm": 200000}}
+    """
+
+    def __init__(self):
+        self._providers: dict[tuple[str, str], ProviderLimiter] = {}
+
+    def provider(self, key: tuple[str, str]) -> ProviderLimiter:
+        if key not in self._providers:
+            limits = settings.LLM_PROVIDER_LIMITS.get(key[1], {})
+            self._providers[key] = ProviderLimiter(
+                limits.get("concurrency", settings.LLM_MAX_CONCURRENCY),
+                limits.get("rpm", settings.LLM_RPM),
+                limits.get("tpm", settings.LLM_TPM),
+            )
+        return self._providers[key]
+
+    def counts_tokens(self, key: tuple[str, str]) -> bool:
+        """该上游是否有 TPM 限制；没有时调用方无需估算请求的 token 数"""
+        return not self.provider(key).token_bucket.unlimited
+
+    @asynccontextmanager
+    async def limit(self, key: tuple[str, str], task_id: str | None, tokens: int = 0):
+        """在限流名额内执行一次请求；调用方可用 lease.record(response) 上报实际用量"""
+        limiter = self.provider(key)
+        started = time.monotonic()
+        await limiter.acquire(task_id or "-", tokens)
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info(f"LLM 请求排队 {waited:.1f}s: {key[1]}（任务 {task_id}）")
+        lease = _Lease(tokens)
+        try:
+            yield lease
+        finally:
+            limiter.release(tokens, lease.used_tokens)
+
+    def metrics(self) -> dict:
+        return {
+            f"{key[0] or 'default'}|{key[1]}": limiter.metrics()
+            for key, limiter in self._providers.items()
+        }
+
+
+llm_limiter = LLMLimiter()
@@ -1,9 +1,10 @@
-import json
 from app.utils.common_utils import transform_link, split_footnotes
 from app.utils.log_util import logger
 import time
 from types import SimpleNamespace
 import copy
+from uuid import uuid4
+from app.config.setting import settings
 from app.schemas.response import (
     CoderMessage,
     WriterMessage,
@@ -12,11 +13,16 @@ from app.schemas.response import (
     CoordinatorMessage,
 )
 from app.services.redis_manager import redis_manager
+from app.core.llm.retry import llm_retry, RETRYABLE_ERRORS
+from app.core.llm.cache import llm_cache
+from app.core.llm.limiter import llm_limiter
+from app.core.llm.tokens import history_tokens
+from app.core.llm.history import HistoryIndex, fix_tool_calls
 from litellm import acompletion
 import litellm
 from app.schemas.enums import AgentType
 from app.utils.track import agent_metrics
-from icecream import ic
+from app.utils.trace import trace
 
 litellm.callbacks = [agent_metrics]
 # 兼容不同厂商（如 Gemini/Vertex）的 OpenAI 风格参数差异：
@@ -26,6 +32,14 @@ try:
 except Exception:
     pass
 
+# 流式输出时推送增量片段的 Agent（SystemMessage 不支持增量）
+STREAMING_AGENTS = (
+    AgentType.CODER,
+    AgentType.WRITER,
+    AgentType.MODELER,
+    AgentType.COORDINATOR,
+)
+
 
 class LLM:
     def __init__(
@@ -42,6 +56,11 @@ class LLM:
         self.max_tokens: int | None = None  # 添加最大token数限制
         self.task_id = task_id
 
+    @property
+    def provider(self) -> tuple[str, str]:
+        """上游标识（base_url, model），用于按提供方熔断、限流"""
+        return (self.base_url or "", self.model)
+
     async def chat(
         self,
         history: list = None,
@@ -52,8 +71,13 @@ class LLM:
         top_p: float | None = None,  # 添加top_p参数,
         agent_name: AgentType = AgentType.SYSTEM,  # CoderAgent or WriterAgent
         sub_title: str | None = None,
+        stream: bool | None = None,  # 是否流式输出，默认取 settings.LLM_STREAM
     ) -> str:
         logger.info(f"subtitle是:{sub_title}")
+        if stream is None:
+            stream = settings.LLM_STREAM
+        # 增量片段与最终消息共用同一 id，前端据此合并
+        msg_id = str(uuid4())
 
         # 验证和修复工具调用完整性
         if history:
@@ -78,14 +102,40 @@ class LLM:
         if self.base_url:
             kwargs["base_url"] = self.base_url
 
-        # TODO: stream 输出
+        # 相同请求直接复用缓存的响应
+        cache_key = None
+        if llm_cache.enabled:
+            cache_key = llm_cache.make_key(self.model, history, tools, tool_choice, top_p)
+            cached = await llm_cache.get(cache_key)
+            if cached is not None:
+                self.chat_count += 1
+                await self.send_message(cached, agent_name, sub_title, msg_id=msg_id)
+                return cached
+
+        provider = self.provider
+        estimated_tokens = 0
+        if llm_limiter.counts_tokens(provider):
+            estimated_tokens = history_tokens(self.model, history or [])
         for attempt in range(max_retries):
+            # 上游熔断期间在此异步等待，不占用重试次数
+            await llm_retry.before_call(provider, self.task_id)
             try:
-                response = await acompletion(**kwargs)
+                # 按上游限流排队，拿到名额后才计时
+                async with llm_limiter.limit(provider, self.task_id, estimated_tokens) as lease:
+                    started = time.monotonic()
+                    if stream:
+                        response = await self._stream_completion(
+                            kwargs, agent_name, sub_title, msg_id
+                        )
+                    else:
+                        response = await acompletion(**kwargs)
+                    lease.record(response)
                 logger.info(f"API返回: {response}")
                 if not response or not hasattr(response, "choices"):
                     raise ValueError("无效的API响应")
-
+                llm_retry.record_success(provider, time.monotonic() - started)
+                if cache_key:
+                    await llm_cache.set(cache_key, response)
                 # 兼容上游偶发返回空 choices（例如 Gemini/Vertex 在特定参数/工具调用下）
                 if not response.choices:
                     logger.warning("上游返回空 choices。若本次带有 tools，将去除 tools 重试一次。")
@@ -94,7 +144,11 @@ class LLM:
                         retry_kwargs.pop("tools", None)
                         retry_kwargs.pop("tool_choice", None)
                         try:
-                            response2 = await acompletion(**retry_kwargs)
+                            async with llm_limiter.limit(
+                                provider, self.task_id, estimated_tokens
+                            ) as lease:
+                                response2 = await acompletion(**retry_kwargs)
+                                lease.record(response2)
                             logger.info(f"去工具后重试 API返回: {response2}")
                             if hasattr(response2, "choices") and response2.choices:
                                 response = response2
@@ -120,115 +174,96 @@ class LLM:
                         response = SimpleNamespace(
                             choices=[SimpleNamespace(message=SimpleNamespace(content=""))]
                         )
-
-                self.chat_count += 1
-                await self.send_message(response, agent_name, sub_title)
-                return response
-            except (json.JSONDecodeError, litellm.InternalServerError, ValueError) as e:
+            except RETRYABLE_ERRORS as e:
                 logger.error(f"第{attempt + 1}次重试: {str(e)}")
-                if attempt < max_retries - 1:  # 如果不是最后一次尝试
-                    time.sleep(retry_delay * (attempt + 1))  # 指数退避
+                llm_retry.record_failure(provider)
+                # 不是最后一次尝试且任务仍有重试预算时，异步退避后重试
+                if attempt < max_retries - 1 and llm_retry.take_budget(self.task_id):
+                    await llm_retry.sleep_before_retry(provider, attempt, retry_delay, e)
                     continue
                 logger.debug(f"请求参数: {kwargs}")
                 raise  # 如果所有重试都失败，则抛出异常
+            except BaseException:
+                llm_retry.record_abort(provider)
+                raise
+            break
+
+        # 推送消息在重试之外：推送失败不计为上游失败，也不会重新请求
+        self.chat_count += 1
+        await self.send_message(response, agent_name, sub_title, msg_id=msg_id)
+        return response
 
     def _validate_and_fix_tool_calls(self, history: list) -> list:
-        """验证并修复工具调用完整性"""
+        """验证并修复工具调用完整性（线性时间，完整时原样返回）"""
         if not history:
             return history
-
-        ic(f"🔍 开始验证工具调用，历史消息数量: {len(history)}")
-
-        # 查找所有未匹配的tool_calls
-        fixed_history = []
-        i = 0
-
-        while i < len(history):
-            msg = history[i]
-
-            # 如果是包含tool_calls的消息
-            if isinstance(msg, dict) and "tool_calls" in msg and msg["tool_calls"]:
-                ic(f"📞 发现tool_calls消息在位置 {i}")
-
-                # 检查每个tool_call是否都有对应的response，分别处理
-                valid_tool_calls = []
-                invalid_tool_calls = []
-
-                for tool_call in msg["tool_calls"]:
-                    tool_call_id = tool_call.get("id")
-                    ic(f"  检查tool_call_id: {tool_call_id}")
-
-                    if tool_call_id:
-                        # 查找对应的tool响应
-                        found_response = False
-                        for j in range(i + 1, len(history)):
-                            if (
-                                history[j].get("role") == "tool"
-                                and history[j].get("tool_call_id") == tool_call_id
-                            ):
-                                ic(f"  ✅ 找到匹配响应在位置 {j}")
-                                found_response = True
-                                break
-
-                        if found_response:
-                            valid_tool_calls.append(tool_call)
-                        else:
-                            ic(f"  ❌ 未找到匹配响应: {tool_call_id}")
-                            invalid_tool_calls.append(tool_call)
-
-                # 根据检查结果处理消息
-                if valid_tool_calls:
-                    # 有有效的tool_calls，保留它们
-                    fixed_msg = msg.copy()
-                    fixed_msg["tool_calls"] = valid_tool_calls
-                    fixed_history.append(fixed_msg)
-                    ic(
-                        f"  🔧 保留 {len(valid_tool_calls)} 个有效tool_calls，移除 {len(invalid_tool_calls)} 个无效的"
-                    )
-                else:
-                    # 没有有效的tool_calls，移除tool_calls但可能保留其他内容
-                    cleaned_msg = {k: v for k, v in msg.items() if k != "tool_calls"}
-                    if cleaned_msg.get("content"):
-                        fixed_history.append(cleaned_msg)
-                        ic(f"  🔧 移除所有tool_calls，保留消息内容")
-                    else:
-                        ic(f"  🗑️ 完全移除空的tool_calls消息")
-
-            # 如果是tool响应消息，检查是否是孤立的
-            elif isinstance(msg, dict) and msg.get("role") == "tool":
-                tool_call_id = msg.get("tool_call_id")
-                ic(f"🔧 检查tool响应消息: {tool_call_id}")
-
-                # 查找对应的tool_calls
-                found_call = False
-                for j in range(len(fixed_history)):
-                    if fixed_history[j].get("tool_calls") and any(
-                        tc.get("id") == tool_call_id
-                        for tc in fixed_history[j]["tool_calls"]
-                    ):
-                        found_call = True
-                        break
-
-                if found_call:
-                    fixed_history.append(msg)
-                    ic(f"  ✅ 保留有效的tool响应")
-                else:
-                    ic(f"  🗑️ 移除孤立的tool响应: {tool_call_id}")
-
-            else:
-                # 普通消息，直接保留
-                fixed_history.append(msg)
-
-            i += 1
-
-        if len(fixed_history) != len(history):
-            ic(f"🔧 修复完成: {len(history)} -> {len(fixed_history)} 条消息")
-        else:
-            ic(f"✅ 验证通过，无需修复")
-
+        if HistoryIndex().sync(history).is_well_formed():
+            return history
+        fixed_history = fix_tool_calls(history)
+        trace(self.task_id, "🔧 修复完成: %d -> %d 条消息", len(history), len(fixed_history))
         return fixed_history
 
-    async def send_message(self, response, agent_name, sub_title=None):
+    async def _stream_completion(self, kwargs: dict, agent_name, sub_title, msg_id: str):
+        """流式调用：边接收边按间隔推送增量文本，结束后把所有分片（含工具调用
+        参数的增量）重组为与非流式调用一致的响应对象"""
+        stream_kwargs = {
+            **kwargs,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        publish = agent_name in STREAMING_AGENTS
+        chunks = []
+        pending: list[str] = []  # 尚未推送的增量文本
+        sent = 0  # 已推送文本的长度，即下一个片段的 delta_offset
+        last_flush = float("-inf")  # 首个片段立即推送
+
+        response = await acompletion(**stream_kwargs)
+        async for chunk in response:
+            chunks.append(chunk)
+            if not publish or not getattr(chunk, "choices", None):
+                continue
+            delta = getattr(chunk.choices[0].delta, "content", None)
+            if not delta:
+                continue
+            pending.append(delta)
+            now = time.monotonic()
+            if now - last_flush >= settings.LLM_STREAM_FLUSH_INTERVAL:
+                text = "".join(pending)
+                pending.clear()
+                await self._publish_delta(agent_name, sub_title, msg_id, text, sent)
+                sent += len(text)
+                last_flush = now
+        # 剩余片段不再单独推送，由随后的完整消息覆盖
+
+        return litellm.stream_chunk_builder(chunks, messages=kwargs.get("messages"))
+
+    async def _publish_delta(self, agent_name, sub_title, msg_id, text, offset):
+        try:
+            agent_msg = self._build_message(
+                agent_name, text, sub_title, msg_id, streaming=True, delta_offset=offset
+            )
+            await redis_manager.publish_message(self.task_id, agent_msg, persist=False)
+        except Exception as e:
+            # 增量推送失败不影响生成，最终完整消息会覆盖
+            logger.warning(f"推送流式片段失败: {e}")
+
+    def _build_message(self, agent_name, content, sub_title, msg_id=None, **extra):
+        ids = {"id": msg_id} if msg_id else {}
+        match agent_name:
+            case AgentType.CODER:
+                return CoderMessage(content=content, **ids, **extra)
+            case AgentType.WRITER:
+                return WriterMessage(content=content, sub_title=sub_title, **ids, **extra)
+            case AgentType.MODELER:
+                return ModelerMessage(content=content, **ids, **extra)
+            case AgentType.SYSTEM:
+                return SystemMessage(content=content, **ids)
+            case AgentType.COORDINATOR:
+                return CoordinatorMessage(content=content, **ids, **extra)
+            case _:
+                raise ValueError(f"不支持的agent类型: {agent_name}")
+
+    async def send_message(self, response, agent_name, sub_title=None, msg_id=None):
         logger.info(f"subtitle是:{sub_title}")
         # 兼容空 choices 情况
         content = ""
@@ -240,25 +275,11 @@ class LLM:
         except Exception:
             pass
 
-        match agent_name:
-            case AgentType.CODER:
-                agent_msg: CoderMessage = CoderMessage(content=content)
-            case AgentType.WRITER:
-                # 处理 Markdown 格式的图片语法
-                content, _ = split_footnotes(content)
-                content = transform_link(self.task_id, content)
-                agent_msg: WriterMessage = WriterMessage(
-                    content=content,
-                    sub_title=sub_title,
-                )
-            case AgentType.MODELER:
-                agent_msg: ModelerMessage = ModelerMessage(content=content)
-            case AgentType.SYSTEM:
-                agent_msg: SystemMessage = SystemMessage(content=content)
-            case AgentType.COORDINATOR:
-                agent_msg: CoordinatorMessage = CoordinatorMessage(content=content)
-            case _:
-                raise ValueError(f"不支持的agent类型: {agent_name}")
+        if agent_name == AgentType.WRITER:
+            # 处理 Markdown 格式的图片语法
+            content, _ = split_footnotes(content)
+            content = transform_link(self.task_id, content)
+        agent_msg = self._build_message(agent_name, content, sub_title, msg_id)
 
         await redis_manager.publish_message(
             self.task_id,
@@ -299,7 +320,20 @@ async def simple_chat(model: LLM, history: list) -> str:
     if model.base_url:
         kwargs["base_url"] = model.base_url
 
-    response = await acompletion(**kwargs)
+    cache_key = None
+    response = None
+    if llm_cache.enabled:
+        cache_key = llm_cache.make_key(model.model, history)
+        response = await llm_cache.get(cache_key)
+    if response is None:
+        estimated_tokens = 0
+        if llm_limiter.counts_tokens(model.provider):
+            estimated_tokens = history_tokens(model.model, history)
+        async with llm_limiter.limit(model.provider, model.task_id, estimated_tokens) as lease:
+            response = await acompletion(**kwargs)
+            lease.record(response)
+        if cache_key:
+            await llm_cache.set(cache_key, response)
     # 容错：空 choices 则返回空串
     try:
         if hasattr(response, "choices") and response.choices:
@@ -0,0 +1,247 @@
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+import litellm
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+# 可重试的错误：上游 5xx/限流/连接问题，以及响应无法解析
+RETRYABLE_ERRORS = (
+    json.JSONDecodeError,
+    ValueError,
+    litellm.InternalServerError,
+    litellm.ServiceUnavailableError,
+    litellm.BadGatewayError,
+    litellm.RateLimitError,
+    litellm.APIConnectionError,
+    litellm.Timeout,
+)
+
+# 每个任务允许的重试数：固定额度 + 请求数 × 该比例，避免上游故障时重试放大流量
+RETRY_BUDGET_RATIO = 0.2
+
+
+def retry_after(error: Exception) -> float | None:
+    """从错误携带的响应头中读取 Retry-After（秒），没有则返回 None"""
+    candidates = (
+        getattr(error, "headers", None),
+        getattr(getattr(error, "response", None), "headers", None),
+        getattr(error, "litellm_response_headers", None),
+    )
+    for headers in candidates:
+        if not headers:
+            continue
+        try:
+            value = headers.get("retry-after-ms")
+            if value is not None:
+                return max(0.0, float(value) / 1000)
+            value = headers.get("retry-after")
+        except Exception:
+            continue
+        if value is None:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except Exception:
+            continue
+    return None
+
+
+class CircuitBreaker:
+    """单个上游（base_url + model）的熔断器
+
+    连续失败达到阈值后熔断，冷却期内的调用在本地等待而不打到上游；冷却结束后
+    只放行一个探测请求，成功则恢复，失败则重新熔断。
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"  # closed | open | half_open
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.opens = 0
+        self._probe_done: asyncio.Event | None = None
+
+    async def before_call(self) -> float:
+        """等待直到允许发起请求，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            if self.state == "closed":
+                return waited
+            now = time.monotonic()
+            if self.state == "open":
+                if now < self.open_until:
+                    delay = self.open_until - now
+                    await asyncio.sleep(delay)
+                    waited += delay
+                    continue
+                # 冷却结束，由当前调用作为探测请求
+                self.state = "half_open"
+                self._probe_done = asyncio.Event()
+                return waited
+            # half_open：已有探测请求在途，等待其结果
+            start = time.monotonic()
+            await self._probe_done.wait()
+            waited += time.monotonic() - start
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state != "closed":
+            logger.info("上游已恢复，熔断器关闭")
+        self.state = "closed"
+        self._release_probe()
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self.opens += 1
+                logger.warning(
+                    f"上游连续失败 {self.consecutive_failures} 次，熔断 {self.cooldown}s"
+                )
+            self.state = "open"
+            self.open_until = time.monotonic() + self.cooldown
+            self._release_probe()
+
+    def abort(self):
+        """请求因非上游原因结束（取消、参数错误等）：不计成败，让出探测机会"""
+        if self.state == "half_open":
+            self.state = "open"
+            self.open_until = time.monotonic()
+            self._release_probe()
+
+    def _release_probe(self):
+        if self._probe_done is not None:
+            self._probe_done.set()
+            self._probe_done = None
+
+
+class ProviderStats:
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.backoff_seconds = 0.0
+        self.breaker_wait_seconds = 0.0
+        self.latencies: deque[float] = deque(maxlen=200)
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2] if latencies else 0.0
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "backoff_seconds": round(self.backoff_seconds, 3),
+            "breaker_wait_seconds": round(self.breaker_wait_seconds, 3),
+            "latency_p50": round(p50, 3),
+            "latency_p95": round(p95, 3),
+        }
+
+
+class RetryManager:
+    """LLM 调用的异步重试策略
+
+    - 带抖动的指数退避（full jitter），遵循上游返回的 Retry-After
+    - 按上游（base_url, model）熔断
+    - 按任务的重试预算
+    - 记录请求/重试次数与耗时，供 /metrics 查询
+    """
+
+    def __init__(self):
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+        self._stats: dict[tuple[str, str], ProviderStats] = {}
+        self._task_requests: dict[str, int] = {}
+        self._task_retries: dict[str, int] = {}
+
+    def breaker(self, key: tuple[str, str]) -> CircuitBreaker:
+        if key not in self._breakers:
+            self._breakers[key] = CircuitBreaker(
+                settings.LLM_BREAKER_THRESHOLD, settings.LLM_BREAKER_COOLDOWN
+            )
+        return self._breakers[key]
+
+    def stats(self, key: tuple[str, str]) -> ProviderStats:
+        return self._stats.setdefault(key, ProviderStats())
+
+    async def before_call(self, key: tuple[str, str], task_id: str):
+        waited = await self.breaker(key).before_call()
+        stats = self.stats(key)
+        stats.breaker_wait_seconds += waited
+        stats.requests += 1
+        self._task_requests[task_id] = self._task_requests.get(task_id, 0) + 1
+
+    def record_success(self, key: tuple[str, str], latency: float):
+        self.breaker(key).record_success()
+        stats = self.stats(key)
+        stats.successes += 1
+        stats.latencies.append(latency)
+
+    def record_failure(self, key: tuple[str, str]):
+        self.breaker(key).record_failure()
+        self.stats(key).failures += 1
+
+    def record_abort(self, key: tuple[str, str]):
+        self.breaker(key).abort()
+
+    def take_budget(self, task_id: str) -> bool:
+        """消耗一次重试预算，预算用尽返回 False"""
+        used = self._task_retries.get(task_id, 0)
+        allowed = settings.LLM_RETRY_BUDGET + RETRY_BUDGET_RATIO * self._task_requests.get(
+            task_id, 0
+        )
+        if used >= allowed:
+            logger.error(f"任务 {task_id} 的 LLM 重试预算已用尽（{used} 次）")
+            return False
+        self._task_retries[task_id] = used + 1
+        return True
+
+    def backoff(self, attempt: int, base_delay: float, error: Exception) -> float:
+        """第 attempt 次（从 0 开始）失败后的等待时间"""
+        hinted = retry_after(error)
+        if hinted is not None:
+            return min(hinted, settings.LLM_RETRY_MAX_DELAY)
+        cap = min(settings.LLM_RETRY_MAX_DELAY, base_delay * (2**attempt))
+        return random.uniform(0, cap)
+
+    async def sleep_before_retry(
+        self, key: tuple[str, str], attempt: int, base_delay: float, error: Exception
+    ):
+        delay = self.backoff(attempt, base_delay, error)
+        stats = self.stats(key)
+        stats.retries += 1
+        stats.backoff_seconds += delay
+        await asyncio.sleep(delay)
+
+    def forget_task(self, task_id: str):
+        self._task_requests.pop(task_id, None)
+        self._task_retries.pop(task_id, None)
+
+    def metrics(self) -> dict:
+        providers = {}
+        for key, stats in self._stats.items():
+            breaker = self.breaker(key)
+            providers[f"{key[0] or 'default'}|{key[1]}"] = {
+                **stats.to_dict(),
+                "breaker_state": breaker.state,
+                "breaker_opens": breaker.opens,
+            }
+        return {
+            "providers": providers,
+            "task_retries": dict(self._task_retries),
+        }
+
+
+llm_retry = RetryManager()
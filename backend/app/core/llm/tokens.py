@@ -0,0 +1,54 @@
+import json
+from functools import lru_cache
+import litellm
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=128)
+def context_window(model: str) -> int:
+    """模型的输入上下文长度；litellm 未收录的模型使用 settings.LLM_CONTEXT_WINDOW"""
+    try:
+        info = litellm.get_model_info(model)
+        window = info.get("max_input_tokens") or info.get("max_tokens")
+        if window:
+            return int(window)
+    except Exception:
+        pass
+    logger.debug(f"未知模型 {model} 的上下文长度，使用默认值 {settings.LLM_CONTEXT_WINDOW}")
+    return settings.LLM_CONTEXT_WINDOW
+
+
+@lru_cache(maxsize=4096)
+def count_text_tokens(model: str, text: str) -> int:
+    """用模型对应的分词器统计文本 token 数；分词器不可用时按字符粗略估算"""
+    if not text:
+        return 0
+    try:
+        return litellm.token_counter(model=model, text=text)
+    except Exception:
+        # 中文约 1 字 1 token，英文约 4 字符 1 token
+        ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+        return ascii_chars // 4 + (len(text) - ascii_chars)
+
+
+def message_tokens(model: str, msg: dict) -> int:
+    tokens = MESSAGE_OVERHEAD_TOKENS
+    content = msg.get("content")
+    if isinstance(content, str):
+        tokens += count_text_tokens(model, content)
+    elif content:
+        tokens += count_text_tokens(model, json.dumps(content, ensure_ascii=False))
+    for tool_call in msg.get("tool_calls") or []:
+        function = tool_call.get("function") or {}
+        tokens += count_text_tokens(model, function.get("name") or "")
+        tokens += count_text_tokens(model, function.get("arguments") or "")
+    return tokens
+
+
+def history_tokens(model: str, history: list[dict]) -> int:
+    return sum(message_tokens(model, msg) for msg in history)
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Awaitable, Callable, Iterable
+from app.utils.log_util import logger
+
+
+class SectionScheduler:
+    """按依赖关系（DAG）调度求解小节
+
+    dependencies 为 小节 -> 其依赖的小节列表，字典顺序即优先顺序：
+    依赖都已完成的小节按该顺序启动，同时运行的小节数不超过 max_parallel。
+    max_parallel=1 时等价于按拓扑顺序串行执行。
+    任一小节失败时取消其余正在运行的小节并抛出该异常。
+    """
+
+    def __init__(self, dependencies: dict[str, list[str]], max_parallel: int = 1):
+        for key, deps in dependencies.items():
+            unknown = [d for d in deps if d not in dependencies]
+            if unknown:
+                raise ValueError(f"小节 {key} 依赖了不存在的小节: {unknown}")
+        self.dependencies = {key: list(deps) for key, deps in dependencies.items()}
+        self.max_parallel = max(1, max_parallel)
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> list[str]:
+        remaining = {key: set(deps) for key, deps in self.dependencies.items()}
+        order = []
+        while remaining:
+            ready = [key for key, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"小节依赖存在环: {sorted(remaining)}")
+            for key in ready:
+                del remaining[key]
+                order.append(key)
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    async def run(
+        self,
+        run_section: Callable[[str], Awaitable[None]],
+        completed: Iterable[str] = (),
+    ) -> None:
+        """执行所有未完成的小节；completed 中的小节（断点续跑）视为已完成"""
+        completed = set(completed)
+        pending = {
+            key: set(deps) - completed
+            for key, deps in self.dependencies.items()
+            if key not in completed
+        }
+        running: dict[asyncio.Task, str] = {}
+        try:
+            while pending or running:
+                ready = [key for key, deps in pending.items() if not deps]
+                for key in ready[: self.max_parallel - len(running)]:
+                    del pending[key]
+                    logger.info(f"开始小节 {key}（运行中 {len(running) + 1}）")
+                    task = asyncio.create_task(run_section(key), name=f"section:{key}")
+                    running[task] = key
+
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = running.pop(task)
+                    task.result()
+                    logger.info(f"小节 {key} 完成")
+                    for deps in pending.values():
+                        deps.discard(key)
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
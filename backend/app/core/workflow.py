@@ -1,5 +1,8 @@
+import asyncio
+from typing import Awaitable, Callable
 from app.core.agents import WriterAgent, CoderAgent, CoordinatorAgent, ModelerAgent
 from app.schemas.request import Problem
+from app.schemas.A2A import CoderToWriter
 from app.schemas.response import SystemMessage
 from app.tools.openalex_scholar import OpenAlexScholar
 from app.utils.log_util import logger
@@ -12,6 +15,8 @@ from app.tools.notebook_serializer import NotebookSerializer
 from app.core.flows import Flows
 from app.core.llm.llm_factory import LLMFactory
 from app.services.checkpoint_control import CheckpointControl
+from app.core.scheduler import SectionScheduler
+from app.tools.base_interpreter import BaseCodeInterpreter
 
 
 class WorkFlow:
@@ -24,6 +29,10 @@ class WorkFlow:
         pass
 
 
+# 并行求解时，注入到后续小节提示词中的前序小节结论长度上限
+DEPENDENCY_SUMMARY_CHARS = 2000
+
+
 class MathModelWorkFlow(WorkFlow):
     task_id: str  #
     work_dir: str  # worklow work dir
@@ -92,51 +101,12 @@ class MathModelWorkFlow(WorkFlow):
 
         user_output = UserOutput(work_dir=self.work_dir, ques_count=self.ques_count)
 
-        await redis_manager.publish_message(
-            self.task_id,
-            SystemMessage(content="正在创建代码沙盒环境"),
-        )
-
-        notebook_serializer = NotebookSerializer(work_dir=self.work_dir)
-        code_interpreter = await create_interpreter(
-            kind="local",
-            task_id=self.task_id,
-            work_dir=self.work_dir,
-            notebook_serializer=notebook_serializer,
-            timeout=3000,
-        )
-        
         scholar = OpenAlexScholar(task_id=self.task_id, email=settings.OPENALEX_EMAIL)
 
-        await redis_manager.publish_message(
-            self.task_id,
-            SystemMessage(content="创建完成"),
-        )
-
-        await redis_manager.publish_message(
-            self.task_id,
-            SystemMessage(content="初始化代码手"),
-        )
-
-        # modeler_agent
-        coder_agent = CoderAgent(
-            task_id=problem.task_id,
-            model=coder_llm,
-            work_dir=self.work_dir,
-            max_chat_turns=settings.MAX_CHAT_TURNS,
-            max_retries=settings.MAX_RETRIES,
-            code_interpreter=code_interpreter,
-            language=problem.language,
-        )
-
-        writer_agent = WriterAgent(
-            task_id=problem.task_id,
-            model=writer_llm,
-            comp_template=problem.comp_template,
-            format_output=problem.format_output,
-            scholar=scholar,
-            language=problem.language,
-        )
+        self.problem = problem
+        self.writer_llm = writer_llm
+        self.scholar = scholar
+        writer_agent = self._create_writer_agent()
 
         flows = Flows(self.questions)
 
@@ -144,74 +114,81 @@ class MathModelWorkFlow(WorkFlow):
         solution_flows = flows.get_solution_flows(self.questions, modeler_response)
         config_template = get_config_template(problem.comp_template)
 
-        for key, value in solution_flows.items():
-            # 断点续跑：若该小节已在部分结果中存在，则跳过
-            if key in user_output.res and user_output.res[key].get("response_content"):
-                await redis_manager.publish_message(
-                    self.task_id,
-                    SystemMessage(content=f"检测到已完成，跳过 {key}")
-                )
-                continue
+        self.coder_llm = coder_llm
+        self.writer_agent = writer_agent
+        self.flows = flows
+        self.config_template = config_template
+        self.user_output = user_output
+        self.coder_results = {}
+
+        # 断点续跑：若该小节已在部分结果中存在，则跳过
+        completed = [
+            key
+            for key in solution_flows
+            if key in user_output.res and user_output.res[key].get("response_content")
+        ]
+        for key in completed:
             await redis_manager.publish_message(
                 self.task_id,
-                SystemMessage(content=f"代码手开始求解{key}"),
+                SystemMessage(content=f"检测到已完成，跳过 {key}")
             )
 
-            while True:
-                coder_response = await coder_agent.run(
-                    prompt=value["coder_prompt"], subtask_title=key
-                )
-
-                # 检查点：CoderAgent 小节完成
-                feedback = await CheckpointControl.prompt_and_wait(
-                    self.task_id, agent="CoderAgent", sub_title=key, timeout_sec=10
-                )
-                if feedback:
-                    await coder_agent.append_chat_history({"role": "user", "content": feedback})
-                    continue
-                break
-
+        dependencies = flows.get_solution_dependencies(solution_flows)
+        if settings.SOLUTION_MODE == "parallel":
+            # 互不依赖的小节并发求解，每个小节使用独立的代码手、内核与 notebook
+            scheduler = SectionScheduler(dependencies, settings.MAX_PARALLEL_SECTIONS)
+            await self._run_pipelined(
+                scheduler,
+                lambda key, writer_queue: self._solve_section_isolated(
+                    key, solution_flows[key]["coder_prompt"], dependencies[key], writer_queue
+                ),
+                completed,
+            )
+        else:
             await redis_manager.publish_message(
                 self.task_id,
-                SystemMessage(content=f"代码手求解成功{key}", type="success"),
+                SystemMessage(content="正在创建代码沙盒环境"),
             )
-
-            writer_prompt = flows.get_writer_prompt(
-                key, coder_response.code_response, code_interpreter, config_template
+            code_interpreter = await self._create_interpreter(
+                NotebookSerializer(work_dir=self.work_dir)
             )
-
             await redis_manager.publish_message(
                 self.task_id,
-                SystemMessage(content=f"论文手开始写{key}部分"),
+                SystemMessage(content="创建完成"),
             )
 
-            ## TODO: 图片引用错误
-            while True:
-                writer_response = await writer_agent.run(
-                    writer_prompt,
-                    available_images=coder_response.created_images,
-                    sub_title=key,
-                )
-
-                # 检查点：WriterAgent 小节完成
-                feedback = await CheckpointControl.prompt_and_wait(
-                    self.task_id, agent="WriterAgent", sub_title=key, timeout_sec=10
-                )
-                if feedback:
-                    await writer_agent.append_chat_history({"role": "user", "content": feedback})
-                    continue
-                break
-
             await redis_manager.publish_message(
                 self.task_id,
-                SystemMessage(content=f"论文手完成{key}部分"),
+                SystemMessage(content="初始化代码手"),
             )
+            coder_agent = self._create_coder_agent(code_interpreter)
+
+            scheduler = SectionScheduler(dependencies, max_parallel=1)
+            try:
+                if settings.SOLUTION_MODE == "pipeline":
+                    # 论文手撰写上一小节的同时，代码手继续求解下一小节
+                    await self._run_pipelined(
+                        scheduler,
+                        lambda key, writer_queue: self._solve_section(
+                            key,
+                            solution_flows[key]["coder_prompt"],
+                            coder_agent,
+                            code_interpreter,
+                            writer_queue,
+                        ),
+                        completed,
+                    )
+                else:
+                    await scheduler.run(
+                        lambda key: self._solve_section(
+                            key, solution_flows[key]["coder_prompt"], coder_agent, code_interpreter
+                        ),
+                        completed=completed,
+                    )
+            finally:
+                # 关闭沙盒
+                await code_interpreter.cleanup()
 
-            user_output.set_res(key, writer_response)
-
-        # 关闭沙盒
-
-        await code_interpreter.cleanup()
         logger.info(user_output.get_res())
 
         ################################################ write steps
@@ -219,32 +196,256 @@ class MathModelWorkFlow(WorkFlow):
         write_flows = flows.get_write_flows(
             user_output, config_template, problem.ques_all
         )
-        for key, value in write_flows.items():
-            if key in user_output.res and user_output.res[key].get("response_content"):
+        await self._run_write_flows(write_flows, writer_agent)
+
+        logger.info(user_output.get_res())
+
+        user_output.save_result()
+
+    async def _create_interpreter(self, notebook_serializer: NotebookSerializer):
+        return await create_interpreter(
+            kind="local",
+            task_id=self.task_id,
+            work_dir=self.work_dir,
+            notebook_serializer=notebook_serializer,
+            timeout=3000,
+        )
+
+    def _create_writer_agent(self) -> WriterAgent:
+        return WriterAgent(
+            task_id=self.task_id,
+            model=self.writer_llm,
+            comp_template=self.problem.comp_template,
+            format_output=self.problem.format_output,
+            scholar=self.scholar,
+            language=self.problem.language,
+        )
+
+    def _create_coder_agent(self, code_interpreter: BaseCodeInterpreter) -> CoderAgent:
+        return CoderAgent(
+            task_id=self.task_id,
+            model=self.coder_llm,
+            work_dir=self.work_dir,
+            max_chat_turns=settings.MAX_CHAT_TURNS,
+            max_retries=settings.MAX_RETRIES,
+            code_interpreter=code_interpreter,
+            language=self.problem.language,
+        )
+
+    async def _run_coder(
+        self,
+        key: str,
+        coder_prompt: str,
+        coder_agent: CoderAgent,
+        code_interpreter: BaseCodeInterpreter,
+    ) -> tuple[CoderToWriter, str]:
+        """代码手求解一个小节，返回求解结果与该小节的写作提示词"""
+        await redis_manager.publish_message(
+            self.task_id,
+            SystemMessage(content=f"代码手开始求解{key}"),
+        )
+
+        while True:
+            coder_response = await coder_agent.run(prompt=coder_prompt, subtask_title=key)
+
+            # 检查点：CoderAgent 小节完成
+            feedback = await CheckpointControl.prompt_and_wait(
+                self.task_id, agent="CoderAgent", sub_title=key, timeout_sec=10
+            )
+            if feedback:
+                await coder_agent.append_chat_history({"role": "user", "content": feedback})
+                continue
+            break
+        self.coder_results[key] = coder_response
+
+        await redis_manager.publish_message(
+            self.task_id,
+            SystemMessage(content=f"代码手求解成功{key}", type="success"),
+        )
+
+        writer_prompt = self.flows.get_writer_prompt(
+            key, coder_response.code_response, code_interpreter, self.config_template
+        )
+        return coder_response, writer_prompt
+
+    async def _run_writer(self, key: str, writer_prompt: str, available_images: list[str] | None):
+        """论文手撰写一个求解小节"""
+        await redis_manager.publish_message(
+            self.task_id,
+            SystemMessage(content=f"论文手开始写{key}部分"),
+        )
+
+        ## TODO: 图片引用错误
+        while True:
+            writer_response = await self.writer_agent.run(
+                writer_prompt,
+                available_images=available_images,
+                sub_title=key,
+            )
+
+            # 检查点：WriterAgent 小节完成
+            feedback = await CheckpointControl.prompt_and_wait(
+                self.task_id, agent="WriterAgent", sub_title=key, timeout_sec=10
+            )
+            if feedback:
+                await self.writer_agent.append_chat_history({"role": "user", "content": feedback})
+                continue
+            break
+
+        await redis_manager.publish_message(
+            self.task_id,
+            SystemMessage(content=f"论文手完成{key}部分"),
+        )
+
+        self.user_output.set_res(key, writer_response)
+
+    async def _solve_section(
+        self,
+        key: str,
+        coder_prompt: str,
+        coder_agent: CoderAgent,
+        code_interpreter: BaseCodeInterpreter,
+        writer_queue: asyncio.Queue | None = None,
+    ):
+        """代码手求解一个小节；未给出 writer_queue 时随即由论文手撰写，否则交给写作阶段"""
+        coder_response, writer_prompt = await self._run_coder(
+            key, coder_prompt, coder_agent, code_interpreter
+        )
+        if writer_queue is None:
+            await self._run_writer(key, writer_prompt, coder_response.created_images)
+        else:
+            await writer_queue.put((key, writer_prompt, coder_response.created_images))
+
+    async def _solve_section_isolated(
+        self,
+        key: str,
+        coder_prompt: str,
+        dependencies: list[str],
+        writer_queue: asyncio.Queue,
+    ):
+        """并行模式：为小节创建独立的内核、notebook 与代码手，求解结束即释放内核"""
+        notebook_serializer = NotebookSerializer(
+            work_dir=self.work_dir, notebook_name=f"notebook_{key}.ipynb"
+        )
+        code_interpreter = await self._create_interpreter(notebook_serializer)
+        code_interpreter.image_prefix = f"{key}_"
+        try:
+            coder_agent = self._create_coder_agent(code_interpreter)
+            coder_response, writer_prompt = await self._run_coder(
+                key,
+                self._with_dependency_context(key, coder_prompt, dependencies),
+                coder_agent,
+                code_interpreter,
+            )
+        finally:
+            await code_interpreter.cleanup()
+        await writer_queue.put((key, writer_prompt, coder_response.created_images))
+
+    async def _run_pipelined(
+        self,
+        scheduler: SectionScheduler,
+        run_section: Callable[[str, asyncio.Queue], Awaitable[None]],
+        completed: list[str],
+    ):
+        """代码阶段与写作阶段流水线执行
+
+        代码阶段按调度器求解各小节，结果放入有界队列；写作阶段由唯一的论文手
+        按求解完成的顺序依次撰写（论文手共享对话历史）。队列满时代码阶段等待，
+        避免求解结果积压。任一阶段失败时取消另一阶段。
+        """
+        writer_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.WRITER_QUEUE_SIZE)
+
+        async def coder_stage():
+            await scheduler.run(lambda key: run_section(key, writer_queue), completed=completed)
+            await writer_queue.put(None)
+
+        async def writer_stage():
+            while (item := await writer_queue.get()) is not None:
+                await self._run_writer(*item)
+
+        stages = [
+            asyncio.create_task(coder_stage(), name="solution:coder"),
+            asyncio.create_task(writer_stage(), name="solution:writer"),
+        ]
+        try:
+            pending = set(stages)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_EXCEPTION)
+                for stage in done:
+                    stage.result()
+        finally:
+            for stage in stages:
+                stage.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+
+    async def _run_write_flows(self, write_flows: dict[str, str], writer_agent: WriterAgent):
+        """写作阶段：撰写摘要、问题重述、模型假设等部分，已完成的部分（断点续跑）跳过"""
+        if settings.WRITE_FLOWS_MODE == "fanout":
+            # 各部分只依赖求解结果与题目，使用独立的论文手上下文并发撰写
+            completed = [
+                key
+                for key in write_flows
+                if key in self.user_output.res and self.user_output.res[key].get("response_content")
+            ]
+            for key in completed:
                 await redis_manager.publish_message(
                     self.task_id,
                     SystemMessage(content=f"检测到已完成，跳过 {key}")
                 )
-                continue
-            await redis_manager.publish_message(
-                self.task_id,
-                SystemMessage(content=f"论文手开始写{key}部分"),
+            scheduler = SectionScheduler({key: [] for key in write_flows}, len(write_flows))
+            await scheduler.run(
+                lambda key: self._write_section_isolated(key, write_flows[key]),
+                completed=completed,
             )
+        else:
+            for key, value in write_flows.items():
+                if key in self.user_output.res and self.user_output.res[key].get("response_content"):
+                    await redis_manager.publish_message(
+                        self.task_id,
+                        SystemMessage(content=f"检测到已完成，跳过 {key}")
+                    )
+                    continue
+                await self._write_section(key, value, writer_agent)
 
-            while True:
-                writer_response = await writer_agent.run(prompt=value, sub_title=key)
+    async def _write_section(self, key: str, prompt: str, writer_agent: WriterAgent):
+        """论文手撰写一个不依赖代码结果的部分（写作阶段）"""
+        await redis_manager.publish_message(
+            self.task_id,
+            SystemMessage(content=f"论文手开始写{key}部分"),
+        )
 
-                # 检查点：WriterAgent 写作完成（写作阶段）
-                feedback = await CheckpointControl.prompt_and_wait(
-                    self.task_id, agent="WriterAgent", sub_title=key, timeout_sec=10
-                )
-                if feedback:
-                    await writer_agent.append_chat_history({"role": "user", "content": feedback})
-                    continue
-                break
+        while True:
+            writer_response = await writer_agent.run(prompt=prompt, sub_title=key)
+
+            # 检查点：WriterAgent 写作完成（写作阶段）
+            feedback = await CheckpointControl.prompt_and_wait(
+                self.task_id, agent="WriterAgent", sub_title=key, timeout_sec=10
+            )
+            if feedback:
+                await writer_agent.append_chat_history({"role": "user", "content": feedback})
+                continue
+            break
 
-            user_output.set_res(key, writer_response)
+        self.user_output.set_res(key, writer_response)
 
-        logger.info(user_output.get_res())
+    async def _write_section_isolated(self, key: str, prompt: str):
+        """并发写作：每个部分使用独立的论文手，同一提供方的并发请求由 llm_limiter 限制"""
+        await self._write_section(key, prompt, self._create_writer_agent())
 
-        user_output.save_result()
+    def _with_dependency_context(self, key: str, coder_prompt: str, dependencies: list[str]) -> str:
+        """独立内核中没有前序小节的变量，把前序小节的结论与数据位置写进提示词"""
+        lines = [coder_prompt, f"保存图片时文件名以 {key}_ 开头。"]
+        if dependencies:
+            lines.append(
+                "本小节在独立的 Python 环境中求解，前序小节定义的变量不可用，"
+                "需要的数据请从当前目录重新读取（EDA 清洗后的数据已保存在当前目录下）。"
+            )
+        summaries = []
+        for dep in dependencies:
+            result = self.coder_results.get(dep)
+            if result is not None and result.code_response:
+                summaries.append(f"- {dep}：{result.code_response[:DEPENDENCY_SUMMARY_CHARS]}")
+        if summaries:
+            lines.append("前序小节的结论：")
+            lines.extend(summaries)
+        return "\n".join(lines)
@@ -7,6 +7,15 @@ from app.utils.log_util import logger
 from app.config.setting import settings
 from fastapi.staticfiles import StaticFiles
 from app.utils.cli import get_ascii_banner, center_cli_str
+from app.tools.kernel_pool import kernel_pool
+from app.tools.sandbox_pool import sandbox_pool
+from app.services.message_journal import message_journal
+from app.services.ws_hub import message_hub
+from app.services.control_plane import control_plane
+from app.services.redis_manager import redis_manager
+from app.core.llm.http_pool import http_pool
+from app.tools import openalex_scholar
+from app.tools.literature_index import local_literature
 
 
 @asynccontextmanager
@@ -18,8 +27,26 @@ async def lifespan(app: FastAPI):
     PROJECT_FOLDER = "./project"
     os.makedirs(PROJECT_FOLDER, exist_ok=True)
 
+    # 未配置 E2B 时使用本地解释器，提前预热内核池；否则预热远程沙箱池
+    if not settings.E2B_API_KEY:
+        await kernel_pool.start()
+    else:
+        await sandbox_pool.start()
+
+    # LLM 请求复用同一组 keep-alive 连接
+    http_pool.install()
+
     yield
     logger.info("Stopping MathModelAgent")
+    await http_pool.close()
+    await openalex_scholar.close_http_client()
+    local_literature.close()
+    await kernel_pool.shutdown()
+    await sandbox_pool.shutdown()
+    await message_hub.close()
+    await control_plane.close()
+    await redis_manager.close()
+    await message_journal.close()
 
 
 app = FastAPI(
@@ -52,6 +52,9 @@ class UserOutput:
             "response_content": writer_response.response_content,
             "footnotes": writer_response.footnotes,
         }
+        # 小节可能乱序完成（并行/流水线求解），按论文顺序排列
+        order = {k: i for i, k in enumerate(self.seq)}
+        self.res = dict(sorted(self.res.items(), key=lambda item: order.get(item[0], len(order))))
         # 每次写入后进行增量持久化，便于断点续跑
         try:
             partial_path = os.path.join(self.work_dir, "res.partial.json")
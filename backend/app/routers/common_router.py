@@ -4,6 +4,19 @@ from app.utils.common_utils import get_config_template
 from app.schemas.enums import CompTemplate
 from app.services.redis_manager import redis_manager
 from app.utils.log_util import logger
+from app.tools.kernel_pool import kernel_pool
+from app.tools.sandbox_pool import sandbox_pool
+from app.services.ws_hub import message_hub
+from app.services.control_plane import control_plane
+from app.core.llm.retry import llm_retry
+from app.core.llm.cache import llm_cache
+from app.core.llm.limiter import llm_limiter
+from app.core.llm.http_pool import http_pool
+from app.services.model_validation import model_validator
+from app.tools.openalex_scholar import search_cache_metrics
+from app.tools.literature_index import local_literature
+from app.tools.sandbox_sync import sync_metrics
+from app.utils.trace import trace
 
 router = APIRouter()
 
@@ -57,3 +70,43 @@ async def get_service_status():
         status["redis"] = {"status": "error", "message": f"Redis connection failed: {str(e)}"}
 
     return status
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """获取运行时指标"""
+    return {
+        "redis": redis_manager.metrics(),
+        "kernel_pool": kernel_pool.metrics(),
+        "sandbox_pool": sandbox_pool.metrics(),
+        "message_hub": message_hub.metrics(),
+        "control_plane": control_plane.metrics(),
+        "llm_retry": llm_retry.metrics(),
+        "llm_cache": llm_cache.metrics(),
+        "llm_limiter": llm_limiter.metrics(),
+        "llm_http_pool": http_pool.metrics(),
+        "model_validation": model_validator.metrics(),
+        "openalex_cache": search_cache_metrics(),
+        "literature_index": local_literature.metrics(),
+        "sandbox_sync": sync_metrics(),
+    }
+
+
+@router.get("/trace")
+async def get_trace():
+    """获取开启调试追踪的任务"""
+    return {"tasks": trace.tasks()}
+
+
+@router.put("/trace/{task_id}")
+async def enable_trace(task_id: str):
+    """开启任务的调试追踪，task_id 为 * 时追踪全部任务"""
+    trace.enable(task_id)
+    return {"tasks": trace.tasks()}
+
+
+@router.delete("/trace/{task_id}")
+async def disable_trace(task_id: str):
+    """关闭任务的调试追踪，task_id 为 * 时全部关闭"""
+    trace.disable(None if task_id == trace.ALL else task_id)
+    return {"tasks": trace.tasks()}
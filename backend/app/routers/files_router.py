@@ -6,7 +6,12 @@ from icecream import ic
 from fastapi import HTTPException
 from datetime import datetime
 from app.services.redis_manager import redis_manager
-from pathlib import Path
+from app.utils.log_util import logger
+from app.services.message_journal import message_journal
+from app.services.control_plane import control_plane
+from app.core.llm.retry import llm_retry
+from fastapi.responses import StreamingResponse
+import json
 import zipfile
 
 router = APIRouter()
@@ -150,27 +155,65 @@ async def list_tasks():
 
 
 @router.get("/task_messages")
-async def get_task_messages(task_id: str):
+async def get_task_messages(
+    task_id: str, offset: int = 0, limit: int | None = None, after: str | None = None
+):
     """读取历史任务消息（用于查看历史任务页）。
 
-    来源：后端在运行期会把每条消息追加到 logs/messages/{task_id}.json
-    此接口直接把该文件内容读取并返回；若不存在返回空列表。
+    来源：优先读取 Redis 中的任务事件流（消息带 stream_id，可用于 WebSocket
+    续传）；事件流不存在或已被裁剪时，回退到 logs/messages/{task_id}.jsonl
+    - 指定 limit 时按 offset/limit 分页返回；事件流可用时也可传入上一页最后一条的
+      stream_id 作为 after 游标，直接从该位置读取
+    - 未指定 limit 时以流式 JSON 数组返回全部消息，不整体加载
+    若不存在返回空列表。
     """
-    path = Path("logs/messages") / f"{task_id}.json"
-    if not path.exists():
-        return []
     try:
-        import json
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        # 基本校验：必须是数组
-        if isinstance(data, list):
-            return data
-        return []
+        length = await redis_manager.get_stream_length(task_id)
     except Exception as e:
+        logger.warning(f"读取事件流失败，回退到消息日志: {e}")
+        length = None
+    if length is not None:
+        if after is None and offset >= length:
+            return []
+        messages = redis_manager.iter_stream(task_id, offset, limit, after)
+        if limit is not None:
+            return [msg async for msg in messages]
+        return StreamingResponse(_stream_json_array(messages), media_type="application/json")
+
+    try:
+        if limit is not None:
+            return await message_journal.read_messages(task_id, offset, limit)
+        messages = await message_journal.iter_messages(task_id, offset)
+    except Exception:
         # 读取失败时返回空数组，避免前端崩溃
         return []
 
+    def stream_json_array():
+        yield "["
+        first = True
+        try:
+            for msg in messages:
+                yield ("" if first else ",") + json.dumps(msg, ensure_ascii=False)
+                first = False
+        except Exception:
+            pass
+        yield "]"
+
+    return StreamingResponse(stream_json_array(), media_type="application/json")
+
+
+async def _stream_json_array(messages):
+    """把事件流消息逐页输出为 JSON 数组"""
+    yield "["
+    first = True
+    try:
+        async for msg in messages:
+            yield ("" if first else ",") + json.dumps(msg, ensure_ascii=False)
+            first = False
+    except Exception as e:
+        logger.warning(f"读取事件流中断: {e}")
+    yield "]"
+
 
 @router.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
@@ -179,7 +222,7 @@ async def delete_task(task_id: str):
     操作内容：
     - 若任务在运行，先尝试取消
     - 删除工作目录 `project/work_dir/{task_id}`
-    - 删除消息日志 `logs/messages/{task_id}.json`
+    - 删除消息日志 `logs/messages/{task_id}.jsonl`
     - 清理与该任务相关的 Redis 键
     """
     from app.services.task_registry import task_registry
@@ -202,9 +245,7 @@ async def delete_task(task_id: str):
 
     # 3) 删除消息日志
     try:
-        log_path = Path("logs/messages") / f"{task_id}.json"
-        if log_path.exists():
-            log_path.unlink(missing_ok=True)
+        await message_journal.delete(task_id)
     except Exception:
         pass
 
@@ -215,6 +256,7 @@ async def delete_task(task_id: str):
             f"task_id:{task_id}",
             f"task:{task_id}:payload",
             f"task:{task_id}:status",
+            redis_manager.stream_key(task_id),
             PAUSE_KEY_TPL.format(task_id=task_id),
         ]
         try:
@@ -228,5 +270,8 @@ async def delete_task(task_id: str):
                     pass
     except Exception:
         pass
+    control_plane.forget(task_id)
+    redis_manager.forget_task(task_id)
+    llm_retry.forget_task(task_id)
 
     return {"success": True, "message": "任务已删除"}
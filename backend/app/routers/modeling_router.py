@@ -18,9 +18,11 @@ from icecream import ic
 from app.schemas.request import ExampleRequest
 from pydantic import BaseModel
 import litellm
+from app.services.model_validation import model_validator
 from app.config.setting import settings
 import requests
 from app.services.task_control import TaskControl
+from app.services.control_plane import control_plane
 from app.services.task_registry import task_registry
 import json as pyjson
 import shutil
@@ -94,6 +96,8 @@ async def save_api_config(request: SaveApiConfigRequest):
         if request.openalex_email:
             settings.OPENALEX_EMAIL = request.openalex_email
 
+        # 校验缓存按 (api_key 哈希, 模型, base_url) 区分，配置变化的角色自然未命中，无需清空
+
         return {"success": True, "message": "配置保存成功"}
     except Exception as e:
         logger.error(f"保存配置失败: {str(e)}")
@@ -111,16 +115,10 @@ async def validate_api_key(request: ValidateApiKeyRequest):
             litellm.drop_params = True
         except Exception:
             pass
-        # 使用 litellm 发送测试请求
-        kwargs = {
-            "api_key": request.api_key,
-            "messages": [{"role": "user", "content": "hi"}],
-            "model": request.model_id,
-        }
-        if request.base_url and request.base_url != "https://api.openai.com/v1":
-            kwargs["base_url"] = request.base_url
-        # logger.info(f"Validating API Key with params: {kwargs}")
-        await litellm.acompletion(**kwargs)
+        # 使用 litellm 发送测试请求，成功结果写入校验缓存，随后启动任务时无需再次校验
+        await model_validator.check(
+            request.api_key, request.model_id, request.base_url, force=True
+        )
 
         return ValidateApiKeyResponse(valid=True, message="✓ 模型 API 验证成功")
     except Exception as e:
@@ -286,34 +284,6 @@ async def run_modeling_task_async(
 ):
     logger.info(f"run modeling task for task_id: {task_id}")
 
-    # 在任务开始前自动校验四个 Agent 的模型配置
-    async def _validate_single(name: str, api_key: str | None, model_id: str | None, base_url: str | None) -> str | None:
-        if not model_id or model_id.strip() == "":
-            return f"{name}: 模型未配置"
-        try:
-            kwargs = {
-                "api_key": api_key,
-                "messages": [{"role": "user", "content": "hi"}],
-                "model": model_id,
-            }
-            if base_url and base_url != "https://api.openai.com/v1":
-                kwargs["base_url"] = base_url
-            logger.info(f"{name} 验证参数: {kwargs}")
-            await litellm.acompletion(**kwargs)
-            return None
-        except Exception as e:
-            return f"{name}: 验证失败 - {str(e)[:200]}"
-
-    async def _validate_all() -> list[str]:
-        tasks = [
-            _validate_single("Coordinator", settings.COORDINATOR_API_KEY, settings.COORDINATOR_MODEL, settings.COORDINATOR_BASE_URL),
-            _validate_single("Modeler", settings.MODELER_API_KEY, settings.MODELER_MODEL, settings.MODELER_BASE_URL),
-            _validate_single("Coder", settings.CODER_API_KEY, settings.CODER_MODEL, settings.CODER_BASE_URL),
-            _validate_single("Writer", settings.WRITER_API_KEY, settings.WRITER_MODEL, settings.WRITER_BASE_URL),
-        ]
-        results = await asyncio.gather(*tasks)
-        return [r for r in results if r]
-
     # 发送任务开始状态
     await redis_manager.publish_message(
         task_id,
@@ -323,8 +293,8 @@ async def run_modeling_task_async(
     # 给一个短暂的延迟，确保 WebSocket 有机会连接
     await asyncio.sleep(1)
 
-    # 执行验证
-    validation_errors = await _validate_all()
+    # 在任务开始前自动校验四个 Agent 的模型配置（近期校验通过的配置直接跳过）
+    validation_errors = await model_validator.validate_all(task_id)
     if validation_errors:
         msg = "\n".join(validation_errors)
         await redis_manager.publish_message(
@@ -404,6 +374,8 @@ async def task_start(task_id: str):
     await redis_manager.publish_message(task_id, SystemMessage(content="任务开始执行"))
 
     async def runner():
+        # 任务内发出的 Redis 命令计入该任务
+        redis_manager.bind_task(task_id)
         try:
             # 还原 Problem
             comp_template = CompTemplate.CHINA
@@ -433,38 +405,10 @@ async def task_start(task_id: str):
             )
 
             # 执行原有流程（不经 BackgroundTasks，便于取消）
-            # 校验
-            async def _validate_single(name: str, api_key: str | None, model_id: str | None, base_url: str | None) -> str | None:
-                if not model_id or model_id.strip() == "":
-                    return f"{name}: 模型未配置"
-                try:
-                    kwargs = {
-                        "api_key": api_key,
-                        "messages": [{"role": "user", "content": "hi"}],
-                        "model": model_id,
-                    }
-                    if base_url and base_url != "https://api.openai.com/v1":
-                        kwargs["base_url"] = base_url
-                    logger.info(f"{name} 验证参数: {kwargs}")
-                    await litellm.acompletion(**kwargs)
-                    return None
-                except Exception as e:
-                    return f"{name}: 验证失败 - {str(e)[:200]}"
-
-            async def _validate_all() -> list[str]:
-                tasks = [
-                    _validate_single("Coordinator", settings.COORDINATOR_API_KEY, settings.COORDINATOR_MODEL, settings.COORDINATOR_BASE_URL),
-                    _validate_single("Modeler", settings.MODELER_API_KEY, settings.MODELER_MODEL, settings.MODELER_BASE_URL),
-                    _validate_single("Coder", settings.CODER_API_KEY, settings.CODER_MODEL, settings.CODER_BASE_URL),
-                    _validate_single("Writer", settings.WRITER_API_KEY, settings.WRITER_MODEL, settings.WRITER_BASE_URL),
-                ]
-                results = await asyncio.gather(*tasks)
-                return [r for r in results if r]
-
             await redis_manager.publish_message(task_id, SystemMessage(content="任务开始处理"))
             await asyncio.sleep(1)
 
-            validation_errors = await _validate_all()
+            validation_errors = await model_validator.validate_all(task_id)
             if validation_errors:
                 msg = "\n".join(validation_errors)
                 await redis_manager.publish_message(task_id, SystemMessage(content=f"模型配置验证失败:\n{msg}", type="error"))
@@ -504,6 +448,7 @@ async def checkpoint_respond(task_id: str, req: CheckpointRespondRequest):
             # 标记进入反馈输入态：后端暂停倒计时
             await client.set(hold_key, "1")
             await client.expire(hold_key, 3600)  # 最多保留 1h，避免无限挂起
+            await control_plane.signal(task_id, "checkpoint", checkpoint_id=req.checkpoint_id)
         else:
             # 收到继续/反馈提交：写入响应并清理 hold
             payload = {"action": req.action, "content": req.content or ""}
@@ -513,6 +458,8 @@ async def checkpoint_respond(task_id: str, req: CheckpointRespondRequest):
                 await client.delete(hold_key)
             except Exception:
                 pass
+            # 唤醒等待该检查点的工作流
+            await control_plane.signal(task_id, "checkpoint", checkpoint_id=req.checkpoint_id)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"提交失败: {e}")
@@ -1,15 +1,29 @@
-from fastapi import WebSocket, WebSocketDisconnect, APIRouter
+from fastapi import WebSocket, APIRouter
 from app.services.redis_manager import redis_manager
 from app.schemas.response import SystemMessage
 import asyncio
 from app.services.ws_manager import ws_manager
-import json
+from app.services.ws_hub import (
+    message_hub,
+    Subscription,
+    SubscriptionOverflow,
+    RESYNC_CLOSE_CODE,
+)
 from app.utils.log_util import logger
+
 router = APIRouter()
 
 
 @router.websocket("/task/{task_id}")
-async def websocket_endpoint(websocket: WebSocket, task_id: str):
+async def websocket_endpoint(
+    websocket: WebSocket, task_id: str, last_id: str | None = None
+):
+    """推送任务消息
+
+    Args:
+        last_id: 客户端已收到的最后一条消息的 stream_id；提供时先从事件流
+            补发其后的全部消息，再继续推送实时消息（断线续传）
+    """
     logger.info(f"WebSocket 尝试连接 task_id: {task_id}")
 
     redis_async_client = await redis_manager.get_client()
@@ -24,44 +38,78 @@ async def websocket_endpoint(websocket: WebSocket, task_id: str):
     websocket.timeout = 500
     logger.info(f"WebSocket connection status: {websocket.client}")
 
-    # 订阅 Redis 频道
-    pubsub = await redis_manager.subscribe_to_task(task_id)
-    logger.info(f"Subscribed to Redis channel: task:{task_id}:messages")
-
-    await redis_manager.publish_message(
-        task_id,
-        SystemMessage(content="任务开始处理"),
-    )
-
+    sub = None
     try:
-        while True:
+        # 订阅任务消息（先订阅再补发，避免两者之间的消息丢失）
+        sub = await message_hub.subscribe(task_id)
+        logger.info(f"Subscribed to task messages: {task_id}")
+
+        # 断线续传：补发 last_id 之后的消息，记录游标用于去重
+        cursor = None
+        if last_id:
             try:
-                msg = await pubsub.get_message(ignore_subscribe_messages=True)
-                if msg:
-                    print(f"Received message: {msg}")
-                    try:
-                        msg_dict = json.loads(msg["data"])
-                        await ws_manager.send_personal_message_json(
-                            msg_dict, websocket
-                        )
-                        logger.info(f"Sent message to WebSocket: {msg_dict}")
-                    except Exception as e:
-                        # 如果连接已关闭，退出循环，避免重复发送错误信息
-                        logger.error(f"Error sending/parsing message: {e}")
-                        break
-                await asyncio.sleep(0.1)
-
-            except WebSocketDisconnect:
-                logger.warning("WebSocket disconnected")
-                break
+                cursor = redis_manager.stream_id_key(last_id)
+                for msg_dict in await redis_manager.read_stream(
+                    task_id, after=last_id
+                ):
+                    await ws_manager.send_personal_message_json(msg_dict, websocket)
+                    cursor = redis_manager.stream_id_key(msg_dict["stream_id"])
+                logger.info(f"已补发 {last_id} 之后的消息")
             except Exception as e:
-                logger.error(f"Error in websocket loop: {e}")
-                await asyncio.sleep(1)
-                continue
+                logger.error(f"补发历史消息失败: {e}")
+
+        await redis_manager.publish_message(
+            task_id,
+            SystemMessage(content="任务开始处理"),
+        )
+
+        # 发送与断开检测并行，任一结束即关闭连接
+        sender = asyncio.create_task(_forward_messages(websocket, sub, cursor))
+        receiver = asyncio.create_task(_wait_disconnect(websocket))
+        done, pending = await asyncio.wait(
+            {sender, receiver}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if not task.cancelled() and task.exception():
+                logger.error(f"WebSocket error: {task.exception()}")
 
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        await pubsub.unsubscribe(f"task:{task_id}:messages")
+        if sub is not None:
+            message_hub.unsubscribe(sub)
         ws_manager.disconnect(websocket)
         logger.info(f"WebSocket connection closed for task: {task_id}")
+
+
+async def _forward_messages(websocket: WebSocket, sub: Subscription, cursor):
+    """把分发中心推来的消息发给客户端，消息到达即发送
+
+    发送队列溢出时以 RESYNC_CLOSE_CODE 关闭连接，客户端带 last_id 重连补回缺失的消息
+    """
+    while True:
+        try:
+            msg_dict = await sub.get()
+        except SubscriptionOverflow:
+            logger.warning(f"发送队列溢出，关闭连接等待客户端续传 task_id: {sub.task_id}")
+            await websocket.close(code=RESYNC_CLOSE_CODE, reason="resync")
+            return
+        stream_id = msg_dict.get("stream_id")
+        if cursor and stream_id:
+            # 已在补发阶段发送过的消息直接跳过
+            if redis_manager.stream_id_key(stream_id) <= cursor:
+                continue
+        # 直接发送，连接已关闭时抛出异常结束转发
+        await websocket.send_json(msg_dict)
+        logger.debug(f"Sent message to WebSocket: {msg_dict.get('id')}")
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    """客户端不发送业务消息，这里只用于及时感知断开"""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            logger.warning("WebSocket disconnected")
+            return
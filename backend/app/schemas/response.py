@@ -33,6 +33,10 @@ class UserMessage(Message):
 class AgentMessage(Message):
     msg_type: str = "agent"
     agent_type: AgentType  # CoordinatorAgent | ModelerAgent | CoderAgent | WriterAgent
+    # 流式输出的增量片段：content 为新增文本，delta_offset 为其在完整文本中的起点
+    # （为 0 表示重新开始）。片段与最终完整消息共用同一 id，最终消息 streaming=False
+    streaming: bool = False
+    delta_offset: int | None = None
 
 
 class ModelerMessage(AgentMessage):
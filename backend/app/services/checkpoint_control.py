@@ -1,4 +1,3 @@
-import asyncio
 import json
 import time
 from typing import Optional
@@ -6,6 +5,7 @@ from typing import Optional
 from pydantic import BaseModel
 
 from app.services.redis_manager import redis_manager
+from app.services.control_plane import control_plane, SAFETY_RECHECK_INTERVAL
 from app.schemas.response import SystemMessage, UserMessage
 from uuid import uuid4
 
@@ -56,48 +56,56 @@ class CheckpointControl:
             ),
         )
 
-        # 轮询等待用户响应（Redis Key）
+        # 等待用户响应：响应写入 Redis Key 后经控制通道唤醒，不再轮询
         client = await redis_manager.get_client()
         key = CHECKPOINT_KEY_TPL.format(task_id=task_id, checkpoint_id=checkpoint_id)
+        hold_key = CHECKPOINT_HOLD_KEY_TPL.format(task_id=task_id, checkpoint_id=checkpoint_id)
+        topic = f"checkpoint:{checkpoint_id}"
+        event = control_plane.watch(task_id, topic)
         start_time = time.time()
         deadline = start_time + timeout_sec
-        while True:
-            val = await client.get(key)
-            if val:
-                try:
-                    data = json.loads(val)
-                except Exception:
-                    data = {"action": "continue"}
-                # 使用一次即清理
-                try:
-                    await client.delete(key)
-                except Exception:
-                    pass
+        try:
+            while True:
+                # 先清除再读取，避免读取之后到达的信号被漏掉
+                event.clear()
+                val = await client.get(key)
+                if val:
+                    try:
+                        data = json.loads(val)
+                    except Exception:
+                        data = {"action": "continue"}
+                    # 使用一次即清理
+                    try:
+                        await client.delete(key)
+                    except Exception:
+                        pass
 
-                act = (data.get("action") or "continue").lower()
-                if act == "feedback":
-                    content = (data.get("content") or "").strip()
-                    if content:
-                        # 将用户反馈同步到对话栏
-                        await redis_manager.publish_message(task_id, UserMessage(content=content))
-                        return content
-                    # 空内容则当继续
+                    act = (data.get("action") or "continue").lower()
+                    if act == "feedback":
+                        content = (data.get("content") or "").strip()
+                        if content:
+                            # 将用户反馈同步到对话栏
+                            await redis_manager.publish_message(task_id, UserMessage(content=content))
+                            return content
+                        # 空内容则当继续
+                        return None
+                    # 继续
                     return None
-                # 继续
-                return None
 
-            # 若进入反馈输入状态（前端已通知 hold），暂停倒计时，直到 hold 解除
-            hold_key = CHECKPOINT_HOLD_KEY_TPL.format(task_id=task_id, checkpoint_id=checkpoint_id)
-            in_hold = bool(await client.exists(hold_key))
-            if in_hold:
-                await asyncio.sleep(0.3)
-                # 继续下一轮检查，不推进超时
-                continue
+                # 若进入反馈输入状态（前端已通知 hold），暂停倒计时，直到 hold 解除
+                in_hold = bool(await client.exists(hold_key))
+                if in_hold:
+                    # 不推进超时，等待响应信号或兜底复查
+                    await control_plane.wait(event, SAFETY_RECHECK_INTERVAL)
+                    continue
 
-            # 未 hold，正常走超时逻辑
-            if time.time() >= deadline:
-                return None
-            await asyncio.sleep(0.2)
+                # 未 hold，正常走超时逻辑
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                await control_plane.wait(event, min(remaining, SAFETY_RECHECK_INTERVAL))
+        finally:
+            control_plane.unwatch(task_id, topic, event)
 
         # 超时自动继续
         return None
@@ -0,0 +1,188 @@
+import asyncio
+import json
+from uuid import uuid4
+from app.services.redis_manager import redis_manager
+from app.utils.log_util import logger
+
+
+CONTROL_CHANNEL_TPL = "task:{task_id}:control"
+
+# 兜底复查间隔（秒）：控制消息丢失（如 pubsub 断线）时，等待方最迟在此间隔后
+# 重新读取 Redis 中的状态，保证不会永久挂起
+SAFETY_RECHECK_INTERVAL = 5.0
+
+
+class ControlPlane:
+    """任务控制信号（暂停/继续/检查点响应）的事件驱动通道
+
+    状态仍以 Redis 键为准，状态变更后额外在 task:{id}:control 频道发布一条
+    控制消息。每个进程只用一个 pubsub 连接接收这些消息，唤醒本进程内对应的
+    asyncio.Event，并维护暂停状态的本地缓存：等待方不再轮询 Redis，空闲时
+    没有任何 Redis 往返。
+    """
+
+    CHANNEL_PATTERN = "task:*:control"
+
+    def __init__(self):
+        # 标识本进程发出的信号：本地已立即生效，pubsub 回显时跳过，
+        # 避免回显晚于后续信号到达而覆盖较新的状态
+        self._origin = uuid4().hex
+        self._waiters: dict[tuple[str, str], set[asyncio.Event]] = {}
+        self._paused: dict[str, bool] = {}
+        self._versions: dict[str, int] = {}
+        self._ready = asyncio.Event()
+        self._listener: asyncio.Task | None = None
+        # 指标
+        self.signals_sent = 0
+        self.signals_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def watch(self, task_id: str, topic: str) -> asyncio.Event:
+        """登记一个等待者，收到该任务该主题的信号时 Event 被置位"""
+        self._ensure_listener()
+        event = asyncio.Event()
+        self._waiters.setdefault((task_id, topic), set()).add(event)
+        return event
+
+    def unwatch(self, task_id: str, topic: str, event: asyncio.Event):
+        events = self._waiters.get((task_id, topic))
+        if events is None:
+            return
+        events.discard(event)
+        if not events:
+            self._waiters.pop((task_id, topic), None)
+
+    @staticmethod
+    async def wait(event: asyncio.Event, timeout: float | None = None) -> bool:
+        """等待信号；超时返回 False"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def signal(self, task_id: str, kind: str, **fields):
+        """发布控制信号：本进程立即生效，其他进程经 pubsub 接收"""
+        payload = {"kind": kind, **fields}
+        self._apply(task_id, payload)
+        payload["origin"] = self._origin
+        self.signals_sent += 1
+        try:
+            client = await redis_manager.get_client()
+            await client.publish(
+                CONTROL_CHANNEL_TPL.format(task_id=task_id), json.dumps(payload)
+            )
+        except Exception as e:
+            # 其他进程的等待方会在兜底复查时读到 Redis 中的最新状态
+            logger.warning(f"发布控制信号失败: {e}")
+
+    async def is_paused(self, task_id: str, key: str, refresh: bool = False) -> bool:
+        """读取暂停状态；订阅正常时优先使用本地缓存，refresh 强制读取 Redis"""
+        self._ensure_listener()
+        if not refresh and self._ready.is_set() and task_id in self._paused:
+            self.cache_hits += 1
+            return self._paused[task_id]
+        self.cache_misses += 1
+        version = self._versions.get(task_id, 0)
+        client = await redis_manager.get_client()
+        paused = bool(await client.exists(key))
+        # 读取期间若收到了新信号，以信号为准，不写入可能过期的结果
+        if self._ready.is_set() and self._versions.get(task_id, 0) == version:
+            self._paused[task_id] = paused
+        return paused
+
+    def forget(self, task_id: str):
+        """清除任务的本地缓存（任务删除/重置时调用）"""
+        self._paused.pop(task_id, None)
+        self._versions.pop(task_id, None)
+
+    async def close(self):
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._ready.clear()
+        self._paused.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "connected": self._ready.is_set(),
+            "waiters": sum(len(s) for s in self._waiters.values()),
+            "cached_tasks": len(self._paused),
+            "signals_sent": self.signals_sent,
+            "signals_received": self.signals_received,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+
+    def _apply(self, task_id: str, payload: dict):
+        kind = payload.get("kind")
+        self._versions[task_id] = self._versions.get(task_id, 0) + 1
+        if kind in ("pause", "resume"):
+            self._paused[task_id] = kind == "pause"
+            topic = "pause"
+        elif kind == "checkpoint":
+            topic = f"checkpoint:{payload.get('checkpoint_id')}"
+        else:
+            return
+        for event in self._waiters.get((task_id, topic), ()):
+            event.set()
+
+    def _wake_all(self):
+        for events in self._waiters.values():
+            for event in events:
+                event.set()
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._run())
+
+    async def _run(self):
+        backoff = 0.5
+        while True:
+            pubsub = None
+            try:
+                client = await redis_manager.get_client()
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.psubscribe(self.CHANNEL_PATTERN)
+                # 订阅生效前的缓存可能漏掉了其他进程的信号，一律作废
+                self._paused.clear()
+                self._ready.set()
+                backoff = 0.5
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "pmessage":
+                        continue
+                    self.signals_received += 1
+                    task_id = (
+                        msg["channel"].removeprefix("task:").removesuffix(":control")
+                    )
+                    try:
+                        payload = json.loads(msg["data"])
+                    except json.JSONDecodeError:
+                        continue
+                    if payload.get("origin") == self._origin:
+                        continue
+                    self._apply(task_id, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 断线期间可能漏掉信号：清空缓存并唤醒所有等待方重新读取状态
+                self._ready.clear()
+                self._paused.clear()
+                self._wake_all()
+                logger.error(f"控制通道连接中断，{backoff}s 后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+
+control_plane = ControlPlane()
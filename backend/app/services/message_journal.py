@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator
+from app.utils.log_util import logger
+
+
+class MessageJournal:
+    """任务消息的追加式日志（JSON Lines）
+
+    每条消息占一行，写入只追加不重写。消息先进入内存缓冲，由后台任务
+    批量写盘并定期 fsync，不阻塞事件循环；读取时逐行解析，支持分页与流式输出。
+    """
+
+    def __init__(
+        self,
+        messages_dir: str = "logs/messages",
+        flush_interval: float = 0.5,
+        fsync_interval: float = 5.0,
+        max_buffer: int = 200,
+    ):
+        self.messages_dir = Path(messages_dir)
+        self.messages_dir.mkdir(parents=True, exist_ok=True)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_buffer = max_buffer
+        self._buffers: dict[str, list[str]] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._last_fsync: dict[str, float] = {}
+        self._unsynced: set[str] = set()  # 已写入但尚未 fsync 的任务
+        self._wakeup: asyncio.Event | None = None
+        self._flusher: asyncio.Task | None = None
+
+    def path(self, task_id: str) -> Path:
+        return self.messages_dir / f"{task_id}.jsonl"
+
+    def legacy_path(self, task_id: str) -> Path:
+        """旧版本整体重写的 JSON 数组文件"""
+        return self.messages_dir / f"{task_id}.json"
+
+    def append(self, task_id: str, message_json: str):
+        """追加一条已序列化的消息，实际写盘由后台批量完成"""
+        buffer = self._buffers.setdefault(task_id, [])
+        buffer.append(message_json)
+        self._ensure_flusher()
+        if len(buffer) >= self.max_buffer:
+            self._wakeup.set()
+
+    async def flush(self, task_id: str | None = None, fsync: bool = False):
+        """把缓冲区写入文件；不指定 task_id 时刷新全部任务"""
+        if task_id:
+            task_ids = [task_id]
+        else:
+            task_ids = list(self._buffers.keys() | self._unsynced)
+        for tid in task_ids:
+            lock = self._locks.setdefault(tid, asyncio.Lock())
+            async with lock:
+                lines = self._buffers.pop(tid, None)
+                now = time.monotonic()
+                do_fsync = fsync or (
+                    now - self._last_fsync.get(tid, 0.0) >= self.fsync_interval
+                )
+                if not lines and not (do_fsync and tid in self._unsynced):
+                    continue
+                try:
+                    await asyncio.to_thread(
+                        self._write_lines, self.path(tid), lines or [], do_fsync
+                    )
+                    if do_fsync:
+                        self._last_fsync[tid] = now
+                        self._unsynced.discard(tid)
+                    else:
+                        self._unsynced.add(tid)
+                except Exception as e:
+                    logger.error(f"写入消息日志失败: {str(e)}")
+                    # 写入失败时放回缓冲区，下一轮重试，保证顺序
+                    if lines:
+                        self._buffers[tid] = lines + self._buffers.get(tid, [])
+
+    async def iter_messages(
+        self, task_id: str, offset: int = 0, limit: int | None = None
+    ) -> Iterator[dict]:
+        """返回逐行读取消息的迭代器（先刷新该任务的缓冲区）"""
+        await self.flush(task_id)
+        return self._read_lines(task_id, offset, limit)
+
+    async def read_messages(
+        self, task_id: str, offset: int = 0, limit: int | None = None
+    ) -> list[dict]:
+        """读取一页消息，文件读取与解析放到线程中，不阻塞事件循环"""
+        await self.flush(task_id)
+        return await asyncio.to_thread(lambda: list(self._read_lines(task_id, offset, limit)))
+
+    async def delete(self, task_id: str):
+        lock = self._locks.setdefault(task_id, asyncio.Lock())
+        async with lock:
+            self._buffers.pop(task_id, None)
+            self._last_fsync.pop(task_id, None)
+            self._unsynced.discard(task_id)
+            for path in (self.path(task_id), self.legacy_path(task_id)):
+                path.unlink(missing_ok=True)
+        self._locks.pop(task_id, None)
+
+    async def close(self):
+        """停止后台写入并把剩余缓冲全部落盘"""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        self._flusher = None
+        await self.flush(fsync=True)
+
+    def _ensure_flusher(self):
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    @staticmethod
+    def _write_lines(path: Path, lines: list[str], do_fsync: bool):
+        with open(path, "a", encoding="utf-8") as f:
+            if lines:
+                f.write("\n".join(lines) + "\n")
+            f.flush()
+            if do_fsync:
+                os.fsync(f.fileno())
+
+    def _read_lines(
+        self, task_id: str, offset: int, limit: int | None
+    ) -> Iterator[dict]:
+        path = self.path(task_id)
+        if not path.exists():
+            # 兼容旧格式：整个文件是一个 JSON 数组
+            legacy = self.legacy_path(task_id)
+            if legacy.exists():
+                with open(legacy, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if isinstance(data, list):
+                    end = None if limit is None else offset + limit
+                    yield from data[offset:end]
+            return
+
+        index = 0
+        returned = 0
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                if index < offset:
+                    index += 1
+                    continue
+                if limit is not None and returned >= limit:
+                    return
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程异常退出可能留下半行，跳过即可
+                    continue
+                index += 1
+                returned += 1
+
+
+message_journal = MessageJournal()
@@ -0,0 +1,112 @@
+import asyncio
+import hashlib
+import time
+import litellm
+from app.config.setting import settings
+from app.core.llm.limiter import llm_limiter
+from app.utils.log_util import logger
+
+
+class ModelValidator:
+    """模型配置校验：向模型发送一次 "hi" 请求，成功结果按 (api_key 哈希, 模型, base_url) 缓存
+
+    - 缓存 MODEL_VALIDATION_TTL 秒内再次启动任务不再请求上游，失败结果不缓存
+    - 同一配置的并发校验合并为一次请求
+    - 配置变化即对应新的缓存键，每次启动前保存未变化的配置仍然命中
+    """
+
+    def __init__(self):
+        self._validated: dict[tuple[str, str, str], float] = {}  # key -> 校验通过的时间
+        self._inflight: dict[tuple[str, str, str], asyncio.Task] = {}
+        # 指标
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(api_key: str | None, model_id: str, base_url: str | None) -> tuple[str, str, str]:
+        digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+        return (digest, model_id, base_url or "")
+
+    def is_validated(self, key: tuple[str, str, str]) -> bool:
+        validated_at = self._validated.get(key)
+        if validated_at is None:
+            return False
+        if time.monotonic() - validated_at > settings.MODEL_VALIDATION_TTL:
+            del self._validated[key]
+            return False
+        return True
+
+    async def check(
+        self,
+        api_key: str | None,
+        model_id: str,
+        base_url: str | None,
+        task_id: str | None = None,
+        force: bool = False,
+    ):
+        """校验一个模型配置，失败时抛出上游异常；force 时忽略缓存（仍写入成功结果）"""
+        key = self.key(api_key, model_id, base_url)
+        if not force and self.is_validated(key):
+            self.hits += 1
+            return
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request(api_key, model_id, base_url, task_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        await asyncio.shield(task)
+        self._validated[key] = time.monotonic()
+
+    async def _request(
+        self, api_key: str | None, model_id: str, base_url: str | None, task_id: str | None
+    ):
+        kwargs = {
+            "api_key": api_key,
+            "messages": [{"role": "user", "content": "hi"}],
+            "model": model_id,
+        }
+        if base_url and base_url != "https://api.openai.com/v1":
+            kwargs["base_url"] = base_url
+        async with llm_limiter.limit((base_url or "", model_id), task_id):
+            await litellm.acompletion(**kwargs)
+
+    async def validate(
+        self,
+        name: str,
+        api_key: str | None,
+        model_id: str | None,
+        base_url: str | None,
+        task_id: str | None = None,
+    ) -> str | None:
+        """校验一个 Agent 的模型配置，返回错误信息，通过返回 None"""
+        if not model_id or model_id.strip() == "":
+            return f"{name}: 模型未配置"
+        try:
+            await self.check(api_key, model_id, base_url, task_id)
+            return None
+        except Exception as e:
+            return f"{name}: 验证失败 - {str(e)[:200]}"
+
+    async def validate_all(self, task_id: str | None = None) -> list[str]:
+        """并发校验四个 Agent 的模型配置，返回错误信息列表"""
+        started = time.monotonic()
+        results = await asyncio.gather(
+            self.validate("Coordinator", settings.COORDINATOR_API_KEY, settings.COORDINATOR_MODEL, settings.COORDINATOR_BASE_URL, task_id),
+            self.validate("Modeler", settings.MODELER_API_KEY, settings.MODELER_MODEL, settings.MODELER_BASE_URL, task_id),
+            self.validate("Coder", settings.CODER_API_KEY, settings.CODER_MODEL, settings.CODER_BASE_URL, task_id),
+            self.validate("Writer", settings.WRITER_API_KEY, settings.WRITER_MODEL, settings.WRITER_BASE_URL, task_id),
+        )
+        logger.info(f"模型配置校验耗时 {time.monotonic() - started:.2f}s")
+        return [r for r in results if r]
+
+    def metrics(self) -> dict:
+        return {
+            "validated": len(self._validated),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+model_validator = ModelValidator()
@@ -1,94 +1,321 @@
+import asyncio
+import json
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
 import redis.asyncio as aioredis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
 from typing import Optional
-import json
-from pathlib import Path
 from app.config.setting import settings
 from app.schemas.response import Message
+from app.services.message_journal import message_journal
 from app.utils.log_util import logger
 
+# 任务相关键（事件流等）的过期时间（秒）
+MESSAGE_TTL = 36000
+# 分页读取事件流时每次 XRANGE 取回的条数
+STREAM_PAGE_SIZE = 500
+
+# 当前上下文所属的任务，用于按任务统计 Redis 命令数
+_current_task: ContextVar[str | None] = ContextVar("redis_current_task", default=None)
+# 按任务统计的命令数，未归属任务的命令记在 "-" 下
+_command_counts: Counter = Counter()
+
+
+def _count_commands(n: int = 1):
+    _command_counts[_current_task.get() or "-"] += n
+
+
+class _CountingPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        _count_commands(len(self.command_stack))
+        try:
+            return await super().execute(raise_on_error)
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            redis_manager.mark_unhealthy(e)
+            raise
+
+
+class _CountingRedis(aioredis.Redis):
+    """统计命令数的 Redis 客户端，行为与 redis.asyncio.Redis 一致"""
+
+    async def execute_command(self, *args, **options):
+        _count_commands()
+        try:
+            return await super().execute_command(*args, **options)
+        except (RedisConnectionError, RedisTimeoutError) as e:
+            redis_manager.mark_unhealthy(e)
+            raise
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None):
+        return _CountingPipeline(
+            self.connection_pool, self.response_callbacks, transaction, shard_hint
+        )
+
 
 class RedisManager:
+    """Redis 客户端管理
+
+    只在创建连接和出错后做 PING 检测，正常调用 get_client() 不产生额外往返；
+    后台定时检查连接健康，失败时按退避间隔自动重连。
+    """
+
     def __init__(self):
         self.redis_url = settings.REDIS_URL
         self._client: Optional[aioredis.Redis] = None
-        # 创建消息存储目录
-        self.messages_dir = Path("logs/messages")
-        self.messages_dir.mkdir(parents=True, exist_ok=True)
+        self._healthy = False
+        self._connect_lock: asyncio.Lock | None = None
+        self._health_task: asyncio.Task | None = None
+        # 指标
+        self.pings = 0
+        self.connects = 0
+        self.failures = 0
 
     async def get_client(self) -> aioredis.Redis:
+        if self._client is not None and self._healthy:
+            return self._client
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            # 等锁期间可能已被其他协程连接好
+            if self._client is not None and self._healthy:
+                return self._client
+            await self._connect()
+        return self._client
+
+    async def _connect(self):
         if self._client is None:
-            self._client = aioredis.Redis.from_url(
+            self._client = _CountingRedis.from_url(
                 self.redis_url,
                 decode_responses=True,
                 max_connections=settings.REDIS_MAX_CONNECTIONS,
             )
         try:
-            await self._client.ping()
-            logger.info(f"Redis 连接建立成功: {self.redis_url}")
-            return self._client
+            await self._ping()
         except Exception as e:
             logger.error(f"无法连接到Redis: {str(e)}")
             raise
+        self._healthy = True
+        self.connects += 1
+        logger.info(f"Redis 连接建立成功: {self.redis_url}")
+        self._ensure_health_checker()
 
-    async def set(self, key: str, value: str):
-        """设置Redis键值对"""
-        client = await self.get_client()
-        await client.set(key, value)
-        await client.expire(key, 36000)
+    async def _ping(self):
+        self.pings += 1
+        await self._client.ping()
+
+    def mark_unhealthy(self, error: Exception | None = None):
+        """标记连接异常：下次 get_client() 会重新检测，后台任务负责重连"""
+        if self._healthy:
+            logger.warning(f"Redis 连接异常，等待重连: {error}")
+        self._healthy = False
+        self.failures += 1
 
-    async def _save_message_to_file(self, task_id: str, message: Message):
-        """将消息保存到文件中，同一任务的消息保存在同一个文件中"""
+    def _ensure_health_checker(self):
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    async def _health_check_loop(self):
+        interval = settings.REDIS_HEALTH_CHECK_INTERVAL
+        backoff = 0.5
+        while True:
+            await asyncio.sleep(interval if self._healthy else backoff)
+            try:
+                await self._ping()
+                if not self._healthy:
+                    self._healthy = True
+                    self.connects += 1
+                    logger.info(f"Redis 重新连接成功: {self.redis_url}")
+                backoff = 0.5
+            except Exception as e:
+                self.mark_unhealthy(e)
+                backoff = min(backoff * 2, 30)
+
+    @contextmanager
+    def track(self, task_id: str):
+        """在此上下文（及其中创建的子任务）内发出的命令计入该任务"""
+        token = _current_task.set(task_id)
         try:
-            # 确保目录存在
-            self.messages_dir.mkdir(exist_ok=True)
+            yield
+        finally:
+            _current_task.reset(token)
 
-            # 使用任务ID作为文件名
-            file_path = self.messages_dir / f"{task_id}.json"
+    @staticmethod
+    def bind_task(task_id: str):
+        """把当前协程（及之后创建的子任务）的命令计入该任务，适用于任务入口"""
+        _current_task.set(task_id)
 
-            # 读取现有消息（如果文件存在）
-            messages = []
-            if file_path.exists():
-                with open(file_path, "r", encoding="utf-8") as f:
-                    messages = json.load(f)
+    @staticmethod
+    def command_counts(task_id: str | None = None) -> dict | int:
+        if task_id is not None:
+            return _command_counts.get(task_id, 0)
+        return dict(_command_counts)
 
-            # 添加新消息
-            message_data = message.model_dump()
-            messages.append(message_data)
+    @staticmethod
+    def forget_task(task_id: str):
+        _command_counts.pop(task_id, None)
 
-            # 保存所有消息到文件
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(messages, f, ensure_ascii=False, indent=2)
+    def metrics(self) -> dict:
+        return {
+            "healthy": self._healthy,
+            "connects": self.connects,
+            "failures": self.failures,
+            "pings": self.pings,
+            "commands_total": sum(_command_counts.values()),
+            "commands_by_task": dict(_command_counts.most_common(20)),
+        }
 
-            logger.debug(f"消息已追加到文件: {file_path}")
+    async def set(self, key: str, value: str):
+        """设置Redis键值对"""
+        client = await self.get_client()
+        await client.set(key, value)
+        await client.expire(key, MESSAGE_TTL)
+
+    async def _save_message_to_file(self, task_id: str, message_json: str):
+        """将消息追加到任务的消息日志，由 message_journal 批量异步落盘"""
+        try:
+            message_journal.append(task_id, message_json)
         except Exception as e:
             logger.error(f"保存消息到文件失败: {str(e)}")
             # 不抛出异常，确保主流程不受影响
 
-    async def publish_message(self, task_id: str, message: Message):
-        """发布消息到特定任务的频道并保存到文件"""
+    @staticmethod
+    def stream_key(task_id: str) -> str:
+        return f"task:{task_id}:stream"
+
+    async def publish_message(
+        self, task_id: str, message: Message, persist: bool = True
+    ):
+        """发布消息：写入任务事件流（可重放），再推送到实时频道并保存到文件
+
+        推送到频道的消息带有 stream_id，WebSocket 以此续传与去重。
+        persist=False 时只推送到实时频道（如流式输出的增量片段），不入流、不落盘。
+        """
+        with self.track(task_id):
+            if persist:
+                await self._publish_message(task_id, message)
+            else:
+                client = await self.get_client()
+                await client.publish(
+                    f"task:{task_id}:messages", message.model_dump_json()
+                )
+
+    async def _publish_message(self, task_id: str, message: Message):
         client = await self.get_client()
         channel = f"task:{task_id}:messages"
         try:
             message_json = message.model_dump_json()
-            await client.publish(channel, message_json)
+            stream_key = self.stream_key(task_id)
+            async with client.pipeline(transaction=False) as pipe:
+                pipe.xadd(
+                    stream_key,
+                    {"data": message_json},
+                    maxlen=settings.REDIS_STREAM_MAXLEN,
+                    approximate=True,
+                )
+                pipe.expire(stream_key, MESSAGE_TTL)
+                stream_id, _ = await pipe.execute()
+            await client.publish(channel, self._with_stream_id(message_json, stream_id))
             logger.debug(
                 f"消息已发布到频道 {channel}:mes_type:{message.msg_type}:msg_content:{message.content}"
             )
             # 保存消息到文件
-            await self._save_message_to_file(task_id, message)
+            await self._save_message_to_file(task_id, message_json)
         except Exception as e:
             logger.error(f"发布消息失败: {str(e)}")
             raise
 
-    async def subscribe_to_task(self, task_id: str):
-        """订阅特定任务的消息"""
+    @staticmethod
+    def _with_stream_id(message_json: str, stream_id: str) -> str:
+        data = json.loads(message_json)
+        data["stream_id"] = stream_id
+        return json.dumps(data, ensure_ascii=False)
+
+    async def read_stream(
+        self, task_id: str, after: str | None = None, count: int | None = None
+    ) -> list[dict]:
+        """按顺序读取任务事件流中 after（不含）之后的消息，附带 stream_id"""
+        messages, _ = await self._read_stream_page(task_id, after, count)
+        return messages
+
+    async def _read_stream_page(
+        self, task_id: str, after: str | None, count: int | None
+    ) -> tuple[list[dict], str | None]:
+        """读取一页事件流，返回解析后的消息与本页最后一条的 stream_id（用作下一页的游标）"""
         client = await self.get_client()
-        pubsub = client.pubsub()
-        await pubsub.subscribe(f"task:{task_id}:messages")
-        return pubsub
+        start = f"({after}" if after else "-"
+        entries = await client.xrange(self.stream_key(task_id), min=start, count=count)
+        messages = []
+        for stream_id, fields in entries:
+            try:
+                data = json.loads(fields["data"])
+            except (KeyError, json.JSONDecodeError):
+                continue
+            data["stream_id"] = stream_id
+            messages.append(data)
+        return messages, entries[-1][0] if entries else None
+
+    async def iter_stream(
+        self,
+        task_id: str,
+        offset: int = 0,
+        limit: int | None = None,
+        after: str | None = None,
+    ):
+        """以 XRANGE COUNT 按游标分页遍历事件流：跳过前 offset 条，最多返回 limit 条
+
+        每次只取回一页，不把整个流加载到内存
+        """
+        remaining = limit
+        while remaining is None or remaining > 0:
+            count = STREAM_PAGE_SIZE
+            if remaining is not None:
+                count = min(count, offset + remaining)
+            page, after = await self._read_stream_page(task_id, after, count)
+            if after is None:
+                return
+            if offset >= len(page):
+                offset -= len(page)
+                continue
+            page = page[offset:] if remaining is None else page[offset : offset + remaining]
+            offset = 0
+            for message in page:
+                yield message
+            if remaining is not None:
+                remaining -= len(page)
+
+    async def get_stream_length(self, task_id: str) -> int | None:
+        """事件流中的消息数；流不存在或已被裁剪（不完整）时返回 None"""
+        client = await self.get_client()
+        try:
+            info = await client.xinfo_stream(self.stream_key(task_id))
+        except aioredis.ResponseError:
+            # 流不存在
+            return None
+        length = info.get("length", 0)
+        entries_added = info.get("entries-added")
+        if entries_added is not None:
+            complete = entries_added == length
+        else:
+            complete = length < settings.REDIS_STREAM_MAXLEN
+        if not complete:
+            return None
+        return length
+
+    @staticmethod
+    def stream_id_key(stream_id: str) -> tuple[int, int]:
+        """把 stream id（毫秒-序号）转为可比较的元组"""
+        ms, _, seq = stream_id.partition("-")
+        return int(ms), int(seq or 0)
 
     async def close(self):
         """关闭Redis连接"""
+        if self._health_task and not self._health_task.done():
+            self._health_task.cancel()
+        self._health_task = None
+        self._healthy = False
         if self._client:
             await self._client.close()
             self._client = None
@@ -1,5 +1,5 @@
 from app.services.redis_manager import redis_manager
-import asyncio
+from app.services.control_plane import control_plane, SAFETY_RECHECK_INTERVAL
 from app.schemas.response import SystemMessage
 
 
@@ -11,27 +11,36 @@ class TaskControl:
     async def pause(task_id: str):
         client = await redis_manager.get_client()
         await client.set(PAUSE_KEY_TPL.format(task_id=task_id), "1")
+        await control_plane.signal(task_id, "pause")
         await redis_manager.publish_message(task_id, SystemMessage(content="任务已暂停", type="warning"))
 
     @staticmethod
     async def resume(task_id: str):
         client = await redis_manager.get_client()
         await client.delete(PAUSE_KEY_TPL.format(task_id=task_id))
+        await control_plane.signal(task_id, "resume")
         await redis_manager.publish_message(task_id, SystemMessage(content="任务已继续", type="info"))
 
     @staticmethod
     async def is_paused(task_id: str) -> bool:
-        client = await redis_manager.get_client()
-        return bool(await client.exists(PAUSE_KEY_TPL.format(task_id=task_id)))
+        return await control_plane.is_paused(task_id, PAUSE_KEY_TPL.format(task_id=task_id))
 
     @staticmethod
-    async def wait_if_paused(task_id: str, poll_interval: float = 0.5):
-        """在暂停期间循环等待，复用同一 redis 连接以减少日志/开销"""
-        client = await redis_manager.get_client()
-        sent_notice = False
+    async def wait_if_paused(task_id: str):
+        """暂停期间等待继续信号；未暂停时通常直接命中本地缓存，不访问 Redis"""
         key = PAUSE_KEY_TPL.format(task_id=task_id)
-        while bool(await client.exists(key)):
-            if not sent_notice:
-                await redis_manager.publish_message(task_id, SystemMessage(content="当前任务处于暂停状态，等待继续…"))
-                sent_notice = True
-            await asyncio.sleep(poll_interval)
+        if not await control_plane.is_paused(task_id, key):
+            return
+        event = control_plane.watch(task_id, "pause")
+        try:
+            await redis_manager.publish_message(task_id, SystemMessage(content="当前任务处于暂停状态，等待继续…"))
+            signaled = True
+            while True:
+                # 先清除再读取状态，避免读取之后、等待之前到达的信号被漏掉
+                event.clear()
+                # 兜底复查（未收到信号而超时）时绕过缓存直接读取 Redis
+                if not await control_plane.is_paused(task_id, key, refresh=not signaled):
+                    return
+                signaled = await control_plane.wait(event, SAFETY_RECHECK_INTERVAL)
+        finally:
+            control_plane.unwatch(task_id, "pause", event)
@@ -0,0 +1,162 @@
+import asyncio
+import json
+from app.config.setting import settings
+from app.services.redis_manager import redis_manager
+from app.utils.log_util import logger
+
+
+# 发送队列溢出时关闭连接使用的状态码，前端据此带 last_id 重连补回缺失的消息
+RESYNC_CLOSE_CODE = 4409
+
+
+class SubscriptionOverflow(Exception):
+    """发送队列已满，连接需要凭 last_id 重新同步"""
+
+
+class Subscription:
+    """单个 WebSocket 连接的待发送队列
+
+    队列有上限：客户端消费过慢时不再入队，标记为溢出，保证发布端与其他连接
+    不被拖慢。之后 get 抛出 SubscriptionOverflow，由连接以 RESYNC_CLOSE_CODE
+    关闭，客户端凭 last_id 重连，从任务事件流补回缺失的消息，不会静默丢消息。
+    """
+
+    def __init__(self, task_id: str, maxsize: int):
+        self.task_id = task_id
+        self.queue: asyncio.Queue[dict] = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, message: dict) -> bool:
+        """放入消息；队列已满（或已溢出）未能放入时返回 False"""
+        if self.overflowed:
+            return False
+        if self.queue.full():
+            self.overflowed = True
+            logger.warning(f"WebSocket 发送队列已满，通知客户端重新同步 task_id: {self.task_id}")
+            return False
+        self.queue.put_nowait(message)
+        return True
+
+    async def get(self) -> dict:
+        if self.overflowed:
+            raise SubscriptionOverflow(self.task_id)
+        return await self.queue.get()
+
+
+class MessageHub:
+    """进程内的任务消息分发中心
+
+    整个进程只用一个 Redis pubsub 连接按模式订阅所有任务频道，阻塞读取
+    消息后分发给本进程内订阅了该任务的 WebSocket 连接。连接数再多也只占用
+    一个 Redis 连接，且消息到达即推送，无需轮询。
+    """
+
+    CHANNEL_PATTERN = "task:*:messages"
+
+    def __init__(self, queue_size: int | None = None):
+        self.queue_size = (
+            settings.WS_SEND_QUEUE_SIZE if queue_size is None else queue_size
+        )
+        self._subs: dict[str, set[Subscription]] = {}
+        self._ready = asyncio.Event()
+        self._listener: asyncio.Task | None = None
+        # 指标
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.reconnects = 0
+
+    async def subscribe(self, task_id: str, timeout: float = 10) -> Subscription:
+        """订阅任务消息；返回时保证 Redis 订阅已生效"""
+        self._ensure_listener()
+        await asyncio.wait_for(self._ready.wait(), timeout)
+        sub = Subscription(task_id, self.queue_size)
+        self._subs.setdefault(task_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._subs.get(sub.task_id)
+        if subs is None:
+            return
+        subs.discard(sub)
+        if not subs:
+            self._subs.pop(sub.task_id, None)
+
+    async def close(self):
+        if self._listener and not self._listener.done():
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+        self._listener = None
+        self._ready.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "connected": self._ready.is_set(),
+            "tasks": len(self._subs),
+            "subscribers": sum(len(s) for s in self._subs.values()),
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "reconnects": self.reconnects,
+        }
+
+    def _ensure_listener(self):
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._run())
+
+    async def _run(self):
+        backoff = 0.5
+        while True:
+            pubsub = None
+            try:
+                client = await redis_manager.get_client()
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.psubscribe(self.CHANNEL_PATTERN)
+                self._ready.set()
+                backoff = 0.5
+                logger.info(f"消息分发中心已订阅 {self.CHANNEL_PATTERN}")
+                async for msg in pubsub.listen():
+                    if msg.get("type") == "pmessage":
+                        self._dispatch(msg["channel"], msg["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._ready.clear()
+                self.reconnects += 1
+                logger.error(f"消息分发中心连接中断，{backoff}s 后重连: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    def _dispatch(self, channel: str, data: str):
+        self.received += 1
+        task_id = channel.removeprefix("task:").removesuffix(":messages")
+        subs = self._subs.get(task_id)
+        if not subs:
+            return
+        try:
+            message = json.loads(data)
+        except json.JSONDecodeError:
+            logger.warning(f"无法解析的任务消息: {data[:200]}")
+            return
+        for sub in subs:
+            was_overflowed = sub.overflowed
+            if sub.put(message):
+                self.delivered += 1
+                continue
+            self.dropped += 1
+            if not was_overflowed:
+                self.resyncs += 1
+
+
+message_hub = MessageHub()
@@ -0,0 +1,119 @@
+"""工具调用完整性检查基准
+
+构造 1k–10k 条消息的 coder 风格历史（assistant tool_call + tool 响应 + 少量
+用户消息），对比旧的逐条扫描实现（平方复杂度）与索引实现：
+- fix：每轮对话前的完整性修复
+- cut：从末尾向前寻找安全切割点（每个候选点都检查一次）
+
+运行：python -m app.tests.bench_history
+"""
+
+import time
+
+from app.core.llm.history import HistoryIndex, fix_tool_calls
+
+SIZES = (1_000, 2_000, 5_000, 10_000)
+
+
+def build_history(size: int) -> list[dict]:
+    history = [{"role": "system", "content": "system"}]
+    n = 0
+    while len(history) < size:
+        call_id = f"call_{n}"
+        history.append(
+            {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {"id": call_id, "type": "function", "function": {"name": "execute_code", "arguments": "{}"}}
+                ],
+            }
+        )
+        history.append({"role": "tool", "tool_call_id": call_id, "content": "output"})
+        if n % 5 == 0:
+            history.append({"role": "user", "content": "继续"})
+        n += 1
+    # 末尾留一个未响应的调用，迫使检查走完整流程
+    history.append(
+        {"role": "assistant", "content": None, "tool_calls": [{"id": "pending", "type": "function", "function": {"name": "execute_code", "arguments": "{}"}}]}
+    )
+    return history
+
+
+def legacy_fix(history: list) -> list:
+    """旧实现（去掉日志），每个 tool_call 向后扫描、每个 tool 响应向前扫描"""
+    fixed = []
+    for i, msg in enumerate(history):
+        if msg.get("tool_calls"):
+            valid = []
+            for tc in msg["tool_calls"]:
+                if tc.get("id") and any(
+                    history[j].get("role") == "tool" and history[j].get("tool_call_id") == tc["id"]
+                    for j in range(i + 1, len(history))
+                ):
+                    valid.append(tc)
+            if valid:
+                fixed.append({**msg, "tool_calls": valid})
+            elif msg.get("content"):
+                fixed.append({k: v for k, v in msg.items() if k != "tool_calls"})
+        elif msg.get("role") == "tool":
+            if any(
+                prev.get("tool_calls") and any(tc.get("id") == msg.get("tool_call_id") for tc in prev["tool_calls"])
+                for prev in fixed
+            ):
+                fixed.append(msg)
+        else:
+            fixed.append(msg)
+    return fixed
+
+
+def legacy_is_safe_cut(history: list, start: int) -> bool:
+    for i in range(start, len(history)):
+        msg = history[i]
+        if msg.get("role") == "tool" and msg.get("tool_call_id"):
+            if not any(
+                tc.get("id") == msg["tool_call_id"]
+                for j in range(start, i)
+                for tc in history[j].get("tool_calls") or []
+            ):
+                return False
+    return True
+
+
+def legacy_tail_cut(history: list, keep: int) -> int:
+    for cut in range(len(history) - keep, len(history) + 1):
+        if legacy_is_safe_cut(history, cut):
+            return cut
+    return len(history)
+
+
+def timed(fn, *args, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    print(f"{'messages':>9} {'fix(old)':>10} {'fix(new)':>10} {'cut(old)':>10} {'cut(new)':>10}")
+    for size in SIZES:
+        history = build_history(size)
+        keep = size // 2 + 1  # 保留后一半，切割点落在 tool 响应上，需要逐个向后尝试
+        assert legacy_fix(history) == fix_tool_calls(history)
+
+        def new_cut():
+            index = HistoryIndex().sync(history)
+            return index.nearest_safe_cut(len(history) - keep, backward=False)
+
+        assert legacy_tail_cut(history, keep) == new_cut()
+        print(
+            f"{len(history):>9} "
+            f"{timed(legacy_fix, history) * 1000:>8.1f}ms "
+            f"{timed(fix_tool_calls, history, repeat=5) * 1000:>8.2f}ms "
+            f"{timed(legacy_tail_cut, history, keep) * 1000:>8.1f}ms "
+            f"{timed(new_cut, repeat=5) * 1000:>8.2f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
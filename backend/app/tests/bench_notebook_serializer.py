@@ -0,0 +1,56 @@
+"""NotebookSerializer 写入量基准
+
+模拟一个任务执行 200 个代码单元（每个单元一段文本输出，每 4 个单元一张图片），
+对比旧的“每次修改整体重写”与防抖 + 图片外置两种方式的落盘次数与写入字节数。
+
+运行：python -m app.tests.bench_notebook_serializer
+"""
+
+import asyncio
+import base64
+import os
+import tempfile
+import time
+
+from app.tools.notebook_serializer import NotebookSerializer
+
+CELLS = 200
+IMAGE_EVERY = 4
+IMAGE_BYTES = 80 * 1024
+CELL_INTERVAL = 0.01  # 每个单元的模拟执行耗时（秒）
+
+
+async def run_task(serializer: NotebookSerializer, image: str):
+    for i in range(CELLS):
+        if i % 50 == 0:
+            serializer.add_markdown_segmentation_to_notebook(f"section {i}", f"s{i}")
+        serializer.add_code_cell_to_notebook(f"print({i})")
+        serializer.add_code_cell_output_to_notebook(f"{i}\n" * 20)
+        if i % IMAGE_EVERY == 0:
+            serializer.add_image_to_notebook(image, "image/png")
+        await asyncio.sleep(CELL_INTERVAL)
+    serializer.materialize()
+
+
+async def bench(label: str, **kwargs):
+    image = base64.b64encode(os.urandom(IMAGE_BYTES)).decode("ascii")
+    with tempfile.TemporaryDirectory() as work_dir:
+        serializer = NotebookSerializer(work_dir=work_dir, **kwargs)
+        start = time.perf_counter()
+        await run_task(serializer, image)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(serializer.notebook_path)
+    print(
+        f"{label:<22} flushes={serializer.flush_count:>5} "
+        f"written={serializer.bytes_written / 1024 / 1024:>9.2f} MiB "
+        f"final={size / 1024 / 1024:.2f} MiB time={elapsed:.2f}s"
+    )
+
+
+async def main():
+    await bench("rewrite-every-change", flush_interval=0, sidecar_images=False)
+    await bench("debounced+sidecar", flush_interval=0.5, sidecar_images=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
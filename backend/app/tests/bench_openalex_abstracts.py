@@ -0,0 +1,100 @@
+"""OpenAlex 摘要重建与文献格式化基准
+
+生成 10k 篇文献的 works JSONL 夹具（每篇 80–250 词的倒排摘要），对比：
+- 逐篇重建（旧实现：两遍扫描倒排索引 + 填充列表）与 reconstruct_abstracts 批量重建
+- papers_to_str 逐段 += 拼接（旧实现）与一次 join
+
+运行：python -m app.tests.bench_openalex_abstracts
+"""
+
+import json
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from app.tools.openalex_scholar import OpenAlexScholar, reconstruct_abstracts
+
+WORKS = 10_000
+VOCAB = [f"word{i}" for i in range(5_000)]
+
+
+def write_fixture(path: Path, count: int = WORKS):
+    rng = random.Random(0)
+    with open(path, "w", encoding="utf-8") as f:
+        for n in range(count):
+            index: dict[str, list[int]] = {}
+            for position in range(rng.randint(80, 250)):
+                index.setdefault(rng.choice(VOCAB), []).append(position)
+            work = {
+                "display_name": f"Paper {n}",
+                "abstract_inverted_index": index,
+                "authorships": [{"author": {"display_name": f"Author {n}-{a}"}} for a in range(3)],
+                "cited_by_count": n,
+                "publication_year": 2000 + n % 25,
+                "doi": f"https://doi.org/10.1/{n}",
+            }
+            f.write(json.dumps(work) + "\n")
+
+
+def legacy_abstract(abstract_inverted_index: dict) -> str:
+    if not abstract_inverted_index:
+        return ""
+    max_position = 0
+    for positions in abstract_inverted_index.values():
+        if positions and max(positions) > max_position:
+            max_position = max(positions)
+    words = [""] * (max_position + 1)
+    for word, positions in abstract_inverted_index.items():
+        for position in positions:
+            words[position] = word
+    return " ".join(words).strip()
+
+
+def legacy_papers_to_str(papers: list[dict]) -> str:
+    result = ""
+    for paper in papers:
+        result += "\n" + "=" * 80
+        result += f"\n标题: {paper['title']}"
+        result += f"\n摘要: {paper['abstract']}"
+        result += "\n作者:"
+        for author in paper["authors"]:
+            result += f"- {author['name']}"
+        result += f"\n引用次数: {paper['citations_count']}"
+        result += f"\n发表年份: {paper['publication_year']}"
+        result += f"\n引用格式:\n{paper['citation_format']}"
+        result += "=" * 80
+    return result
+
+
+def timed(fn, *args, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture = Path(tmp) / "works.jsonl"
+        write_fixture(fixture)
+        works = [json.loads(line) for line in open(fixture, encoding="utf-8")]
+    indexes = [w["abstract_inverted_index"] for w in works]
+
+    legacy_time, legacy = timed(lambda: [legacy_abstract(i) for i in indexes])
+    batch_time, batch = timed(reconstruct_abstracts, indexes)
+    assert legacy == batch
+    print(f"摘要重建 {len(works)} 篇：逐篇 {legacy_time * 1000:.0f}ms，批量 {batch_time * 1000:.0f}ms")
+
+    scholar = OpenAlexScholar("bench", email="bench@example.com")
+    papers = scholar._parse_results({"results": works})
+    legacy_time, legacy = timed(legacy_papers_to_str, papers)
+    join_time, joined = timed(scholar.papers_to_str, papers)
+    assert legacy == joined
+    print(f"papers_to_str {len(papers)} 篇：+= 拼接 {legacy_time * 1000:.0f}ms，join {join_time * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import queue
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any
+from e2b import FileType
+from jupyter_client.manager import start_new_async_kernel
+from app.utils.log_util import logger
+
+
+# 本地沙箱替身：用本地 Jupyter 内核与临时目录模拟 e2b AsyncSandbox 的接口，
+# 供沙箱池与 E2BCodeInterpreter 的测试在没有 E2B 账号时使用
+
+
+@dataclass
+class Logs:
+    stdout: list[str] = field(default_factory=list)
+    stderr: list[str] = field(default_factory=list)
+
+
+@dataclass
+class ExecutionError:
+    name: str
+    value: str
+    traceback: str
+
+
+class Result:
+    """对应 e2b 的 Result：按 MIME 类型提供 _repr_*_ 方法"""
+
+    def __init__(self, data: dict[str, Any]):
+        self.data = data
+
+    def __str__(self) -> str:
+        return self.data.get("text/plain", "")
+
+    def _repr_html_(self):
+        return self.data.get("text/html")
+
+    def _repr_markdown_(self):
+        return self.data.get("text/markdown")
+
+    def _repr_png_(self):
+        return self.data.get("image/png")
+
+    def _repr_jpeg_(self):
+        return self.data.get("image/jpeg")
+
+    def _repr_svg_(self):
+        return self.data.get("image/svg+xml")
+
+    def _repr_pdf_(self):
+        return self.data.get("application/pdf")
+
+    def _repr_latex_(self):
+        return self.data.get("text/latex")
+
+    def _repr_json_(self):
+        return self.data.get("application/json")
+
+    def _repr_javascript_(self):
+        return self.data.get("application/javascript")
+
+
+@dataclass
+class Execution:
+    results: list[Result] = field(default_factory=list)
+    logs: Logs = field(default_factory=Logs)
+    error: ExecutionError | None = None
+
+
+class LocalFilesystem:
+    """sandbox.files 的本地实现，路径即本地绝对路径"""
+
+    async def write(self, path: str, data):
+        if hasattr(data, "read"):
+            data = data.read()
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        await asyncio.to_thread(_write_bytes, path, data)
+        return SimpleNamespace(name=os.path.basename(path), path=path, type=FileType.FILE)
+
+    async def read(self, path: str, format: str = "text"):
+        content = await asyncio.to_thread(_read_bytes, path)
+        if format == "bytes":
+            return content
+        if format == "stream":
+
+            async def chunks():
+                for i in range(0, len(content), 64 * 1024):
+                    yield content[i : i + 64 * 1024]
+
+            return chunks()
+        return content.decode("utf-8")
+
+    async def list(self, path: str, depth: int = 1):
+        entries = []
+        base_depth = path.rstrip(os.sep).count(os.sep)
+        for root, dirs, files in os.walk(path):
+            level = root.rstrip(os.sep).count(os.sep) - base_depth + 1
+            for name, kind in [(d, FileType.DIR) for d in dirs] + [(f, FileType.FILE) for f in files]:
+                full = os.path.join(root, name)
+                stat = os.stat(full)
+                entries.append(
+                    SimpleNamespace(
+                        name=name,
+                        path=full,
+                        type=kind,
+                        size=stat.st_size,
+                        modified_time=datetime.fromtimestamp(stat.st_mtime_ns / 1e9),
+                    )
+                )
+            if level >= depth:
+                dirs.clear()
+        return entries
+
+
+class LocalSandbox:
+    """模拟 AsyncSandbox：create / run_code / files / is_running / set_timeout / kill"""
+
+    def __init__(self, home_dir: str, km, kc):
+        self.home_dir = home_dir
+        self.files = LocalFilesystem()
+        self._km = km
+        self._kc = kc
+        self._killed = False
+        self.timeout: int | None = None
+
+    @classmethod
+    async def create(cls, timeout: int | None = None, **kwargs) -> "LocalSandbox":
+        home_dir = tempfile.mkdtemp(prefix="mma_sandbox_")
+        km, kc = await start_new_async_kernel(kernel_name="python3", cwd=home_dir)
+        sandbox = cls(home_dir, km, kc)
+        sandbox.timeout = timeout
+        logger.info(f"本地沙箱已创建: {home_dir}")
+        return sandbox
+
+    async def run_code(self, code: str, timeout: float = 600) -> Execution:
+        execution = Execution()
+        msg_id = self._kc.execute(code, store_history=False)
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("本地沙箱执行超时")
+            try:
+                msg = await self._kc.get_iopub_msg(timeout=min(remaining, 1))
+            except queue.Empty:
+                continue
+            if msg.get("parent_header", {}).get("msg_id") != msg_id:
+                continue
+            msg_type, content = msg["msg_type"], msg["content"]
+            if msg_type == "stream":
+                getattr(execution.logs, content["name"]).append(content["text"])
+            elif msg_type in ("execute_result", "display_data"):
+                execution.results.append(Result(content["data"]))
+            elif msg_type == "error":
+                execution.error = ExecutionError(
+                    content["ename"], content["evalue"], "\n".join(content["traceback"])
+                )
+            elif msg_type == "status" and content["execution_state"] == "idle":
+                return execution
+
+    async def is_running(self) -> bool:
+        return not self._killed and await self._km.is_alive()
+
+    async def set_timeout(self, timeout: int):
+        self.timeout = timeout
+
+    async def kill(self):
+        if self._killed:
+            return
+        self._killed = True
+        try:
+            self._kc.stop_channels()
+            await self._km.shutdown_kernel(now=True)
+        finally:
+            shutil.rmtree(self.home_dir, ignore_errors=True)
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_bytes(path: str, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
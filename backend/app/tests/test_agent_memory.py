@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from app.core.agents.agent import Agent
+from app.core.llm.tokens import history_tokens
+
+MODEL = "test-model"
+TASK_PROMPT = {"role": "user", "content": "求解问题1：建立交通流量预测模型"}
+
+
+def tool_round(n: int, output: str) -> list[dict]:
+    call_id = f"call_{n}"
+    return [
+        {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{"id": call_id, "type": "function", "function": {"name": "execute_code", "arguments": "{}"}}],
+        },
+        {"role": "tool", "tool_call_id": call_id, "content": output},
+    ]
+
+
+class TestAgentMemory(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.summaries = 0
+        self.summary_delay = 0.0
+        self.summary_error: Exception | None = None
+        self.summary_requests: list[list[dict]] = []
+
+        async def fake_simple_chat(model, history):
+            self.summaries += 1
+            self.summary_requests.append(history)
+            await asyncio.sleep(self.summary_delay)
+            if self.summary_error:
+                raise self.summary_error
+            return "前面的求解过程"
+
+        patcher = patch("app.core.agents.agent.simple_chat", fake_simple_chat)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def agent(self, budget: int, history: list[dict]) -> Agent:
+        agent = Agent("t", SimpleNamespace(model=MODEL), max_context_tokens=budget)
+        agent.chat_history = [{"role": "system", "content": "你是代码手"}, TASK_PROMPT, *history]
+        return agent
+
+    def assert_tool_calls_intact(self, history: list[dict]):
+        called = {tc["id"] for m in history for tc in m.get("tool_calls") or []}
+        for msg in history:
+            if msg["role"] == "tool":
+                self.assertIn(msg["tool_call_id"], called)
+
+    async def test_under_budget_is_untouched_and_presummary_runs_in_background(self):
+        history = [m for n in range(4) for m in tool_round(n, "x" * 40)]
+        agent = self.agent(10_000, history)
+        before = list(agent.chat_history)
+        await agent.clear_memory()
+        self.assertEqual(agent.chat_history, before)
+        self.assertEqual(self.summaries, 0)
+
+        agent.max_context_tokens = int(history_tokens(MODEL, before) / 0.8)
+        await agent.clear_memory()
+        await asyncio.sleep(0)
+        self.assertEqual(agent.chat_history, before)
+        self.assertEqual(self.summaries, 1)
+
+    async def test_summary_request_carries_system_prompt_only(self):
+        history = [m for n in range(6) for m in tool_round(n, "x" * 40)]
+        with_system = self.agent(0, history)
+        without_system = self.agent(0, history)
+        without_system.chat_history = without_system.chat_history[1:]
+        for agent in (with_system, without_system):
+            agent.max_context_tokens = int(history_tokens(MODEL, agent.chat_history) / 0.8)
+            await agent.clear_memory()
+            await asyncio.sleep(0)
+
+        self.assertEqual(self.summaries, 2)
+        request, request_without_system = self.summary_requests
+        self.assertEqual([m["role"] for m in request], ["system", "user"])
+        self.assertEqual(request[0]["content"], "你是代码手")
+        # 没有系统消息时，任务提示不会被当作系统消息发送，也不在被总结的范围内
+        self.assertEqual([m["role"] for m in request_without_system], ["user"])
+        for req in self.summary_requests:
+            self.assertNotIn(TASK_PROMPT["content"], req[-1]["content"])
+
+    async def test_old_tool_outputs_are_truncated_before_summarizing(self):
+        history = [m for n in range(3) for m in tool_round(n, "old output " * 200)]
+        history += [m for n in range(3, 8) for m in tool_round(n, "ok")]
+        history.append({"role": "user", "content": "继续"})
+        agent = self.agent(0, history)
+        agent.max_context_tokens = history_tokens(MODEL, agent.chat_history) - 100
+        await agent.clear_memory()
+        self.assertLessEqual(history_tokens(MODEL, agent.chat_history), agent.max_context_tokens)
+        self.assertIn("工具输出过长", agent.chat_history[3]["content"])
+        self.assertEqual(len(agent.chat_history), 2 + len(history))
+
+    async def test_large_output_past_budget_waits_for_summary(self):
+        # 一次大的工具输出让历史从预算以内直接越过预算，后台总结尚未开始/完成
+        self.summary_delay = 0.05
+        history = [m for n in range(20) for m in tool_round(n, "result " * 30)]
+        agent = self.agent(0, history)
+        agent.max_context_tokens = int(history_tokens(MODEL, agent.chat_history) * 1.2)
+        agent.chat_history.extend(tool_round(99, "短输出"))
+        agent.chat_history.append({"role": "user", "content": "再补充一张图" * 200})
+        await agent.clear_memory()
+
+        self.assertGreaterEqual(self.summaries, 1)
+        self.assertEqual(agent.chat_history[0]["role"], "system")
+        self.assertIs(agent.chat_history[1], TASK_PROMPT)
+        self.assertTrue(agent.chat_history[2]["content"].startswith("[历史对话总结]"))
+        self.assertLessEqual(history_tokens(MODEL, agent.chat_history), agent.max_context_tokens)
+        self.assert_tool_calls_intact(agent.chat_history)
+
+    async def test_drop_keeps_task_prompt_when_summary_fails(self):
+        self.summary_error = RuntimeError("upstream down")
+        history = [m for n in range(20) for m in tool_round(n, "result " * 30)]
+        history.append({"role": "user", "content": "继续"})
+        agent = self.agent(0, history)
+        agent.max_context_tokens = history_tokens(MODEL, agent.chat_history) // 2
+        await agent.clear_memory()
+
+        self.assertEqual(self.summaries, 1)
+        self.assertIs(agent.chat_history[1], TASK_PROMPT)
+        self.assertLess(len(agent.chat_history), 2 + len(history))
+        self.assertEqual(agent.chat_history[-1]["content"], "继续")
+        self.assert_tool_calls_intact(agent.chat_history)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import tempfile
+import time
+import unittest
+
+from app.utils.disk_cache import DiskCache
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lru_eviction_by_size(self):
+        cache = DiskCache(self.tmp.name, max_bytes=10_000)
+        cache.set("aa01", "x" * 60)
+        # 容量容纳三个条目（时间戳序列化长度不定，留少量余量）
+        cache.max_bytes = cache.metrics()["bytes"] * 3 + 30
+        for key in ("aa02", "aa03"):
+            cache.set(key, "x" * 60)
+        # 访问 aa01 后它成为最近使用，超出容量时先淘汰 aa02
+        self.assertEqual(cache.get("aa01"), "x" * 60)
+        cache.set("aa04", "x" * 60)
+        self.assertIsNone(cache.get("aa02"))
+        self.assertEqual(cache.get("aa01"), "x" * 60)
+        self.assertLessEqual(cache.metrics()["bytes"], cache.max_bytes)
+        self.assertEqual(cache.metrics()["evictions"], 1)
+
+        # 重建索引后仍能读取已有条目
+        reopened = DiskCache(self.tmp.name, max_bytes=cache.max_bytes)
+        self.assertEqual(reopened.get("aa04"), "x" * 60)
+
+    def test_ttl(self):
+        cache = DiskCache(self.tmp.name, max_bytes=10_000, ttl=0.05)
+        cache.set("bb01", {"v": 1})
+        self.assertEqual(cache.get("bb01"), {"v": 1})
+        time.sleep(0.1)
+        self.assertIsNone(cache.get("bb01"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import random
+import unittest
+
+from app.core.llm.history import HistoryIndex, fix_tool_calls
+
+
+def call(call_id, content=None):
+    return {
+        "role": "assistant",
+        "content": content,
+        "tool_calls": [
+            {"id": call_id, "type": "function", "function": {"name": "f", "arguments": "{}"}}
+        ],
+    }
+
+
+def response(call_id):
+    return {"role": "tool", "tool_call_id": call_id, "content": "ok"}
+
+
+def brute_force_safe(history, start):
+    for i in range(start, len(history)):
+        msg = history[i]
+        if msg.get("role") == "tool" and msg.get("tool_call_id"):
+            if not any(
+                tc.get("id") == msg["tool_call_id"]
+                for prev in history[start:i]
+                for tc in prev.get("tool_calls") or []
+            ):
+                return False
+    return True
+
+
+class TestHistoryIndex(unittest.TestCase):
+    def test_fix_tool_calls(self):
+        history = [
+            {"role": "system", "content": "s"},
+            call("a"),
+            response("a"),
+            call("b", content="带内容"),  # 没有响应，保留内容
+            call("c"),  # 没有响应也没有内容，整条移除
+            response("x"),  # 孤立响应
+            {"role": "user", "content": "u"},
+        ]
+        fixed = fix_tool_calls(history)
+        self.assertEqual(
+            [(m["role"], "tool_calls" in m) for m in fixed],
+            [("system", False), ("assistant", True), ("tool", False), ("assistant", False), ("user", False)],
+        )
+        self.assertFalse(HistoryIndex().sync(history).is_well_formed())
+        self.assertTrue(HistoryIndex().sync(fixed).is_well_formed())
+
+    def test_incremental_sync_and_unmatched(self):
+        history = [{"role": "system", "content": "s"}, call("a")]
+        index = HistoryIndex().sync(history)
+        self.assertEqual(index.last_unmatched_call(), 1)
+        history.append(response("a"))
+        index.sync(history)
+        self.assertIsNone(index.last_unmatched_call())
+        self.assertTrue(index.is_well_formed())
+        self.assertFalse(index.is_safe_cut(2))
+        self.assertTrue(index.is_safe_cut(1))
+        # 列表被替换时重建
+        index.sync([response("a")])
+        self.assertFalse(index.is_well_formed())
+
+    def test_safe_cut_matches_brute_force(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            history, open_ids = [], []
+            for n in range(60):
+                r = rng.random()
+                if r < 0.3:
+                    open_ids.append(f"id{n}")
+                    history.append(call(open_ids[-1]))
+                elif r < 0.6 and open_ids:
+                    history.append(response(open_ids.pop(rng.randrange(len(open_ids)))))
+                elif r < 0.65:
+                    history.append(response(f"orphan{n}"))
+                else:
+                    history.append({"role": "user", "content": str(n)})
+            index = HistoryIndex().sync(history)
+            for start in range(len(history) + 1):
+                self.assertEqual(index.is_safe_cut(start), brute_force_safe(history, start))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import litellm
+
+from app.config.setting import settings
+from app.core.llm.http_pool import HttpPool
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """本地上游替身：HTTP/1.1 keep-alive，返回固定的 JSON"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHttpPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.servers = []
+        for _ in range(2):
+            server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        patcher = patch.object(settings, "LLM_HTTP_POOL", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pool = HttpPool()
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def url(self, i: int, host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.servers[i].server_port}/v1/models"
+
+    async def test_install_and_close_restore_litellm_session(self):
+        previous = object()
+        with patch.object(litellm, "aclient_session", previous):
+            client = self.pool.install()
+            self.assertIs(litellm.aclient_session, client)
+            self.assertIs(self.pool.install(), client)
+            await self.pool.close()
+            self.assertIs(litellm.aclient_session, previous)
+            self.assertIsNone(self.pool.client)
+
+        with patch.object(settings, "LLM_HTTP_POOL", False):
+            self.assertIsNone(HttpPool().install())
+
+    async def test_sequential_requests_reuse_one_connection_per_host(self):
+        with patch.object(litellm, "aclient_session", None):
+            client = self.pool.install()
+            for _ in range(5):
+                response = await client.get(self.url(0))
+                self.assertEqual(response.json(), {"ok": True})
+            # 5 次顺序请求只新建 1 个连接
+            hosts = self.pool.metrics()["hosts"]
+            self.assertEqual(hosts["127.0.0.1"]["requests"], 5)
+            self.assertEqual(hosts["127.0.0.1"]["new_connections"], 1)
+            self.assertEqual(hosts["127.0.0.1"]["reused"], 4)
+            self.assertEqual(hosts["127.0.0.1"]["tls_handshakes"], 0)
+
+            await client.get(self.url(1))
+            await client.get(self.url(1, host="localhost"))
+
+            # 每个 (scheme, host, port) 一个传输层
+            transports = self.pool._transport._transports
+            self.assertEqual(
+                sorted((host, port) for _, host, port in transports),
+                sorted(
+                    [
+                        (b"127.0.0.1", self.servers[0].server_port),
+                        (b"127.0.0.1", self.servers[1].server_port),
+                        (b"localhost", self.servers[1].server_port),
+                    ]
+                ),
+            )
+
+            # 另一端口的连接池独立，需要新建连接
+            hosts = self.pool.metrics()["hosts"]
+            self.assertEqual(hosts["127.0.0.1"]["new_connections"], 2)
+            self.assertEqual(hosts["localhost"]["new_connections"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.tools.literature_index import LiteratureIndex, build_index
+
+WORKS = [
+    {
+        "display_name": "Traffic flow prediction with graph networks",
+        "abstract_inverted_index": {"traffic": [0, 4], "flow": [1], "forecasting": [2]},
+        "publication_year": 2021,
+    },
+    {
+        "display_name": "Optimal inventory control",
+        "abstract_inverted_index": {"inventory": [0], "demand": [1]},
+        "publication_year": 2019,
+    },
+    {
+        "display_name": "城市交通流量预测",
+        "abstract_inverted_index": {"交通": [0]},
+        "publication_year": 2022,
+    },
+    {"display_name": "", "abstract_inverted_index": {"skipped": [0]}},
+]
+
+
+class TestLiteratureIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        dump = self.dir / "works.jsonl"
+        dump.write_text("\n".join(json.dumps(w, ensure_ascii=False) for w in WORKS), encoding="utf-8")
+        self.count = build_index([dump], self.dir / "index")
+        self.index = LiteratureIndex(self.dir / "index")
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_bm25_ranking(self):
+        self.assertEqual(self.count, 3)
+        works = self.index.search("traffic flow inventory", limit=2)
+        self.assertEqual(
+            [w["display_name"] for w in works],
+            ["Traffic flow prediction with graph networks", "Optimal inventory control"],
+        )
+        self.assertEqual(self.index.search("交通", limit=5)[0]["publication_year"], 2022)
+
+    def test_miss(self):
+        self.assertEqual(self.index.search("quantum chromodynamics"), [])
+        self.assertEqual(self.index.search("traffic", min_score=100), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
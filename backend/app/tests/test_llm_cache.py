@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from litellm import ModelResponse
+from litellm.types.utils import Message
+
+from app.core.llm import llm as llm_module
+from app.core.llm.cache import LLMCache, LLMCacheMiss
+from app.core.llm.llm import LLM
+from app.services.redis_manager import redis_manager
+
+HISTORY = [
+    {"role": "system", "content": "你是数学建模助手"},
+    {"role": "user", "content": "求解问题一"},
+]
+
+
+def _response(content: str) -> ModelResponse:
+    return ModelResponse(
+        model="test-model",
+        choices=[{"index": 0, "message": {"role": "assistant", "content": content}}],
+    )
+
+
+class TestLLMCacheKey(unittest.TestCase):
+    def test_key_ignores_dict_order_and_object_types(self):
+        key = LLMCache.make_key("m", HISTORY, tools=[{"type": "function", "function": {"name": "f"}}])
+        reordered = [{"content": m["content"], "role": m["role"]} for m in HISTORY]
+        tools = [{"function": {"name": "f"}, "type": "function"}]
+        self.assertEqual(LLMCache.make_key("m", reordered, tools=tools), key)
+
+        # 历史中的 pydantic 消息对象与等价的字典得到相同的键
+        as_objects = [HISTORY[0], Message(role="assistant", content="好的")]
+        as_dicts = [HISTORY[0], Message(role="assistant", content="好的").model_dump()]
+        self.assertEqual(LLMCache.make_key("m", as_objects), LLMCache.make_key("m", as_dicts))
+
+    def test_key_changes_with_request_content(self):
+        key = LLMCache.make_key("m", HISTORY)
+        self.assertNotEqual(LLMCache.make_key("other", HISTORY), key)
+        self.assertNotEqual(LLMCache.make_key("m", HISTORY[:1]), key)
+        self.assertNotEqual(LLMCache.make_key("m", HISTORY, top_p=0.9), key)
+        self.assertNotEqual(LLMCache.make_key("m", HISTORY, tool_choice="auto"), key)
+
+
+class TestLLMCacheModes(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.acompletion = AsyncMock(return_value=_response("答案"))
+        for patcher in (
+            patch.object(llm_module, "acompletion", self.acompletion),
+            patch.object(redis_manager, "publish_message", AsyncMock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _llm(self, mode: str) -> LLM:
+        patcher = patch.object(llm_module, "llm_cache", LLMCache(mode, self.tmp.name))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return LLM(api_key="k", model="test-model", base_url="", task_id="t1")
+
+    async def test_replay_only_miss_raises_without_network(self):
+        llm = self._llm("replay-only")
+        with self.assertRaises(LLMCacheMiss):
+            await llm.chat(HISTORY, stream=False)
+        self.acompletion.assert_not_awaited()
+
+    async def test_read_write_miss_falls_through_then_replays(self):
+        llm = self._llm("read-write")
+        response = await llm.chat(HISTORY, stream=False)
+        self.assertEqual(response.choices[0].message.content, "答案")
+        self.assertEqual(self.acompletion.await_count, 1)
+
+        # 同一请求再次发起直接命中，不访问网络
+        response = await llm.chat(HISTORY, stream=False)
+        self.assertEqual(response.choices[0].message.content, "答案")
+        self.assertEqual(self.acompletion.await_count, 1)
+
+        # 重放模式读取 read-write 写入的条目
+        replay = self._llm("replay-only")
+        response = await replay.chat(HISTORY, stream=False)
+        self.assertEqual(response.choices[0].message.content, "答案")
+        self.assertEqual(self.acompletion.await_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import asyncio
+import time
+import unittest
+
+from app.core.llm.limiter import ProviderLimiter
+
+
+class TestProviderLimiter(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrency_limit_and_fairness(self):
+        limiter = ProviderLimiter(max_concurrency=1)
+        order = []
+
+        async def request(task_id, i):
+            await limiter.acquire(task_id, 0)
+            order.append(task_id)
+            await asyncio.sleep(0.01)
+            limiter.release(0)
+
+        # 任务 a 先排入 5 个请求，任务 b 随后排入 1 个，b 不必等 a 全部完成
+        tasks = [asyncio.create_task(request("a", i)) for i in range(5)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(request("b", 0)))
+        await asyncio.gather(*tasks)
+        self.assertLessEqual(order.index("b"), 2)
+        self.assertEqual(limiter.metrics()["granted"], 6)
+        self.assertEqual(limiter.metrics()["in_flight"], 0)
+
+    async def test_rpm_bucket_delays_requests(self):
+        limiter = ProviderLimiter(max_concurrency=10, rpm=600)  # 每 0.1s 补充一个
+        limiter.requests.tokens = 1
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire("t", 0)
+            limiter.release(0)
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+        self.assertGreater(limiter.metrics()["rate_limited"], 0)
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        limiter = ProviderLimiter(max_concurrency=1)
+        await limiter.acquire("t", 0)
+        waiter = asyncio.create_task(limiter.acquire("t", 0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(limiter.queued, 0)
+        limiter.release(0)
+        await asyncio.wait_for(limiter.acquire("t", 0), timeout=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import asyncio
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from litellm import ModelResponse
+
+from app.core.llm import llm as llm_module
+from app.core.llm.llm import LLM
+from app.core.llm.retry import CircuitBreaker, llm_retry, retry_after
+from app.services.redis_manager import redis_manager
+
+
+class TestLLMRetry(unittest.IsolatedAsyncioTestCase):
+    def test_retry_after_header(self):
+        error = SimpleNamespace(headers={"retry-after": "3"})
+        self.assertEqual(retry_after(error), 3.0)
+        error = SimpleNamespace(response=SimpleNamespace(headers={"retry-after-ms": "1500"}))
+        self.assertEqual(retry_after(error), 1.5)
+        self.assertIsNone(retry_after(ValueError("no headers")))
+
+    async def test_breaker_opens_and_recovers(self):
+        breaker = CircuitBreaker(threshold=2, cooldown=0.1)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        start = time.monotonic()
+        await breaker.before_call()
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertEqual(breaker.state, "half_open")
+
+        # 探测请求在途时，其他调用等待探测结果
+        waiter = asyncio.create_task(breaker.before_call())
+        await asyncio.sleep(0.01)
+        self.assertFalse(waiter.done())
+        breaker.record_success()
+        await asyncio.wait_for(waiter, 1)
+        self.assertEqual(breaker.state, "closed")
+
+    async def test_publish_error_is_not_an_upstream_failure(self):
+        response = ModelResponse(
+            choices=[{"index": 0, "message": {"role": "assistant", "content": "答案"}}]
+        )
+        acompletion = AsyncMock(return_value=response)
+        llm = LLM(api_key="k", model="m", base_url="http://publish-error.test", task_id="t1")
+        with (
+            patch.object(llm_module, "acompletion", acompletion),
+            patch.object(redis_manager, "publish_message", AsyncMock(side_effect=ValueError("推送失败"))),
+        ):
+            with self.assertRaisesRegex(ValueError, "推送失败"):
+                await llm.chat([{"role": "user", "content": "hi"}], stream=False)
+
+        # 推送失败不重新请求，也不计入熔断
+        self.assertEqual(acompletion.await_count, 1)
+        stats = llm_retry.stats(llm.provider)
+        self.assertEqual((stats.successes, stats.failures), (1, 0))
+        self.assertEqual(llm_retry.breaker(llm.provider).state, "closed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,39 @@
+import json
+import tempfile
+import unittest
+
+from app.services.message_journal import MessageJournal
+
+
+class TestMessageJournal(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = MessageJournal(self.tmp.name, flush_interval=0.01)
+
+    async def asyncTearDown(self):
+        await self.journal.close()
+        self.tmp.cleanup()
+
+    async def test_append_and_page(self):
+        for i in range(10):
+            self.journal.append("t1", json.dumps({"i": i}))
+        messages = await self.journal.read_messages("t1")
+        self.assertEqual([m["i"] for m in messages], list(range(10)))
+        page = await self.journal.read_messages("t1", offset=3, limit=4)
+        self.assertEqual([m["i"] for m in page], [3, 4, 5, 6])
+
+    async def test_legacy_json_file(self):
+        with open(self.journal.legacy_path("old"), "w", encoding="utf-8") as f:
+            json.dump([{"i": 0}, {"i": 1}], f)
+        messages = await self.journal.read_messages("old", offset=1)
+        self.assertEqual(messages, [{"i": 1}])
+
+    async def test_delete(self):
+        self.journal.append("t2", json.dumps({"i": 0}))
+        await self.journal.flush("t2")
+        await self.journal.delete("t2")
+        self.assertEqual(await self.journal.read_messages("t2"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
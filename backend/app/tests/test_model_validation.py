@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+from contextlib import ExitStack
+from unittest.mock import AsyncMock, patch
+
+from app.config.setting import settings
+from app.routers.modeling_router import SaveApiConfigRequest, save_api_config
+from app.services.model_validation import ModelValidator, model_validator
+
+ROLES = ("COORDINATOR", "MODELER", "CODER", "WRITER")
+
+
+def config(api_key: str = "sk-1") -> dict:
+    return {"apiKey": api_key, "modelId": "deepseek/deepseek-chat", "baseUrl": "https://api.example.com/v1"}
+
+
+class TestModelValidator(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        stack = ExitStack()
+        self.addCleanup(stack.close)
+        # save_api_config 会改写全局 settings，测试结束后还原
+        for role in ROLES:
+            for field in ("API_KEY", "MODEL", "BASE_URL"):
+                stack.enter_context(patch.object(settings, f"{role}_{field}", None))
+        stack.enter_context(patch.object(settings, "OPENALEX_EMAIL", None))
+        stack.enter_context(patch.object(model_validator, "_validated", {}))
+        self.request = stack.enter_context(patch.object(model_validator, "_request", AsyncMock()))
+
+    async def save(self, coder_key: str = "sk-1"):
+        await save_api_config(
+            SaveApiConfigRequest(
+                coordinator=config(), modeler=config(), coder=config(coder_key), writer=config(), openalex_email="a@b.c"
+            )
+        )
+
+    async def test_save_then_start_with_unchanged_config_hits_cache(self):
+        await self.save()
+        self.assertEqual(await model_validator.validate_all("t1"), [])
+        # 四个角色配置相同，合并为一次上游请求
+        self.assertEqual(self.request.await_count, 1)
+
+        # 前端每次启动任务前都会保存配置
+        await self.save()
+        self.assertEqual(await model_validator.validate_all("t2"), [])
+        self.assertEqual(self.request.await_count, 1)
+
+        # 只有配置变化的角色重新校验
+        await self.save(coder_key="sk-2")
+        self.assertEqual(await model_validator.validate_all("t3"), [])
+        self.assertEqual(self.request.await_count, 2)
+
+    async def test_failures_are_not_cached(self):
+        validator = ModelValidator()
+        with patch.object(validator, "_request", AsyncMock(side_effect=[RuntimeError("401"), None])) as request:
+            error = await validator.validate("Coder", "sk", "m", None)
+            self.assertIn("401", error)
+            self.assertIsNone(await validator.validate("Coder", "sk", "m", None))
+            self.assertIsNone(await validator.validate("Coder", "sk", "m", None))
+        self.assertEqual(request.await_count, 2)
+        self.assertEqual(await validator.validate("Coder", "sk", "", None), "Coder: 模型未配置")
+
+    async def test_concurrent_checks_share_one_request(self):
+        validator = ModelValidator()
+
+        async def slow(*args):
+            await asyncio.sleep(0.05)
+
+        with patch.object(validator, "_request", AsyncMock(side_effect=slow)) as request:
+            await asyncio.gather(*(validator.check("sk", "m", None) for _ in range(5)))
+            await validator.check("sk", "m", None, force=True)
+        self.assertEqual(request.await_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, patch
+
+from app.config.setting import settings
+from app.tools import openalex_scholar
+from app.tools.literature_index import build_index, local_literature
+from app.tools.openalex_scholar import OpenAlexScholar, reconstruct_abstracts
+from app.utils.disk_cache import DiskCache
+
+WORKS = {
+    "results": [
+        {
+            "display_name": "Traffic Flow Prediction",
+            "abstract_inverted_index": {"traffic": [0], "flow": [1], "model": [2]},
+            "authorships": [
+                {"author": {"display_name": "Alice"}, "author_position": "first"}
+            ],
+            "cited_by_count": 12,
+            "doi": "https://doi.org/10.1/x",
+            "publication_year": 2020,
+            "biblio": {"volume": "3"},
+        }
+    ]
+}
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """本地 OpenAlex 替身：记录请求次数，fail_first 次返回 503"""
+
+    hits = 0
+    fail_first = 0
+
+    def do_GET(self):
+        type(self).hits += 1
+        if type(self).hits <= type(self).fail_first:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        body = json.dumps(WORKS).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestOpenAlexScholar(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        _StandIn.hits = 0
+        _StandIn.fail_first = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.cache_dir = tempfile.mkdtemp()
+        patches = [
+            patch.object(openalex_scholar, "_search_cache", DiskCache(self.cache_dir, 1024 * 1024, ttl=60)),
+            patch.object(openalex_scholar.redis_manager, "publish_message", AsyncMock()),
+            patch.object(settings, "OPENALEX_MAX_RETRIES", 2),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    async def asyncTearDown(self):
+        await openalex_scholar.close_http_client()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    async def test_repeated_query_served_from_cache(self):
+        scholar = OpenAlexScholar("t1", email="a@b.c", base_url=self.base_url)
+        papers = await scholar.search_papers("traffic flow")
+        self.assertEqual(papers[0]["title"], "Traffic Flow Prediction")
+        self.assertEqual(papers[0]["abstract"], "traffic flow model")
+        self.assertEqual(papers[0]["authors"][0]["name"], "Alice")
+
+        # 另一个任务的同一查询直接命中缓存
+        again = await OpenAlexScholar("t2", email="a@b.c", base_url=self.base_url).search_papers("traffic flow")
+        self.assertEqual(again, papers)
+        self.assertEqual(_StandIn.hits, 1)
+
+    async def test_retries_server_errors(self):
+        _StandIn.fail_first = 2
+        scholar = OpenAlexScholar("t1", email="a@b.c", base_url=self.base_url)
+        papers = await scholar.search_papers("retry me")
+        self.assertEqual(len(papers), 1)
+        self.assertEqual(_StandIn.hits, 3)
+
+    async def test_local_index_falls_back_to_remote(self):
+        dump = f"{self.cache_dir}/works.jsonl"
+        with open(dump, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"display_name": "Inventory control under uncertain demand"}))
+        build_index([dump], f"{self.cache_dir}/index")
+        self.addCleanup(local_literature.close)
+        with (
+            patch.object(settings, "LITERATURE_BACKEND", "local"),
+            patch.object(settings, "LITERATURE_INDEX_DIR", f"{self.cache_dir}/index"),
+            patch.object(settings, "LITERATURE_MIN_SCORE", 0.0),
+        ):
+            scholar = OpenAlexScholar("t1", email="a@b.c", base_url=self.base_url)
+            local = await scholar.search_papers("inventory demand")
+            self.assertEqual(local[0]["title"], "Inventory control under uncertain demand")
+            self.assertEqual(_StandIn.hits, 0)
+
+            remote = await scholar.search_papers("traffic flow")
+            self.assertEqual(remote[0]["title"], "Traffic Flow Prediction")
+            self.assertEqual(_StandIn.hits, 1)
+
+
+    def test_reconstruct_abstracts(self):
+        self.assertEqual(
+            reconstruct_abstracts(
+                [
+                    {"a": [0, 2], "b": [1]},
+                    None,
+                    {"x": [0], "y": [3]},  # 位置不连续
+                    {"p": [0], "q": [0], "r": [1]},  # 同一位置保留后出现的词
+                ]
+            ),
+            ["a b a", "", "x   y", "q r"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import json
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.services import redis_manager as redis_module
+from app.services.redis_manager import redis_manager
+
+
+class _StubStreamClient:
+    """只实现 XRANGE 的事件流替身，记录每次请求的条数"""
+
+    def __init__(self, n: int):
+        self.entries = [(f"1-{i}", {"data": json.dumps({"i": i})}) for i in range(n)]
+        self.counts: list[int | None] = []
+
+    async def xrange(self, name, min="-", max="+", count=None):
+        self.counts.append(count)
+        if min == "-":
+            start = 0
+        else:
+            after = redis_manager.stream_id_key(min.lstrip("("))
+            start = next(
+                (i for i, (sid, _) in enumerate(self.entries) if redis_manager.stream_id_key(sid) > after),
+                len(self.entries),
+            )
+        return self.entries[start : start + count if count else None]
+
+
+class TestStreamPaging(unittest.IsolatedAsyncioTestCase):
+    async def _read(self, client, **kwargs):
+        with (
+            patch.object(redis_manager, "get_client", AsyncMock(return_value=client)),
+            patch.object(redis_module, "STREAM_PAGE_SIZE", 4),
+        ):
+            return [msg["i"] async for msg in redis_manager.iter_stream("t1", **kwargs)]
+
+    async def test_page_reads_only_bounded_ranges(self):
+        client = _StubStreamClient(20)
+        self.assertEqual(await self._read(client, offset=9, limit=3), [9, 10, 11])
+        self.assertTrue(all(count <= 4 for count in client.counts))
+
+    async def test_cursor_starts_after_stream_id(self):
+        client = _StubStreamClient(20)
+        self.assertEqual(await self._read(client, after="1-16", limit=5), [17, 18, 19])
+        self.assertEqual(client.counts, [4, 2])
+
+    async def test_full_read_walks_all_pages(self):
+        client = _StubStreamClient(10)
+        self.assertEqual(await self._read(client, offset=2), list(range(2, 10)))
+        self.assertEqual(await self._read(_StubStreamClient(0)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
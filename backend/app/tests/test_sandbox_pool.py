@@ -0,0 +1,118 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.config.setting import settings
+from app.services.redis_manager import redis_manager
+from app.tools.interpreter_factory import create_interpreter
+from app.tests.mock.local_sandbox import LocalSandbox
+from app.tools.notebook_serializer import NotebookSerializer
+from app.tools.sandbox_pool import SandboxPool, sandbox_pool
+from app.tools.sandbox_sync import MANIFEST_NAME
+
+
+def local_factory(timeout: int):
+    return LocalSandbox.create(timeout=timeout)
+
+
+class TestSandboxPool(unittest.IsolatedAsyncioTestCase):
+    async def test_recycled_sandbox_is_reset_and_reused(self):
+        pool = SandboxPool(size=1, recycle=True, factory=local_factory)
+        await pool.start()
+        for _ in range(300):
+            if pool.metrics()["idle"]:
+                break
+            await asyncio.sleep(0.1)
+
+        sbx = await pool.acquire(timeout=60)
+        self.assertEqual(pool.metrics()["hits"], 1)
+        self.assertEqual(sbx.timeout, 60)
+        home = sbx.home_dir
+        await sbx.files.write(f"{home}/data.csv", "a,b\n1,2\n")
+        await sbx.files.write(f"{home}/{MANIFEST_NAME}", f'{{"{home}/data.csv": {{}}}}')
+        execution = await sbx.run_code("x = 41\nopen('fig.png', 'w').write('png')")
+        self.assertIsNone(execution.error)
+
+        await pool.release(sbx)
+        self.assertEqual(pool.metrics()["recycled"], 1)
+        again = await pool.acquire()
+        self.assertIs(again, sbx)
+        # 命名空间与生成文件已清空，同步清单记录的数据集保留
+        execution = await again.run_code("x")
+        self.assertEqual(execution.error.name, "NameError")
+        self.assertFalse(os.path.exists(f"{home}/fig.png"))
+        self.assertTrue(os.path.exists(f"{home}/data.csv"))
+
+        await pool.release(again, reusable=False)
+        await pool.shutdown()
+        self.assertFalse(await again.is_running())
+
+    async def test_release_after_refill_still_recycles(self):
+        created = 0
+
+        def counting_factory(timeout: int):
+            nonlocal created
+            created += 1
+            return local_factory(timeout)
+
+        pool = SandboxPool(size=1, recycle=True, factory=counting_factory)
+        await pool.start()
+        await pool._refill_task
+        sbx = await pool.acquire(timeout=60)
+
+        # 任务运行期间后台补足已结束：租出的沙箱计入目标数，不创建替补
+        await pool._refill_task
+        self.assertEqual(created, 1)
+        self.assertEqual(pool.metrics()["idle"], 0)
+
+        await pool.release(sbx)
+        self.assertEqual(pool.metrics()["recycled"], 1)
+        self.assertEqual(pool.metrics()["discarded"], 0)
+        self.assertIs(await pool.acquire(), sbx)
+
+        # 不可回收的沙箱销毁后补足新的
+        await pool.release(sbx, reusable=False)
+        await pool._refill_task
+        self.assertEqual(created, 2)
+        self.assertEqual(pool.metrics()["idle"], 1)
+        await pool.shutdown()
+
+    async def test_remote_interpreter_leases_from_pool(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, True)
+        with open(os.path.join(work_dir, "data.csv"), "w") as f:
+            f.write("a,b\n1,2\n")
+
+        with (
+            patch.object(settings, "E2B_API_KEY", "test"),
+            patch.object(sandbox_pool, "factory", local_factory),
+            patch.object(sandbox_pool, "size", 0),
+            patch.object(redis_manager, "publish_message", AsyncMock()),
+        ):
+            interp = await create_interpreter(
+                kind="remote",
+                task_id="t1",
+                work_dir=work_dir,
+                notebook_serializer=NotebookSerializer(work_dir),
+            )
+            sbx = interp.sbx
+            text, error, _ = await interp.execute_code(
+                "print(open('data.csv').read().splitlines())\n"
+                "open('fig.png', 'wb').write(b'png')"
+            )
+            self.assertFalse(error)
+            self.assertIn("['a,b', '1,2']", text)
+            # 生成的图片已同步回本地工作目录
+            self.assertTrue(os.path.exists(os.path.join(work_dir, "fig.png")))
+
+            await interp.cleanup()
+            self.assertIsNone(interp.sbx)
+            self.assertFalse(await sbx.is_running())
+            self.assertEqual(sandbox_pool.metrics()["discarded"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import posixpath
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from e2b import FileType
+
+from app.tools.sandbox_sync import SandboxSync
+
+
+class _FakeFiles:
+    """内存中的沙箱文件系统，接口同 AsyncSandbox.files"""
+
+    def __init__(self):
+        self.data: dict[str, bytes] = {}
+        self.modified: dict[str, datetime] = {}
+        self.writes: list[str] = []
+        self.reads: list[str] = []
+        self.active = 0
+        self.max_active = 0
+        self._clock = datetime(2025, 1, 1)
+
+    def put(self, path: str, content: bytes):
+        self._clock += timedelta(seconds=1)
+        self.data[path] = content
+        self.modified[path] = self._clock
+
+    async def write(self, path, data):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        if hasattr(data, "read"):
+            data = data.read()
+        self.put(path, data.encode() if isinstance(data, str) else data)
+        self.writes.append(path)
+
+    async def read(self, path, format="text"):
+        if path not in self.data:
+            raise FileNotFoundError(path)
+        self.reads.append(path)
+        content = self.data[path]
+        if format == "bytes":
+            return content
+        if format == "stream":
+
+            async def chunks():
+                for i in range(0, len(content), 4):
+                    yield content[i : i + 4]
+
+            return chunks()
+        return content.decode()
+
+    async def list(self, path, depth=1):
+        entries = []
+        for p, content in self.data.items():
+            rel = posixpath.relpath(p, path)
+            if rel.startswith("..") or rel.count("/") >= depth:
+                continue
+            entries.append(
+                SimpleNamespace(
+                    name=posixpath.basename(p),
+                    path=p,
+                    type=FileType.FILE,
+                    size=len(content),
+                    modified_time=self.modified[p],
+                )
+            )
+        return entries
+
+
+class TestSandboxSync(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        for name, content in (("a.csv", b"1,2"), ("b.xlsx", b"x" * 64), ("font.ttf", b"ttf"), ("notes.txt", b"-")):
+            with open(os.path.join(self.work_dir, name), "wb") as f:
+                f.write(content)
+        self.files = _FakeFiles()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    async def test_upload_skips_unchanged_files_in_reused_sandbox(self):
+        uploaded = await SandboxSync(self.files, self.work_dir, concurrency=2, stream_threshold=32).upload()
+        self.assertEqual(uploaded, ["a.csv", "b.xlsx", "font.ttf"])
+        self.assertIn("/home/user/fonts/font.ttf", self.files.data)
+        self.assertEqual(self.files.max_active, 2)
+
+        # 同一沙箱再次同步：内容未变全部跳过
+        self.assertEqual(await SandboxSync(self.files, self.work_dir).upload(), [])
+
+        # 本地改动的文件与沙箱中被改写的文件重新上传
+        with open(os.path.join(self.work_dir, "a.csv"), "wb") as f:
+            f.write(b"3,4,5")
+        self.files.put("/home/user/b.xlsx", b"overwritten")
+        uploaded = await SandboxSync(self.files, self.work_dir).upload()
+        self.assertEqual(uploaded, ["a.csv", "b.xlsx"])
+        self.assertEqual(self.files.data["/home/user/a.csv"], b"3,4,5")
+
+    async def test_download_only_new_or_changed_files(self):
+        sync = SandboxSync(self.files, self.work_dir, stream_threshold=8)
+        await sync.upload()
+        self.assertEqual(await sync.download(), [])
+
+        self.files.put("/home/user/fig_1.png", b"png-bytes-streamed")
+        self.files.put("/home/user/a.csv", b"cleaned")
+        self.assertEqual(sorted(await sync.download()), ["a.csv", "fig_1.png"])
+        with open(os.path.join(self.work_dir, "fig_1.png"), "rb") as f:
+            self.assertEqual(f.read(), b"png-bytes-streamed")
+        with open(os.path.join(self.work_dir, "a.csv"), "rb") as f:
+            self.assertEqual(f.read(), b"cleaned")
+
+        self.files.reads.clear()
+        self.assertEqual(await sync.download(), [])
+        self.assertEqual(self.files.reads, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
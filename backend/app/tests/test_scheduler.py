@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+
+from app.core.scheduler import SectionScheduler
+
+DEPENDENCIES = {
+    "eda": [],
+    "ques1": ["eda"],
+    "ques2": ["eda"],
+    "ques3": ["eda"],
+    "ques4": ["eda"],
+    "sensitivity_analysis": ["ques1", "ques2", "ques3", "ques4"],
+}
+
+
+class TestSectionScheduler(unittest.IsolatedAsyncioTestCase):
+    async def _run(self, max_parallel: int, completed=()):
+        events = []
+        running = 0
+        peak = 0
+
+        async def run_section(key):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            events.append(("start", key))
+            await asyncio.sleep(0.01)
+            events.append(("end", key))
+            running -= 1
+
+        await SectionScheduler(DEPENDENCIES, max_parallel).run(run_section, completed)
+        return events, peak
+
+    def _assert_dependencies_respected(self, events):
+        ended = set()
+        for kind, key in events:
+            if kind == "start":
+                self.assertTrue(set(DEPENDENCIES[key]) <= ended, key)
+            else:
+                ended.add(key)
+
+    async def test_parallel_respects_dependencies_and_limit(self):
+        events, peak = await self._run(max_parallel=3)
+        self._assert_dependencies_respected(events)
+        self.assertEqual(peak, 3)
+        self.assertEqual(len(events), 2 * len(DEPENDENCIES))
+
+    async def test_sequential_keeps_order(self):
+        events, peak = await self._run(max_parallel=1)
+        self.assertEqual(peak, 1)
+        self.assertEqual([key for kind, key in events if kind == "start"], list(DEPENDENCIES))
+
+    async def test_completed_sections_are_skipped(self):
+        events, _ = await self._run(max_parallel=2, completed=["eda", "ques1"])
+        started = {key for kind, key in events if kind == "start"}
+        self.assertEqual(started, {"ques2", "ques3", "ques4", "sensitivity_analysis"})
+
+    async def test_failure_cancels_running_sections(self):
+        cancelled = []
+
+        async def run_section(key):
+            if key == "ques1":
+                raise RuntimeError("boom")
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(key)
+                raise
+
+        with self.assertRaises(RuntimeError):
+            await SectionScheduler(DEPENDENCIES, 4).run(run_section, completed=["eda"])
+        self.assertTrue(cancelled)
+
+    def test_cycle_is_rejected(self):
+        with self.assertRaises(ValueError):
+            SectionScheduler({"a": ["b"], "b": ["a"]})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,213 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from app.config.setting import settings
+from app.core.scheduler import SectionScheduler
+from app.core.workflow import MathModelWorkFlow
+from app.models.user_output import UserOutput
+from app.schemas.A2A import WriterResponse
+from app.services.checkpoint_control import CheckpointControl
+from app.services.redis_manager import redis_manager
+
+
+class _StubWriter:
+    """论文手替身：记录撰写顺序，可按小节阻塞或抛出异常"""
+
+    def __init__(self, gates: dict[str, asyncio.Event] | None = None, fail_on: str | None = None):
+        self.gates = gates or {}
+        self.fail_on = fail_on
+        self.written: list[str] = []
+
+    async def run(self, prompt, available_images=None, sub_title=None):
+        if sub_title in self.gates:
+            await self.gates[sub_title].wait()
+        if sub_title == self.fail_on:
+            raise RuntimeError(f"写作失败: {sub_title}")
+        self.written.append(sub_title)
+        return WriterResponse(response_content=f"{sub_title}:{prompt}")
+
+    async def append_chat_history(self, message):
+        pass
+
+
+class WorkflowStageTestCase(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir, True)
+        for patcher in (
+            patch.object(redis_manager, "publish_message", AsyncMock()),
+            patch.object(CheckpointControl, "prompt_and_wait", AsyncMock(return_value=None)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _workflow(self, writer: _StubWriter, ques_count: int = 2) -> MathModelWorkFlow:
+        workflow = MathModelWorkFlow()
+        workflow.task_id = "t1"
+        workflow.work_dir = self.work_dir
+        workflow.user_output = UserOutput(work_dir=self.work_dir, ques_count=ques_count)
+        workflow.writer_agent = writer
+        return workflow
+
+
+class TestRunPipelined(WorkflowStageTestCase):
+    DEPENDENCIES = {"eda": [], "ques1": ["eda"], "ques2": ["eda"]}
+
+    async def test_out_of_order_sections_keep_paper_order(self):
+        writer = _StubWriter()
+        workflow = self._workflow(writer)
+        delays = {"eda": 0, "ques1": 0.05, "ques2": 0.01}
+
+        async def run_section(key, writer_queue):
+            await asyncio.sleep(delays[key])
+            await writer_queue.put((key, f"prompt-{key}", []))
+
+        await workflow._run_pipelined(SectionScheduler(self.DEPENDENCIES, 2), run_section, [])
+
+        # ques2 先求解完成、先写作，结果仍按论文顺序排列
+        self.assertEqual(writer.written, ["eda", "ques2", "ques1"])
+        self.assertEqual(list(workflow.user_output.res), ["eda", "ques1", "ques2"])
+
+    async def test_coder_stage_waits_when_writer_queue_is_full(self):
+        release = asyncio.Event()
+        writer = _StubWriter(gates={"eda": release})
+        workflow = self._workflow(writer)
+        queued = []
+
+        async def run_section(key, writer_queue):
+            await writer_queue.put((key, f"prompt-{key}", []))
+            queued.append(key)
+
+        with patch.object(settings, "WRITER_QUEUE_SIZE", 1):
+            run = asyncio.create_task(
+                workflow._run_pipelined(SectionScheduler(self.DEPENDENCIES, 1), run_section, [])
+            )
+            for _ in range(20):
+                await asyncio.sleep(0)
+            # 论文手卡在 eda，队列中积压 ques1，ques2 的求解结果放不进队列
+            self.assertEqual(queued, ["eda", "ques1"])
+            self.assertFalse(run.done())
+
+            release.set()
+            await run
+        self.assertEqual(queued, ["eda", "ques1", "ques2"])
+        self.assertEqual(writer.written, ["eda", "ques1", "ques2"])
+
+    async def test_writer_failure_cancels_coder_stage(self):
+        workflow = self._workflow(_StubWriter(fail_on="eda"))
+        cancelled = []
+
+        async def run_section(key, writer_queue):
+            await writer_queue.put((key, f"prompt-{key}", []))
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(key)
+                raise
+
+        with self.assertRaisesRegex(RuntimeError, "写作失败"):
+            await asyncio.wait_for(
+                workflow._run_pipelined(SectionScheduler(self.DEPENDENCIES, 1), run_section, []),
+                timeout=5,
+            )
+        self.assertEqual(cancelled, ["eda"])
+
+    async def test_coder_failure_cancels_writer_stage(self):
+        writer = _StubWriter(gates={"eda": asyncio.Event()})
+        workflow = self._workflow(writer)
+
+        async def run_section(key, writer_queue):
+            if key == "ques1":
+                raise RuntimeError(f"求解失败: {key}")
+            await writer_queue.put((key, f"prompt-{key}", []))
+
+        with self.assertRaisesRegex(RuntimeError, "求解失败"):
+            await asyncio.wait_for(
+                workflow._run_pipelined(SectionScheduler(self.DEPENDENCIES, 1), run_section, []),
+                timeout=5,
+            )
+        self.assertEqual(writer.written, [])
+
+    async def test_completed_sections_are_skipped(self):
+        writer = _StubWriter()
+        workflow = self._workflow(writer)
+        solved = []
+
+        async def run_section(key, writer_queue):
+            solved.append(key)
+            await writer_queue.put((key, f"prompt-{key}", []))
+
+        await workflow._run_pipelined(
+            SectionScheduler(self.DEPENDENCIES, 2), run_section, ["eda", "ques1"]
+        )
+        self.assertEqual(solved, ["ques2"])
+        self.assertEqual(writer.written, ["ques2"])
+
+
+class TestWriteFlowsFanout(WorkflowStageTestCase):
+    WRITE_FLOWS = {
+        "firstPage": "摘要",
+        "RepeatQues": "问题重述",
+        "analysisQues": "问题分析",
+        "modelAssumption": "模型假设",
+    }
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch.object(settings, "WRITE_FLOWS_MODE", "fanout")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_isolated_writers_keep_paper_order(self):
+        shared = _StubWriter()
+        workflow = self._workflow(shared)
+        gates = {key: asyncio.Event() for key in self.WRITE_FLOWS}
+        writers = []
+
+        def create_writer_agent():
+            writers.append(_StubWriter(gates=gates))
+            return writers[-1]
+
+        workflow._create_writer_agent = create_writer_agent
+        run = asyncio.create_task(workflow._run_write_flows(self.WRITE_FLOWS, shared))
+        for _ in range(20):
+            await asyncio.sleep(0)
+        # 各部分同时在写，每个部分一个独立的论文手
+        self.assertEqual(len(writers), len(self.WRITE_FLOWS))
+
+        # 逆序完成，每完成一部分检查结果中已有的部分仍按论文顺序排列
+        finished = []
+        for key in reversed(list(self.WRITE_FLOWS)):
+            gates[key].set()
+            await asyncio.sleep(0.01)
+            finished.insert(0, key)
+            self.assertEqual(list(workflow.user_output.res), finished)
+        await run
+
+        self.assertEqual(shared.written, [])
+        self.assertEqual([w.written for w in writers], [[key] for key in self.WRITE_FLOWS])
+        self.assertEqual(list(workflow.user_output.res), list(self.WRITE_FLOWS))
+
+    async def test_completed_parts_are_skipped(self):
+        shared = _StubWriter()
+        workflow = self._workflow(shared)
+        workflow.user_output.set_res("firstPage", WriterResponse(response_content="已完成的摘要"))
+        writers = []
+
+        def create_writer_agent():
+            writers.append(_StubWriter())
+            return writers[-1]
+
+        workflow._create_writer_agent = create_writer_agent
+        await workflow._run_write_flows(self.WRITE_FLOWS, shared)
+
+        written = sorted(key for w in writers for key in w.written)
+        self.assertEqual(written, sorted(set(self.WRITE_FLOWS) - {"firstPage"}))
+        self.assertEqual(workflow.user_output.res["firstPage"]["response_content"], "已完成的摘要")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from app.routers.ws_router import _forward_messages, websocket_endpoint
+from app.services.redis_manager import redis_manager
+from app.services.ws_hub import RESYNC_CLOSE_CODE, MessageHub, SubscriptionOverflow, message_hub
+from app.services.ws_manager import ws_manager
+
+
+class _StubWebSocket:
+    def __init__(self):
+        self.sent: list[dict] = []
+        self.closed: tuple[int, str] | None = None
+
+    client = None
+
+    async def accept(self):
+        pass
+
+    async def send_json(self, data):
+        self.sent.append(data)
+
+    async def close(self, code: int = 1000, reason: str | None = None):
+        self.closed = (code, reason)
+
+
+class TestMessageHub(unittest.IsolatedAsyncioTestCase):
+    def _hub_with_subscriber(self, queue_size: int):
+        hub = MessageHub(queue_size=queue_size)
+        hub._ready.set()
+        hub._ensure_listener = lambda: None
+        return hub
+
+    async def test_overflow_closes_socket_for_resync_instead_of_dropping(self):
+        hub = self._hub_with_subscriber(queue_size=2)
+        sub = await hub.subscribe("t1")
+        for i in range(4):
+            hub._dispatch("task:t1:messages", json.dumps({"id": i, "stream_id": f"1-{i}"}))
+
+        # 溢出后不再入队，也不挤掉已入队的消息
+        self.assertTrue(sub.overflowed)
+        self.assertEqual(sub.queue.qsize(), 2)
+        self.assertEqual(hub.metrics()["resyncs"], 1)
+        self.assertEqual(hub.metrics()["dropped"], 2)
+        with self.assertRaises(SubscriptionOverflow):
+            await sub.get()
+
+        websocket = _StubWebSocket()
+        await _forward_messages(websocket, sub, None)
+        self.assertEqual(websocket.closed, (RESYNC_CLOSE_CODE, "resync"))
+
+    async def test_replayed_messages_are_skipped_while_forwarding(self):
+        hub = self._hub_with_subscriber(queue_size=8)
+        sub = await hub.subscribe("t1")
+        for i in range(3):
+            hub._dispatch("task:t1:messages", json.dumps({"id": i, "stream_id": f"1-{i}"}))
+
+        websocket = _StubWebSocket()
+        # 补发阶段已发送到 1-0，实时消息从 1-1 开始
+        forward = asyncio.create_task(_forward_messages(websocket, sub, (1, 0)))
+        for _ in range(10):
+            await asyncio.sleep(0)
+        forward.cancel()
+        self.assertEqual([m["id"] for m in websocket.sent], [1, 2])
+        self.assertIsNone(websocket.closed)
+        self.assertEqual(hub.metrics()["resyncs"], 0)
+
+
+    async def test_subscribe_timeout_releases_connection(self):
+        websocket = _StubWebSocket()
+        client = SimpleNamespace(exists=AsyncMock(return_value=True))
+        with (
+            patch.object(redis_manager, "get_client", AsyncMock(return_value=client)),
+            patch.object(message_hub, "subscribe", AsyncMock(side_effect=asyncio.TimeoutError)),
+            patch.object(message_hub, "unsubscribe") as unsubscribe,
+        ):
+            await websocket_endpoint(websocket, "t1")
+        self.assertNotIn(websocket, ws_manager.active_connections)
+        unsubscribe.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -22,6 +22,8 @@ class BaseCodeInterpreter(abc.ABC):
         self.notebook_serializer = notebook_serializer
         self.section_output: dict[str, dict[str, list[str]]] = {}
         self.last_created_images = set()
+        # 多个解释器共享工作目录时，只把以该前缀命名的新图片归入本解释器
+        self.image_prefix: str | None = None
 
     @abc.abstractmethod
     async def initialize(self):
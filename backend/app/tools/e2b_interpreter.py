@@ -1,5 +1,4 @@
 import os
-from e2b_code_interpreter import AsyncSandbox
 from app.schemas.response import (
     ErrorModel,
     OutputItem,
@@ -11,9 +10,10 @@ from app.schemas.response import (
 from app.services.redis_manager import redis_manager
 from app.tools.notebook_serializer import NotebookSerializer
 from app.utils.log_util import logger
-from app.config.setting import settings
 import json
 from app.tools.base_interpreter import BaseCodeInterpreter
+from app.tools.sandbox_pool import sandbox_home, sandbox_pool, user_fonts_code
+from app.tools.sandbox_sync import SandboxSync
 
 
 class E2BCodeInterpreter(BaseCodeInterpreter):
@@ -25,6 +25,7 @@ class E2BCodeInterpreter(BaseCodeInterpreter):
     ):
         super().__init__(task_id, work_dir, notebook_serializer)
         self.sbx = None
+        self.sync: SandboxSync | None = None
 
     @classmethod
     async def create(
@@ -38,87 +39,39 @@ class E2BCodeInterpreter(BaseCodeInterpreter):
         return instance
 
     async def initialize(self, timeout: int = 3000):
-        """异步初始化沙箱环境"""
+        """异步初始化沙箱环境：从沙箱池领取已执行绘图预设的沙箱"""
         try:
-            self.sbx = await AsyncSandbox.create(
-                api_key=settings.E2B_API_KEY, timeout=timeout
-            )
+            self.sbx = await sandbox_pool.acquire(timeout=timeout)
             logger.info("沙箱环境初始化成功")
-            await self._pre_execute_code()
+            self.sync = SandboxSync(
+                self.sbx.files, self.work_dir, remote_dir=sandbox_home(self.sbx)
+            )
+            # 先上传字体，预执行代码才能注册到 matplotlib
             await self._upload_all_files()
+            await self._pre_execute_code()
         except Exception as e:
             logger.error(f"初始化沙箱环境失败: {str(e)}")
+            if self.sbx:
+                sbx, self.sbx = self.sbx, None
+                await sandbox_pool.release(sbx, reusable=False)
             raise
 
     async def _upload_all_files(self):
-        """上传工作目录中的所有文件到沙箱"""
+        """增量上传工作目录中的数据集与字体到沙箱"""
         try:
             logger.info(f"开始上传文件，工作目录: {self.work_dir}")
             if not os.path.exists(self.work_dir):
                 logger.error(f"工作目录不存在: {self.work_dir}")
                 raise FileNotFoundError(f"工作目录不存在: {self.work_dir}")
-
-            files = [
-                f
-                for f in os.listdir(self.work_dir)
-                if f.endswith((".csv", ".xlsx", ".ttf", ".ttc", ".otf"))
-            ]
-            logger.info(f"工作目录中的文件列表: {files}")
-
-            for file in files:
-                file_path = os.path.join(self.work_dir, file)
-                if os.path.isfile(file_path):
-                    try:
-                        with open(file_path, "rb") as f:
-                            content = f.read()
-                            # 将文件上传到用户目录；字体文件放入 /home/user/fonts
-                            dst_path = (
-                                f"/home/user/fonts/{file}" if file.lower().endswith((".ttf", ".ttc", ".otf")) else f"/home/user/{file}"
-                            )
-                            await self.sbx.files.write(dst_path, content)
-                            logger.info(f"成功上传文件到沙箱: {file}")
-                    except Exception as e:
-                        logger.error(f"上传文件 {file} 失败: {str(e)}")
-                        raise
-
+            uploaded = await self.sync.upload()
+            logger.info(f"上传完成，共上传 {len(uploaded)} 个文件")
         except Exception as e:
             logger.error(f"文件上传过程失败: {str(e)}")
             raise
 
     async def _pre_execute_code(self):
-        init_code = (
-            "import os\n"
-            "import matplotlib as mpl\n"
-            "import matplotlib.pyplot as plt\n"
-            "from matplotlib import font_manager as fm\n"
-            "_font_files = [\n"
-            "  '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',\n"
-            "  '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',\n"
-            "  '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',\n"
-            "  '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',\n"
-            "]\n"
-            "for _f in _font_files:\n"
-            "    try:\n"
-            "        if os.path.exists(_f):\n"
-            "            fm.fontManager.addfont(_f)\n"
-            "    except Exception:\n"
-            "        pass\n"
-            "# 同时扫描 /home/user/fonts 目录下由我们上传的字体\n"
-            "_user_font_dir = '/home/user/fonts'\n"
-            "if os.path.isdir(_user_font_dir):\n"
-            "    for _root, _dirs, _files in os.walk(_user_font_dir):\n"
-            "        for _fn in _files:\n"
-            "            if _fn.lower().endswith(('.ttf', '.ttc', '.otf')):\n"
-            "                _p = os.path.join(_root, _fn)\n"
-            "                try:\n"
-            "                    fm.fontManager.addfont(_p)\n"
-            "                except Exception:\n"
-            "                    pass\n"
-            "plt.rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'WenQuanYi Zen Hei', 'WenQuanYi Micro Hei', 'SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB', 'Source Han Sans SC', 'DejaVu Sans', 'sans-serif']\n"
-            "plt.rcParams['font.family'] = 'sans-serif'\n"
-            "plt.rcParams['axes.unicode_minus'] = False\n"
-        )
-        await self.execute_code(init_code)
+        # 系统字体与 rcParams 已在沙箱池创建沙箱时设定，这里只注册任务上传的字体
+        await self.execute_code(user_fonts_code(sandbox_home(self.sbx)))
 
     async def execute_code(self, code: str) -> tuple[str, bool, str]:
         """执行代码并返回结果"""
@@ -337,66 +290,28 @@ class E2BCodeInterpreter(BaseCodeInterpreter):
     async def cleanup(self):
         """清理资源并关闭沙箱"""
         try:
-            if self.sbx:
-                if await self.sbx.is_running():
-                    try:
-                        await self.download_all_files_from_sandbox()
-                    except Exception as e:
-                        logger.error(f"下载文件失败: {str(e)}")
-                    finally:
-                        await self.sbx.kill()
-                        logger.info("成功关闭沙箱环境")
-                else:
-                    logger.warning("沙箱已经关闭，跳过清理步骤")
+            self.notebook_serializer.materialize()
+        except Exception as e:
+            logger.error(f"保存 notebook 失败: {str(e)}")
+        if not self.sbx:
+            return
+        try:
+            await self.download_all_files_from_sandbox()
         except Exception as e:
-            logger.error(f"清理沙箱环境失败: {str(e)}")
-            # 这里可以选择不抛出异常，因为这是清理步骤
+            logger.error(f"下载文件失败: {str(e)}")
+        finally:
+            # 归还沙箱：由沙箱池决定回收复用或销毁
+            sbx, self.sbx = self.sbx, None
+            await sandbox_pool.release(sbx)
+            logger.info("已归还沙箱")
 
     async def download_all_files_from_sandbox(self) -> None:
-        """从沙箱中下载所有文件并与本地同步"""
+        """将沙箱中新增或改动的文件增量同步到本地"""
+        if self.sync is None:
+            return
         try:
-            # 获取沙箱中的文件列表
-            sandbox_files = await self.sbx.files.list("/home/user")
-            sandbox_files_dict = {f.name: f for f in sandbox_files}
-
-            # 获取本地文件列表
-            local_files = set()
-            if os.path.exists(self.work_dir):
-                local_files = set(os.listdir(self.work_dir))
-
-            # 下载新文件或更新已修改的文件
-            for file in sandbox_files:
-                try:
-                    # 排除 .bash_logout、.bashrc 和 .profile 文件
-                    if file.name in [".bash_logout", ".bashrc", ".profile"]:
-                        continue
-
-                    local_path = os.path.join(self.work_dir, file.name)
-                    should_download = True
-
-                    # 检查文件是否需要更新
-                    if file.name in local_files:
-                        # 这里可以添加文件修改时间或内容哈希的比较
-                        # 暂时简单处理，有同名文件就更新
-                        pass
-
-                    if should_download:
-                        # 使用 bytes 格式读取文件内容，确保正确处理二进制数据
-                        content = await self.sbx.files.read(file.path, format="bytes")
-
-                        # 确保目标目录存在
-                        os.makedirs(self.work_dir, exist_ok=True)
-
-                        # 写入文件
-                        with open(local_path, "wb") as f:
-                            f.write(content)
-                        logger.info(f"同步文件: {file.name}")
-
-                except Exception as e:
-                    logger.error(f"同步文件 {file.name} 失败: {str(e)}")
-                    continue
-
-            logger.info("文件同步完成")
-
+            downloaded = await self.sync.download()
+            if downloaded:
+                logger.info(f"同步 {len(downloaded)} 个文件: {downloaded}")
         except Exception as e:
             logger.error(f"文件同步失败: {str(e)}")
@@ -28,6 +28,7 @@ async def create_interpreter(
             work_dir=work_dir,
             notebook_serializer=notebook_serializer,
         )
+        # 从沙箱池领取预创建的沙箱，任务结束 cleanup 时归还
         await interp.initialize(timeout=timeout)
         return interp
     elif kind == "local":
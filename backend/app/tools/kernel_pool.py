@@ -0,0 +1,226 @@
+import asyncio
+import os
+import queue
+import time
+from jupyter_client import AsyncKernelClient, AsyncKernelManager
+from jupyter_client.manager import start_new_async_kernel
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+# 与任务无关的绘图预设：注册常见中文字体、设定 rcParams
+# 预热内核时执行一次，字体注册做了去重，回收后重复执行也不会累积
+KERNEL_PREAMBLE = (
+    "import os\n"
+    # Matplotlib 中文与负号支持；并尽量动态注册常见中文字体
+    "import matplotlib as mpl\n"
+    "import matplotlib.pyplot as plt\n"
+    "from matplotlib import font_manager as fm\n"
+    "plt.close('all')\n"
+    "_registered = {_e.fname for _e in fm.fontManager.ttflist}\n"
+    # 动态注册常见字体文件（存在才添加）
+    "_font_files = [\n"
+    "    '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',\n"
+    "    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',\n"
+    "    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',\n"
+    "    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',\n"
+    "    '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',\n"
+    "]\n"
+    "for _f in _font_files:\n"
+    "    try:\n"
+    "        if os.path.exists(_f) and _f not in _registered:\n"
+    "            fm.fontManager.addfont(_f)\n"
+    "    except Exception as _e:\n"
+    "        pass\n"
+    # 设定优先字体族（与上面注册的字体家族名对应）
+    "plt.rcParams['font.sans-serif'] = [\n"
+    "    'Noto Sans CJK SC', 'WenQuanYi Zen Hei', 'WenQuanYi Micro Hei',\n"
+    "    'SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB',\n"
+    "    'Source Han Sans SC', 'DejaVu Sans', 'sans-serif'\n"
+    "]\n"
+    "plt.rcParams['font.family'] = 'sans-serif'\n"
+    "plt.rcParams['axes.unicode_minus'] = False\n"
+)
+
+
+async def run_in_kernel(
+    kc: AsyncKernelClient, code: str, timeout: float = 60
+) -> str | None:
+    """在内核中静默执行一段代码，等待执行结束
+
+    Returns:
+        出错时返回 traceback 文本，否则返回 None
+    """
+    msg_id = kc.execute(code, silent=False, store_history=False)
+    deadline = time.monotonic() + timeout
+    error: str | None = None
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("内核执行预设代码超时")
+        try:
+            msg = await kc.get_iopub_msg(timeout=min(remaining, 1))
+        except queue.Empty:
+            continue
+        if msg.get("parent_header", {}).get("msg_id") != msg_id:
+            continue
+        if msg["msg_type"] == "error":
+            error = "\n".join(msg["content"].get("traceback", []))
+        elif (
+            msg["msg_type"] == "status"
+            and msg["content"].get("execution_state") == "idle"
+        ):
+            return error
+
+
+class KernelPool:
+    """预热的本地 Jupyter 内核池
+
+    常驻 N 个已执行绘图预设的内核，任务启动时直接领取，避免每个任务
+    都要等待内核启动与字体扫描。内核归还时按配置回收（重置命名空间后
+    放回池中）或直接关闭，池会在后台补足到目标数量。
+    """
+
+    def __init__(self, size: int | None = None, recycle: bool | None = None):
+        self.size = settings.KERNEL_POOL_SIZE if size is None else size
+        self.recycle = settings.KERNEL_POOL_RECYCLE if recycle is None else recycle
+        self.base_dir = os.getcwd()
+        self._idle: list[tuple[AsyncKernelManager, AsyncKernelClient]] = []
+        self._starting = 0
+        self._leased = 0
+        self._refill_task: asyncio.Task | None = None
+        self._closed = False
+        # 指标
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    async def start(self):
+        """启动后台预热"""
+        self._closed = False
+        if self.size > 0:
+            logger.info(f"预热内核池，目标数量: {self.size}")
+            self._schedule_refill()
+
+    async def acquire(self) -> tuple[AsyncKernelManager, AsyncKernelClient]:
+        """领取一个已执行预设的内核，池为空时现场启动"""
+        while self._idle:
+            km, kc = self._idle.pop()
+            if await km.is_alive():
+                self.hits += 1
+                self._leased += 1
+                self._schedule_refill()
+                logger.info("从内核池领取预热内核")
+                return km, kc
+            await self._shutdown(km, kc)
+
+        self.misses += 1
+        self._schedule_refill()
+        km, kc = await self._start_kernel()
+        self._leased += 1
+        return km, kc
+
+    async def release(
+        self,
+        km: AsyncKernelManager,
+        kc: AsyncKernelClient,
+        reusable: bool = True,
+    ):
+        """归还内核：可回收则重置后放回池中，否则关闭并在后台补足"""
+        self._leased = max(0, self._leased - 1)
+        if (
+            reusable
+            and self.recycle
+            and not self._closed
+            and len(self._idle) < self.size
+            and await km.is_alive()
+        ):
+            try:
+                await self._reset(kc)
+                self._idle.append((km, kc))
+                self.recycled += 1
+                logger.info("内核已重置并放回内核池")
+                return
+            except Exception as e:
+                logger.warning(f"重置内核失败，改为关闭: {e}")
+
+        await self._shutdown(km, kc)
+        self.discarded += 1
+        self._schedule_refill()
+
+    async def shutdown(self):
+        """关闭池中所有空闲内核"""
+        self._closed = True
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        idle, self._idle = self._idle, []
+        for km, kc in idle:
+            await self._shutdown(km, kc)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "starting": self._starting,
+            "leased": self._leased,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "recycled": self.recycled,
+            "discarded": self.discarded,
+        }
+
+    def _schedule_refill(self):
+        if self._closed or self.size <= 0:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        while not self._closed and len(self._idle) + self._starting < self.size:
+            self._starting += 1
+            try:
+                km, kc = await self._start_kernel()
+            except Exception as e:
+                logger.error(f"预热内核失败: {e}")
+                return
+            finally:
+                self._starting -= 1
+            # 启动期间可能已有回收的内核补位，多余的直接关闭
+            if self._closed or len(self._idle) >= self.size:
+                await self._shutdown(km, kc)
+                return
+            self._idle.append((km, kc))
+
+    async def _start_kernel(self) -> tuple[AsyncKernelManager, AsyncKernelClient]:
+        km, kc = await start_new_async_kernel(kernel_name="python3")
+        error = await run_in_kernel(kc, KERNEL_PREAMBLE)
+        if error:
+            logger.warning(f"内核预设代码执行出错: {error}")
+        return km, kc
+
+    async def _reset(self, kc: AsyncKernelClient):
+        # 清空用户命名空间并回到初始目录，随后重新执行绘图预设
+        reset_code = (
+            "%reset -f\n"
+            "import os\n"
+            f"os.chdir(r'{self.base_dir}')\n"
+        )
+        error = await run_in_kernel(kc, reset_code)
+        if error:
+            raise RuntimeError(error)
+        error = await run_in_kernel(kc, KERNEL_PREAMBLE)
+        if error:
+            logger.warning(f"内核预设代码执行出错: {error}")
+
+    async def _shutdown(self, km: AsyncKernelManager, kc: AsyncKernelClient):
+        try:
+            kc.stop_channels()
+            await km.shutdown_kernel(now=True)
+        except Exception as e:
+            logger.warning(f"关闭内核失败: {e}")
+
+
+kernel_pool = KernelPool()
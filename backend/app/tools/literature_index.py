@@ -0,0 +1,265 @@
+"""本地文献索引：从 OpenAlex 快照（works JSONL）构建的 BM25 倒排索引
+
+离线部署或希望减少 OpenAlex 往返时，由 OpenAlexScholar 先查本地索引，未命中再回退远程 API。
+
+构建：python -m app.tools.literature_index build works.jsonl[.gz] ... --out data/literature_index
+
+索引目录结构：
+- meta.json        文档数、平均文档长度、BM25 参数
+- vocab.json       词 -> 倒排表在 postings 数组中的 [起, 止)
+- postings_doc.npy 倒排表文档号（int32），按词连续存放
+- postings_tf.npy  对应词频（float32）
+- doc_len.npy      文档长度（float32）
+- works.jsonl      文献原始记录（只保留检索需要的字段），works_offsets.npy 为每行的字节偏移
+
+数组与 works.jsonl 均以内存映射方式打开，加载几乎不耗时，查询只触及用到的页。
+"""
+
+import argparse
+import gzip
+import json
+import math
+import mmap
+import re
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+import numpy as np
+
+from app.utils.log_util import logger
+
+# 与 OpenAlex 检索请求的 select 字段一致
+WORK_FIELDS = (
+    "id",
+    "title",
+    "display_name",
+    "authorships",
+    "cited_by_count",
+    "doi",
+    "publication_year",
+    "biblio",
+    "abstract_inverted_index",
+)
+K1 = 1.2
+B = 0.75
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+
+
+def tokenize(text: str) -> list[str]:
+    """小写英文/数字词，中文按单字切分"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _term_counts(work: dict) -> Counter:
+    counts = Counter(tokenize(work.get("display_name") or work.get("title") or ""))
+    # 倒排摘要无需还原顺序，词频即位置个数
+    for word, positions in (work.get("abstract_inverted_index") or {}).items():
+        for token in tokenize(word):
+            counts[token] += len(positions)
+    return counts
+
+
+def _read_works(paths: Iterable[str | Path]) -> Iterator[dict]:
+    for path in paths:
+        opener = gzip.open if str(path).endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def build_index(sources: Iterable[str | Path], out_dir: str | Path) -> int:
+    """从一个或多个 works JSONL（可 gzip）构建索引，返回收录的文献数"""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    doc_len: list[int] = []
+    offsets = [0]
+    with open(out / "works.jsonl", "wb") as works_file:
+        for work in _read_works(sources):
+            if not (work.get("display_name") or work.get("title")):
+                continue
+            counts = _term_counts(work)
+            if not counts:
+                continue
+            doc_id = len(doc_len)
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+            doc_len.append(sum(counts.values()))
+            record = {k: work[k] for k in WORK_FIELDS if k in work}
+            works_file.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            offsets.append(works_file.tell())
+
+    vocab: dict[str, list[int]] = {}
+    total = sum(len(p) for p in postings.values())
+    docs = np.empty(total, dtype=np.int32)
+    tfs = np.empty(total, dtype=np.float32)
+    start = 0
+    for term in sorted(postings):
+        items = postings[term]
+        end = start + len(items)
+        docs[start:end] = [d for d, _ in items]
+        tfs[start:end] = [tf for _, tf in items]
+        vocab[term] = [start, end]
+        start = end
+
+    np.save(out / "postings_doc.npy", docs)
+    np.save(out / "postings_tf.npy", tfs)
+    np.save(out / "doc_len.npy", np.asarray(doc_len, dtype=np.float32))
+    np.save(out / "works_offsets.npy", np.asarray(offsets, dtype=np.int64))
+    (out / "vocab.json").write_text(json.dumps(vocab, ensure_ascii=False), encoding="utf-8")
+    meta = {
+        "version": 1,
+        "docs": len(doc_len),
+        "avgdl": (sum(doc_len) / len(doc_len)) if doc_len else 0.0,
+        "k1": K1,
+        "b": B,
+    }
+    (out / "meta.json").write_text(json.dumps(meta), encoding="utf-8")
+    logger.info(f"文献索引构建完成：{meta['docs']} 篇，{len(vocab)} 个词 -> {out}")
+    return meta["docs"]
+
+
+class LiteratureIndex:
+    """只读的本地 BM25 文献索引"""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / "meta.json").read_text(encoding="utf-8"))
+        self.size: int = meta["docs"]
+        self.avgdl: float = meta["avgdl"] or 1.0
+        self.k1: float = meta["k1"]
+        self.b: float = meta["b"]
+        self.vocab: dict[str, list[int]] = json.loads(
+            (self.directory / "vocab.json").read_text(encoding="utf-8")
+        )
+        self.postings_doc = np.load(self.directory / "postings_doc.npy", mmap_mode="r")
+        self.postings_tf = np.load(self.directory / "postings_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(self.directory / "doc_len.npy", mmap_mode="r")
+        self.offsets = np.load(self.directory / "works_offsets.npy", mmap_mode="r")
+        self._works_file = open(self.directory / "works.jsonl", "rb")
+        self._works = (
+            mmap.mmap(self._works_file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else b""
+        )
+
+    def close(self):
+        if isinstance(self._works, mmap.mmap):
+            self._works.close()
+        self._works_file.close()
+
+    def work(self, doc_id: int) -> dict[str, Any]:
+        start, end = int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+        return json.loads(self._works[start:end])
+
+    def search(self, query: str, limit: int = 8, min_score: float = 0.0) -> list[dict[str, Any]]:
+        """按 BM25 得分返回最相关的文献原始记录（字段同 OpenAlex works），无命中返回空列表"""
+        terms = set(tokenize(query))
+        if not terms or not self.size:
+            return []
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in terms:
+            span = self.vocab.get(term)
+            if span is None:
+                continue
+            start, end = span
+            docs = self.postings_doc[start:end]
+            tf = self.postings_tf[start:end]
+            df = end - start
+            idf = math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+            # 同一词的倒排表内文档号不重复，可直接按下标累加
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        limit = min(limit, self.size)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.work(int(i)) for i in top if scores[i] > 0 and scores[i] >= min_score]
+
+
+class LocalLiterature:
+    """按配置目录延迟加载的本地索引，进程内共享；目录不存在时视为不可用"""
+
+    def __init__(self):
+        self._index: LiteratureIndex | None = None
+        self._directory: str | None = None
+        self._lock = threading.Lock()
+        # 指标
+        self.queries = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, directory: str) -> LiteratureIndex | None:
+        with self._lock:
+            if self._directory != directory:
+                if self._index is not None:
+                    self._index.close()
+                self._directory = directory
+                self._index = None
+                if (Path(directory) / "meta.json").exists():
+                    self._index = LiteratureIndex(directory)
+                    logger.info(f"已加载本地文献索引：{self._index.size} 篇（{directory}）")
+                else:
+                    logger.warning(f"本地文献索引不存在：{directory}")
+            return self._index
+
+    def search(self, directory: str, query: str, limit: int, min_score: float) -> list[dict] | None:
+        """查询本地索引；索引不可用返回 None"""
+        index = self.get(directory)
+        if index is None:
+            return None
+        self.queries += 1
+        works = index.search(query, limit, min_score)
+        if works:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return works
+
+    def close(self):
+        with self._lock:
+            if self._index is not None:
+                self._index.close()
+            self._index = None
+            self._directory = None
+
+    def metrics(self) -> dict:
+        return {
+            "loaded": self._index is not None,
+            "docs": self._index.size if self._index is not None else 0,
+            "queries": self.queries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+local_literature = LocalLiterature()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地文献索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="从 OpenAlex works JSONL 构建索引")
+    build.add_argument("sources", nargs="+", help="works JSONL 文件（可 .gz）")
+    build.add_argument("--out", required=True, help="索引输出目录")
+    search = sub.add_parser("search", help="查询索引")
+    search.add_argument("directory")
+    search.add_argument("query")
+    search.add_argument("--limit", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.sources, args.out)
+    else:
+        index = LiteratureIndex(args.directory)
+        for work in index.search(args.query, args.limit):
+            print(work.get("publication_year"), work.get("display_name") or work.get("title"))
+
+
+if __name__ == "__main__":
+    main()
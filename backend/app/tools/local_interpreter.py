@@ -1,9 +1,10 @@
 from app.tools.base_interpreter import BaseCodeInterpreter
 from app.tools.notebook_serializer import NotebookSerializer
-import jupyter_client
+from app.tools.kernel_pool import kernel_pool
 from app.utils.log_util import logger
 import os
 import re
+import queue
 import asyncio
 import shutil
 from app.services.redis_manager import redis_manager
@@ -30,38 +31,32 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
 
     async def initialize(self):
         # 本地内核一般不需异步上传文件，直接切换目录即可
-        # 初始化 Jupyter 内核管理器和客户端
+        # 从内核池领取已执行绘图预设的内核，池为空时现场启动
         logger.info("初始化本地内核")
-        self.km, self.kc = jupyter_client.manager.start_new_kernel(
-            kernel_name="python3"
-        )
-        self._pre_execute_code()
+        self.km, self.kc = await kernel_pool.acquire()
+        # 工作目录中已有的图片（数据集自带、断点续跑或其他小节生成）不算新建
+        self.last_created_images = self._list_images()
+        await self._pre_execute_code()
+
+    def _list_images(self) -> set[str]:
+        if not os.path.isdir(self.work_dir):
+            return set()
+        return {
+            file
+            for file in os.listdir(self.work_dir)
+            if file.endswith((".png", ".jpg", ".jpeg"))
+        }
 
-    def _pre_execute_code(self):
+    async def _pre_execute_code(self):
+        # 通用的字体/rcParams 预设已在内核池中执行，这里只处理与任务相关的部分
+        work_dir = os.path.abspath(self.work_dir)
         init_code = (
             f"import os\n"
-            f"work_dir = r'{self.work_dir}'\n"
+            f"work_dir = r'{work_dir}'\n"
             f"os.makedirs(work_dir, exist_ok=True)\n"
             f"os.chdir(work_dir)\n"
             f"print('当前工作目录:', os.getcwd())\n"
-            # Matplotlib 中文与负号支持；并尽量动态注册常见中文字体
-            f"import matplotlib as mpl\n"
-            f"import matplotlib.pyplot as plt\n"
             f"from matplotlib import font_manager as fm\n"
-            # 动态注册常见字体文件（存在才添加）
-            f"_font_files = [\n"
-            f"    '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',\n"
-            f"    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',\n"
-            f"    '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',\n"
-            f"    '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',\n"
-            f"    '/usr/share/fonts/opentype/noto/NotoSerifCJK-Regular.ttc',\n"
-            f"]\n"
-            f"for _f in _font_files:\n"
-            f"    try:\n"
-            f"        if os.path.exists(_f):\n"
-            f"            fm.fontManager.addfont(_f)\n"
-            f"    except Exception as _e:\n"
-            f"        pass\n"
             # 额外扫描工作目录下 fonts/ 目录中的自带字体
             f"_user_font_dir = os.path.join(work_dir, 'fonts')\n"
             f"if os.path.isdir(_user_font_dir):\n"
@@ -73,16 +68,8 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
             f"                    fm.fontManager.addfont(_p)\n"
             f"                except Exception:\n"
             f"                    pass\n"
-            # 设定优先字体族（与上面注册的字体家族名对应）
-            f"plt.rcParams['font.sans-serif'] = [\n"
-            f"    'Noto Sans CJK SC', 'WenQuanYi Zen Hei', 'WenQuanYi Micro Hei',\n"
-            f"    'SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB',\n"
-            f"    'Source Han Sans SC', 'DejaVu Sans', 'sans-serif'\n"
-            f"]\n"
-            f"plt.rcParams['font.family'] = 'sans-serif'\n"
-            f"plt.rcParams['axes.unicode_minus'] = False\n"
         )
-        self.execute_code_(init_code)
+        await self.execute_code_(init_code)
 
     async def execute_code(self, code: str) -> tuple[str, bool, str]:
         # 在执行前，屏蔽/注释掉特定样式设置语句，避免影响全局绘图配置
@@ -102,7 +89,7 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
         )
         # 执行 Python 代码
         logger.info("开始在本地执行代码...")
-        execution = self.execute_code_(code_to_run)
+        execution = await self.execute_code_(code_to_run)
 
         # 若检测到缺失模块或 pip 安装失败，尝试自动安装后重试一次
         missing_mod = self._extract_missing_module(execution)
@@ -123,7 +110,7 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
                     SystemMessage(content=f"已安装 {pkg_name}，正在重试执行代码"),
                 )
                 # 覆盖之前的执行结果，进入正常处理流程
-                execution = self.execute_code_(code_to_run)
+                execution = await self.execute_code_(code_to_run)
             else:
                 logger.error(f"自动安装 {pkg_name} 失败: {install_log}")
                 await redis_manager.publish_message(
@@ -328,7 +315,7 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
             f"subprocess.check_call([sys.executable, '-m', 'pip', 'install', '{pkg_name}'])\n"
             f"print('Installed {pkg_name}')\n"
         )
-        result = self.execute_code_(install_code)
+        result = await self.execute_code_(install_code)
         # 只要没有 error 标记即视为成功
         for mark, out_str in result:
             if mark == "error":
@@ -336,25 +323,33 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
         log = "\n".join(f"{m}: {s}" for m, s in result)
         return True, log
 
-    def execute_code_(self, code) -> list[tuple[str, str]]:
+    async def execute_code_(self, code) -> list[tuple[str, str]]:
+        """在内核中执行代码并收集 iopub 输出
+
+        使用 AsyncKernelClient 异步等待 iopub 消息，执行期间不会阻塞事件循环，
+        其他任务、WebSocket 与 REST 请求可以正常调度。
+        """
         msg_id = self.kc.execute(code)
         logger.info(f"执行代码: {code}")
         # Get the output of the code
         msg_list = []
         while True:
             try:
-                iopub_msg = self.kc.get_iopub_msg(timeout=1)
-                msg_list.append(iopub_msg)
-                if (
-                    iopub_msg["msg_type"] == "status"
-                    and iopub_msg["content"].get("execution_state") == "idle"
-                ):
-                    break
-            except:
+                iopub_msg = await self.kc.get_iopub_msg(timeout=1)
+            except queue.Empty:
                 if self.interrupt_signal:
-                    self.km.interrupt_kernel()
+                    await self.km.interrupt_kernel()
                     self.interrupt_signal = False
                 continue
+            # 只收集本次执行产生的消息，忽略其他请求（如 kernel_info）的状态消息
+            if iopub_msg.get("parent_header", {}).get("msg_id") != msg_id:
+                continue
+            msg_list.append(iopub_msg)
+            if (
+                iopub_msg["msg_type"] == "status"
+                and iopub_msg["content"].get("execution_state") == "idle"
+            ):
+                break
 
         all_output: list[tuple[str, str]] = []
         for iopub_msg in msg_list:
@@ -400,14 +395,15 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
 
     async def get_created_images(self, section: str) -> list[str]:
         """获取新创建的图片列表"""
-        current_images = set()
-        files = os.listdir(self.work_dir)
-        for file in files:
-            if file.endswith((".png", ".jpg", ".jpeg")):
-                current_images.add(file)
+        current_images = self._list_images()
 
         # 计算新增的图片
         new_images = current_images - self.last_created_images
+        if self.image_prefix:
+            # 并行求解时其他小节也在同一目录生成图片，优先只取本小节前缀的图片
+            own_images = {f for f in new_images if f.startswith(self.image_prefix)}
+            if own_images:
+                new_images = own_images
 
         # 更新last_created_images为当前的图片集合
         self.last_created_images = current_images
@@ -416,22 +412,25 @@ class LocalCodeInterpreter(BaseCodeInterpreter):
         return list(new_images)  # 最后转换为list返回
 
     async def cleanup(self):
-        # 关闭内核
-        self.kc.shutdown()
+        # 生成内嵌图片的完整 notebook
+        try:
+            self.notebook_serializer.materialize()
+        except Exception as e:
+            logger.error(f"保存 notebook 失败: {str(e)}")
+        # 归还内核：由内核池决定回收复用或关闭
         logger.info("关闭内核")
-        self.km.shutdown_kernel()
+        await kernel_pool.release(self.km, self.kc)
 
     def send_interrupt_signal(self):
         self.interrupt_signal = True
 
-    def restart_jupyter_kernel(self):
+    async def restart_jupyter_kernel(self):
         """Restart the Jupyter kernel and recreate the work directory."""
-        self.kc.shutdown()
-        self.km, self.kc = jupyter_client.manager.start_new_kernel(
-            kernel_name="python3"
-        )
+        await kernel_pool.release(self.km, self.kc, reusable=False)
+        self.km, self.kc = await kernel_pool.acquire()
         self.interrupt_signal = False
         self._create_work_dir()
+        await self._pre_execute_code()
 
     def _create_work_dir(self):
         """Ensure the working directory exists after a restart."""
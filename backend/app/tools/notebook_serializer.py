@@ -1,14 +1,45 @@
 import nbformat
 from nbformat import v4 as nbf
 import ansi2html
+import asyncio
+import base64
+import copy
 import os
+import time
+from app.utils.log_util import logger
 
 
 class NotebookSerializer:
-    def __init__(self, work_dir=None, notebook_name="notebook.ipynb"):
+    """把代码执行过程记录为 .ipynb
+
+    写入采用脏标记 + 防抖：修改只标记为脏，距上次落盘超过 flush_interval
+    才整体写一次，否则安排一次延迟写入；分段切换与 cleanup 时强制落盘。
+    图片输出默认另存为 notebook_assets/ 下的文件，notebook 中只保留引用，
+    最终由 materialize() 生成内嵌图片的完整 .ipynb。
+    """
+
+    ASSETS_DIR = "notebook_assets"
+
+    def __init__(
+        self,
+        work_dir=None,
+        notebook_name="notebook.ipynb",
+        flush_interval: float = 2.0,
+        sidecar_images: bool = True,
+    ):
         self.nb = nbf.new_notebook()
         self.notebook_path = None
+        self.work_dir = work_dir
         self.initialized = True
+        self.flush_interval = flush_interval
+        self.sidecar_images = sidecar_images
+        self.dirty = False
+        self._last_flush = 0.0
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._image_count = 0
+        # 写入量统计
+        self.bytes_written = 0
+        self.flush_count = 0
         self.segmentation_output_content = {}  # 保存coder_agent 在 jupyter 中执行的 output 结果内容
         # {
         #     "eda": {
@@ -53,14 +84,84 @@ class NotebookSerializer:
         return html_text
 
     def write_to_notebook(self):
+        """立即把当前 notebook 整体写入文件"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
         if self.notebook_path:
-            with open(self.notebook_path, "w", encoding="utf-8") as f:
-                f.write(nbformat.writes(self.nb))
+            data = nbformat.writes(self.nb).encode("utf-8")
+            with open(self.notebook_path, "wb") as f:
+                f.write(data)
+            self.bytes_written += len(data)
+            self.flush_count += 1
+        self.dirty = False
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """有未保存的修改时落盘"""
+        if self.dirty:
+            self.write_to_notebook()
+
+    def _mark_dirty(self):
+        self.dirty = True
+        if self.flush_interval <= 0:
+            self.write_to_notebook()
+            return
+        elapsed = time.monotonic() - self._last_flush
+        if elapsed >= self.flush_interval:
+            self.write_to_notebook()
+        elif self._flush_handle is None:
+            # 防抖：在窗口结束时补写一次，保证最后的修改不会滞留在内存
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._flush_handle = loop.call_later(
+                self.flush_interval - elapsed, self._delayed_flush
+            )
+
+    def _delayed_flush(self):
+        self._flush_handle = None
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"写入 notebook 失败: {e}")
+
+    def materialize(self, path: str | None = None):
+        """生成完整的 .ipynb：把引用的图片文件重新内嵌到输出中
+
+        Args:
+            path: 输出路径，默认覆盖 notebook_path
+        """
+        path = path or self.notebook_path
+        if not path:
+            return
+        nb = copy.deepcopy(self.nb)
+        for cell in nb["cells"]:
+            for output in cell.get("outputs", []):
+                sidecar = output.get("metadata", {}).pop("sidecar", None)
+                if not sidecar:
+                    continue
+                try:
+                    with open(os.path.join(self.work_dir, sidecar["path"]), "rb") as f:
+                        image = base64.b64encode(f.read()).decode("ascii")
+                except OSError as e:
+                    logger.warning(f"读取 notebook 图片失败: {e}")
+                    continue
+                output["data"] = {sidecar["mime_type"]: image}
+        data = nbformat.writes(nb).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(data)
+        self.bytes_written += len(data)
+        self.flush_count += 1
+        if path == self.notebook_path:
+            self.nb = nb
+            self.dirty = False
 
     def add_code_cell_to_notebook(self, code):
         code_cell = nbf.new_code_cell(source=code)
         self.nb["cells"].append(code_cell)
-        self.write_to_notebook()
+        self._mark_dirty()
 
     def add_code_cell_output_to_notebook(self, output):
         """添加代码单元格输出
@@ -79,7 +180,7 @@ class NotebookSerializer:
             output_type="display_data", data={"text/html": html_content}
         )
         self.nb["cells"][-1]["outputs"].append(cell_output)
-        self.write_to_notebook()
+        self._mark_dirty()
 
     def add_code_cell_error_to_notebook(self, error):
         nbf_error_output = nbf.new_output(
@@ -89,21 +190,47 @@ class NotebookSerializer:
             traceback=[error],
         )
         self.nb["cells"][-1]["outputs"].append(nbf_error_output)
-        self.write_to_notebook()
+        self._mark_dirty()
 
     def add_image_to_notebook(self, image, mime_type):
-        image_output = nbf.new_output(
-            output_type="display_data", data={mime_type: image}
-        )
+        if self.sidecar_images and self.work_dir:
+            image_output = self._save_sidecar_image(image, mime_type)
+        else:
+            image_output = None
+        if image_output is None:
+            image_output = nbf.new_output(
+                output_type="display_data", data={mime_type: image}
+            )
         self.nb["cells"][-1]["outputs"].append(image_output)
-        self.write_to_notebook()
+        self._mark_dirty()
+
+    def _save_sidecar_image(self, image, mime_type):
+        """把 base64 图片写入 notebook_assets/，返回引用该文件的输出"""
+        ext = "jpg" if mime_type == "image/jpeg" else "png"
+        self._image_count += 1
+        name = f"image_{len(self.nb['cells'])}_{self._image_count}.{ext}"
+        rel_path = f"{self.ASSETS_DIR}/{name}"
+        try:
+            data = base64.b64decode(image)
+            os.makedirs(os.path.join(self.work_dir, self.ASSETS_DIR), exist_ok=True)
+            with open(os.path.join(self.work_dir, rel_path), "wb") as f:
+                f.write(data)
+        except Exception as e:
+            logger.warning(f"保存 notebook 图片失败，改为内嵌: {e}")
+            return None
+        self.bytes_written += len(data)
+        return nbf.new_output(
+            output_type="display_data",
+            data={"text/markdown": f"![image]({rel_path})"},
+            metadata={"sidecar": {"path": rel_path, "mime_type": mime_type}},
+        )
 
     def add_markdown_to_notebook(self, content, title=None):
         if title:
             content = "##### " + title + ":\n" + content
         markdown_cell = nbf.new_markdown_cell(content)
         self.nb["cells"].append(markdown_cell)
-        self.write_to_notebook()
+        self._mark_dirty()
 
     def add_markdown_segmentation_to_notebook(self, content, segmentation):
         """添加markdown分段并初始化对应的output内容存储
@@ -115,6 +242,8 @@ class NotebookSerializer:
         self.current_segmentation = segmentation
         # 初始化该分段的output内容
         self.segmentation_output_content[segmentation] = ""
+        # 分段边界：先把上一段的修改落盘
+        self.flush()
         self.add_markdown_to_notebook(content, segmentation)
 
     def get_notebook_output_content(self, segmentation):
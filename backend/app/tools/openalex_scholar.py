@@ -1,17 +1,91 @@
-import requests
+import asyncio
+import hashlib
+import json
+import random
+import httpx
 from typing import List, Dict, Any
+from app.config.setting import settings
+from app.core.llm.retry import retry_after
 from app.services.redis_manager import redis_manager
 from app.schemas.response import ScholarMessage
+from app.tools.literature_index import WORK_FIELDS, local_literature
+from app.utils.disk_cache import DiskCache
+from app.utils.log_util import logger
+
+SELECT_FIELDS = ",".join(WORK_FIELDS)
+# 限流与服务端错误时重试
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# 进程内共享的 OpenAlex HTTP 客户端（keep-alive 连接池），首次请求时创建
+_http_client: httpx.AsyncClient | None = None
+# 检索结果缓存：相同查询在不同小节、不同任务间直接复用
+_search_cache = DiskCache(
+    settings.OPENALEX_CACHE_DIR,
+    max_bytes=settings.OPENALEX_CACHE_MAX_MB * 1024 * 1024,
+    ttl=settings.OPENALEX_CACHE_TTL,
+)
+
+
+def _client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.OPENALEX_TIMEOUT, connect=5.0),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+def search_cache_metrics() -> dict:
+    return _search_cache.metrics()
+
+
+def _reconstruct_abstract(abstract_inverted_index: Dict[str, List[int]] | None) -> str:
+    if not abstract_inverted_index:
+        return ""
+    positions = abstract_inverted_index.values()
+    # 位置通常从 0 连续编号，按位置总数预分配单词槽位，一遍填入
+    words = [""] * sum(map(len, positions))
+    try:
+        for word, word_positions in abstract_inverted_index.items():
+            if len(word_positions) == 1:
+                words[word_positions[0]] = word
+            else:
+                for position in word_positions:
+                    words[position] = word
+    except IndexError:
+        # 位置不连续，按最大位置重新分配
+        words = [""] * (max(map(max, filter(None, positions))) + 1)
+        for word, word_positions in abstract_inverted_index.items():
+            for position in word_positions:
+                words[position] = word
+    return " ".join(words).strip()
+
+
+def reconstruct_abstracts(inverted_indexes: List[Dict[str, List[int]] | None]) -> List[str]:
+    """批量从 abstract_inverted_index 重建摘要文本，结果与逐篇重建一致
+
+    每篇只遍历一次倒排索引（旧实现先求最大位置再填充，共两遍），每篇一次 join。
+    """
+    return [_reconstruct_abstract(index) for index in inverted_indexes]
 
 
 class OpenAlexScholar:
-    def __init__(self, task_id: str, email: str = None):
+    def __init__(self, task_id: str, email: str = None, base_url: str | None = None):
         """Initialize OpenAlex client.
 
         Args:
             email: Optional email for better API service
+            base_url: API 地址，默认 settings.OPENALEX_BASE_URL
         """
-        self.base_url = "https://api.openalex.org"
+        self.base_url = (base_url or settings.OPENALEX_BASE_URL).rstrip("/")
         self.email = email
         self.task_id = task_id
 
@@ -30,24 +104,7 @@ class OpenAlexScholar:
         Returns:
             重建的摘要文本
         """
-        if not abstract_inverted_index:
-            return ""
-
-        # 创建一个足够大的空列表来存放所有单词
-        max_position = 0
-        for positions in abstract_inverted_index.values():
-            if positions and max(positions) > max_position:
-                max_position = max(positions)
-
-        words = [""] * (max_position + 1)
-
-        # 在正确的位置填入单词
-        for word, positions in abstract_inverted_index.items():
-            for position in positions:
-                words[position] = word
-
-        # 拼接单词形成文本
-        return " ".join(words).strip()
+        return reconstruct_abstracts([abstract_inverted_index])[0]
 
     async def search_papers(self, query: str, limit: int = 8) -> List[Dict[str, Any]]:
         """Search for papers using OpenAlex API.
@@ -59,57 +116,102 @@ class OpenAlexScholar:
         Returns:
             List of papers with their details
         """
-        # 构建基础 URL
-        base_url = self._get_request_url("works")
+        backend = settings.LITERATURE_BACKEND
+        if backend != "remote":
+            papers = await self._search_local(query, limit)
+            if papers or backend == "local-only":
+                await self._publish(query, papers or [])
+                return papers or []
+
+        if not self.email:
+            raise ValueError("配置OpenAlex邮箱获取访问文献权利")
 
-        # 设置请求参数，根据API支持的字段进行选择
         params = {
             "search": query,
             "per_page": limit,
-            "select": "id,title,display_name,authorships,cited_by_count,doi,publication_year,biblio,abstract_inverted_index",
+            "select": SELECT_FIELDS,
+            "mailto": self.email,
         }
-
-        # 添加邮箱参数到请求URL
-        if self.email:
-            params["mailto"] = self.email
+        cache_key = hashlib.sha256(
+            json.dumps([self.base_url, params], ensure_ascii=False).encode("utf-8")
+        ).hexdigest()
+        papers = await _search_cache.aget(cache_key)
+        if papers is None:
+            results = await self._request("works", params)
+            papers = self._parse_results(results)
+            await _search_cache.aset(cache_key, papers)
         else:
-            raise ValueError("配置OpenAlex邮箱获取访问文献权利")
+            logger.info(f"OpenAlex 缓存命中: {query}")
 
-        # 设置请求头，包含User-Agent和邮箱信息
-        headers = {
-            "User-Agent": f"OpenAlexScholar/1.0 (mailto:{self.email})"
-            if self.email
-            else "OpenAlexScholar/1.0"
-        }
+        await self._publish(query, papers)
+        return papers
 
-        # 让 requests 处理参数编码和 URL 构建
-        try:
-            print(f"请求 URL: {base_url} 参数: {params}")
-            response = requests.get(base_url, params=params, headers=headers)
-            print(f"响应状态: {response.status_code}")
-
-            response.raise_for_status()
-            results = response.json()
-        except requests.exceptions.HTTPError as e:
-            print(f"HTTP 错误: {e}")
-            if response.status_code == 403:
-                print(
-                    "提示: 403错误通常意味着您需要提供有效的邮箱地址或者遵循礼貌池（polite pool）规则"
-                )
-            if hasattr(response, "text"):
-                print(f"响应内容: {response.text}")
-            raise
-        except Exception as e:
-            print(f"请求出错: {e}")
-            raise
+    async def _search_local(self, query: str, limit: int) -> List[Dict[str, Any]] | None:
+        """查询本地文献索引，索引不可用或未命中返回 None/空列表"""
+        works = await asyncio.to_thread(
+            local_literature.search,
+            settings.LITERATURE_INDEX_DIR,
+            query,
+            limit,
+            settings.LITERATURE_MIN_SCORE,
+        )
+        if works:
+            logger.info(f"本地文献索引命中 {len(works)} 篇: {query}")
+            return self._parse_results({"results": works})
+        if settings.LITERATURE_BACKEND != "local-only":
+            logger.info(f"本地文献索引未命中，回退 OpenAlex: {query}")
+        return works
+
+    async def _publish(self, query: str, papers: List[Dict[str, Any]]):
+        await redis_manager.publish_message(
+            self.task_id,
+            ScholarMessage(
+                input={"query": query},
+                output=[paper["title"] for paper in papers],  # 只发送论文标题列表
+            ),
+        )
 
+    async def _request(self, endpoint: str, params: dict) -> dict:
+        """异步请求 OpenAlex，超时/连接错误/429/5xx 时按指数退避重试"""
+        url = self._get_request_url(endpoint)
+        # 设置请求头，包含User-Agent和邮箱信息
+        headers = {"User-Agent": f"OpenAlexScholar/1.0 (mailto:{self.email})"}
+        attempts = settings.OPENALEX_MAX_RETRIES + 1
+        for attempt in range(attempts):
+            try:
+                logger.info(f"请求 OpenAlex: {url} 参数: {params}")
+                response = await _client().get(url, params=params, headers=headers)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                if status == 403:
+                    logger.error(
+                        "OpenAlex 返回 403：通常意味着您需要提供有效的邮箱地址或者遵循礼貌池（polite pool）规则"
+                    )
+                if status not in RETRY_STATUS or attempt == attempts - 1:
+                    logger.error(f"OpenAlex HTTP 错误: {e}，响应内容: {e.response.text[:500]}")
+                    raise
+                delay = retry_after(e)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                if attempt == attempts - 1:
+                    logger.error(f"OpenAlex 请求出错: {e!r}")
+                    raise
+                delay = None
+            if delay is None:
+                delay = random.uniform(0, min(8.0, 0.5 * 2**attempt))
+            logger.warning(f"OpenAlex 请求失败，{delay:.1f}s 后第 {attempt + 1} 次重试")
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def _parse_results(self, results: dict) -> List[Dict[str, Any]]:
         papers = []
-        paper_titles = []  # 用于存储论文标题
-        for work in results.get("results", []):
-            # 从倒排索引中获取摘要
-            abstract = self._get_abstract_from_index(
-                work.get("abstract_inverted_index", {})
-            )
+        works = results.get("results", [])
+        # 从倒排索引中批量获取摘要
+        abstracts = reconstruct_abstracts(
+            [work.get("abstract_inverted_index") for work in works]
+        )
+        for work, abstract in zip(works, abstracts):
 
             # 获取作者信息
             authors = []
@@ -148,33 +250,33 @@ class OpenAlexScholar:
                 "citation_format": self._format_citation(work),
             }
             papers.append(paper)
-            paper_titles.append(paper["title"])  # 添加标题到列表
-
-        await redis_manager.publish_message(
-            self.task_id,
-            ScholarMessage(
-                input={"query": query},
-                output=paper_titles,  # 只发送论文标题列表
-            ),
-        )
-
         return papers
 
     def papers_to_str(self, papers: List[Dict[str, Any]]) -> str:
         """将文献列表转换为字符串"""
-        result = ""
+        separator = "=" * 80
+        # 逐段收集后一次 join，长字段直接放入列表，不经过中间字符串拷贝
+        parts = []
+        append = parts.append
         for paper in papers:
-            result += "\n" + "=" * 80
-            result += f"\n标题: {paper['title']}"
-            result += f"\n摘要: {paper['abstract']}"
-            result += "\n作者:"
+            append("\n")
+            append(separator)
+            append("\n标题: ")
+            append(str(paper["title"]))
+            append("\n摘要: ")
+            append(str(paper["abstract"]))
+            append("\n作者:")
             for author in paper["authors"]:
-                result += f"- {author['name']}"
-            result += f"\n引用次数: {paper['citations_count']}"
-            result += f"\n发表年份: {paper['publication_year']}"
-            result += f"\n引用格式:\n{paper['citation_format']}"
-            result += "=" * 80
-        return result
+                append("- ")
+                append(str(author["name"]))
+            append("\n引用次数: ")
+            append(str(paper["citations_count"]))
+            append("\n发表年份: ")
+            append(str(paper["publication_year"]))
+            append("\n引用格式:\n")
+            append(str(paper["citation_format"]))
+            append(separator)
+        return "".join(parts)
 
     def _format_citation(self, work: Dict[str, Any]) -> str:
         """Format citation in a readable format."""
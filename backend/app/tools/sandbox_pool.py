@@ -0,0 +1,240 @@
+import asyncio
+from typing import Any, Awaitable, Callable
+from app.config.setting import settings
+from app.tools.sandbox_sync import MANIFEST_NAME
+from app.utils.log_util import logger
+
+SANDBOX_HOME = "/home/user"
+
+# 与任务无关的绘图预设：注册沙箱内常见中文字体、设定 rcParams
+# 创建沙箱时执行一次，字体注册做了去重，回收后重复执行也不会累积
+SANDBOX_PREAMBLE = (
+    "import os\n"
+    "import matplotlib as mpl\n"
+    "import matplotlib.pyplot as plt\n"
+    "from matplotlib import font_manager as fm\n"
+    "plt.close('all')\n"
+    "_registered = {_e.fname for _e in fm.fontManager.ttflist}\n"
+    "_font_files = [\n"
+    "  '/usr/share/fonts/truetype/noto/NotoSansCJK-Regular.ttc',\n"
+    "  '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',\n"
+    "  '/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc',\n"
+    "  '/usr/share/fonts/truetype/wqy/wqy-microhei.ttc',\n"
+    "]\n"
+    "for _f in _font_files:\n"
+    "    try:\n"
+    "        if os.path.exists(_f) and _f not in _registered:\n"
+    "            fm.fontManager.addfont(_f)\n"
+    "    except Exception:\n"
+    "        pass\n"
+    "plt.rcParams['font.sans-serif'] = ['Noto Sans CJK SC', 'WenQuanYi Zen Hei', 'WenQuanYi Micro Hei', 'SimHei', 'Microsoft YaHei', 'PingFang SC', 'Hiragino Sans GB', 'Source Han Sans SC', 'DejaVu Sans', 'sans-serif']\n"
+    "plt.rcParams['font.family'] = 'sans-serif'\n"
+    "plt.rcParams['axes.unicode_minus'] = False\n"
+)
+
+
+def sandbox_home(sbx) -> str:
+    """沙箱的工作目录：E2B 为 /home/user，本地替身为其临时目录"""
+    return getattr(sbx, "home_dir", SANDBOX_HOME)
+
+
+def user_fonts_code(home: str) -> str:
+    """注册任务上传到 {home}/fonts 的字体"""
+    return (
+        "import os\n"
+        "from matplotlib import font_manager as fm\n"
+        "_registered = {_e.fname for _e in fm.fontManager.ttflist}\n"
+        f"_user_font_dir = {home + '/fonts'!r}\n"
+        "if os.path.isdir(_user_font_dir):\n"
+        "    for _root, _dirs, _files in os.walk(_user_font_dir):\n"
+        "        for _fn in _files:\n"
+        "            _p = os.path.join(_root, _fn)\n"
+        "            if _fn.lower().endswith(('.ttf', '.ttc', '.otf')) and _p not in _registered:\n"
+        "                try:\n"
+        "                    fm.fontManager.addfont(_p)\n"
+        "                except Exception:\n"
+        "                    pass\n"
+    )
+
+
+def reset_code(home: str) -> str:
+    """清空命名空间，删除上个任务生成的文件；同步清单记录的已上传数据集与字体保留，供下次上传跳过"""
+    return (
+        "%reset -f\n"
+        "import json, os, shutil\n"
+        f"_home = {home!r}\n"
+        "os.chdir(_home)\n"
+        f"_manifest = os.path.join(_home, {MANIFEST_NAME!r})\n"
+        "_keep = set(json.load(open(_manifest))) if os.path.exists(_manifest) else set()\n"
+        "for _e in os.scandir(_home):\n"
+        "    if _e.name.startswith('.') or _e.name == 'fonts' or _e.path in _keep:\n"
+        "        continue\n"
+        "    if _e.is_dir(follow_symlinks=False):\n"
+        "        shutil.rmtree(_e.path, ignore_errors=True)\n"
+        "    else:\n"
+        "        os.remove(_e.path)\n"
+    )
+
+
+async def _create_e2b_sandbox(timeout: int):
+    from e2b_code_interpreter import AsyncSandbox
+
+    return await AsyncSandbox.create(api_key=settings.E2B_API_KEY, timeout=timeout)
+
+
+class SandboxPool:
+    """预创建的 E2B 沙箱池
+
+    常驻 N 个已执行绘图预设的沙箱，任务启动时直接领取，省去沙箱冷启动与字体扫描。
+    归还时按配置回收（清空命名空间与生成文件后放回池中，仅适合单租户部署）或直接销毁，
+    池会在后台补足到目标数量。回收模式下租出的沙箱归还后会放回池中，补足时也计入目标数，
+    不会提前创建替补而使归还的沙箱无处可放。
+    """
+
+    def __init__(
+        self,
+        size: int | None = None,
+        recycle: bool | None = None,
+        factory: Callable[[int], Awaitable[Any]] | None = None,
+    ):
+        self.size = settings.E2B_POOL_SIZE if size is None else size
+        self.recycle = settings.E2B_POOL_RECYCLE if recycle is None else recycle
+        self.factory = factory or _create_e2b_sandbox
+        self._idle: list[Any] = []
+        self._starting = 0
+        self._leased = 0
+        self._refill_task: asyncio.Task | None = None
+        self._closed = False
+        # 指标
+        self.hits = 0
+        self.misses = 0
+        self.recycled = 0
+        self.discarded = 0
+
+    async def start(self):
+        """启动后台预热"""
+        self._closed = False
+        if self.size > 0:
+            logger.info(f"预热沙箱池，目标数量: {self.size}")
+            self._schedule_refill()
+
+    async def acquire(self, timeout: int | None = None):
+        """领取一个已执行预设的沙箱，池为空时现场创建；timeout 为本次租用的沙箱存活时间（秒）"""
+        timeout = timeout or settings.E2B_SANDBOX_TIMEOUT
+        while self._idle:
+            sbx = self._idle.pop()
+            try:
+                if await sbx.is_running():
+                    # 重新计算存活时间，避免在池中等待的时间占用任务的额度
+                    await sbx.set_timeout(timeout)
+                    self.hits += 1
+                    self._leased += 1
+                    self._schedule_refill()
+                    logger.info("从沙箱池领取预热沙箱")
+                    return sbx
+            except Exception as e:
+                logger.warning(f"检查池中沙箱失败: {e}")
+            await self._kill(sbx)
+
+        self.misses += 1
+        # 先计入租出数，现场创建期间的后台补足不会把它当作空缺
+        self._leased += 1
+        self._schedule_refill()
+        try:
+            return await self._create(timeout)
+        except BaseException:
+            self._leased -= 1
+            raise
+
+    async def release(self, sbx, reusable: bool = True):
+        """归还沙箱：可回收则重置后放回池中，否则销毁并在后台补足"""
+        self._leased = max(0, self._leased - 1)
+        if reusable and self.recycle and not self._closed and len(self._idle) < self.size:
+            try:
+                if await sbx.is_running():
+                    await self._reset(sbx)
+                    self._idle.append(sbx)
+                    self.recycled += 1
+                    logger.info("沙箱已重置并放回沙箱池")
+                    return
+            except Exception as e:
+                logger.warning(f"重置沙箱失败，改为销毁: {e}")
+
+        await self._kill(sbx)
+        self.discarded += 1
+        self._schedule_refill()
+
+    async def shutdown(self):
+        """销毁池中所有空闲沙箱"""
+        self._closed = True
+        if self._refill_task and not self._refill_task.done():
+            self._refill_task.cancel()
+        idle, self._idle = self._idle, []
+        for sbx in idle:
+            await self._kill(sbx)
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "idle": len(self._idle),
+            "starting": self._starting,
+            "leased": self._leased,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "recycled": self.recycled,
+            "discarded": self.discarded,
+        }
+
+    def _below_target(self) -> bool:
+        held = len(self._idle) + self._starting
+        if self.recycle:
+            held += self._leased
+        return held < self.size
+
+    def _schedule_refill(self):
+        if self._closed or self.size <= 0:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self):
+        while not self._closed and self._below_target():
+            self._starting += 1
+            try:
+                sbx = await self._create(settings.E2B_SANDBOX_TIMEOUT)
+            except Exception as e:
+                logger.error(f"预热沙箱失败: {e}")
+                return
+            finally:
+                self._starting -= 1
+            # 创建期间可能已有回收的沙箱补位，多余的直接销毁
+            if self._closed or not self._below_target():
+                await self._kill(sbx)
+                return
+            self._idle.append(sbx)
+
+    async def _create(self, timeout: int):
+        sbx = await self.factory(timeout)
+        execution = await sbx.run_code(SANDBOX_PREAMBLE)
+        if execution.error:
+            logger.warning(f"沙箱预设代码执行出错: {execution.error.value}")
+        return sbx
+
+    async def _reset(self, sbx):
+        execution = await sbx.run_code(reset_code(sandbox_home(sbx)))
+        if execution.error:
+            raise RuntimeError(f"{execution.error.name}: {execution.error.value}")
+        execution = await sbx.run_code(SANDBOX_PREAMBLE)
+        if execution.error:
+            logger.warning(f"沙箱预设代码执行出错: {execution.error.value}")
+
+    async def _kill(self, sbx):
+        try:
+            await sbx.kill()
+        except Exception as e:
+            logger.warning(f"销毁沙箱失败: {e}")
+
+
+sandbox_pool = SandboxPool()
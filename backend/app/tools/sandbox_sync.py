@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import json
+import os
+import posixpath
+from collections import Counter
+from e2b import FileType
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+UPLOAD_EXTENSIONS = (".csv", ".xlsx", ".ttf", ".ttc", ".otf")
+FONT_EXTENSIONS = (".ttf", ".ttc", ".otf")
+MANIFEST_NAME = ".mma_sync_manifest.json"
+# 沙箱自带的文件与清单本身不同步回本地
+SKIP_NAMES = {".bash_logout", ".bashrc", ".profile", MANIFEST_NAME}
+CHUNK_SIZE = 1024 * 1024
+
+# 本地文件哈希缓存：(路径, 大小, 修改时间) -> sha256，同一数据集在多个任务间只计算一次
+_hash_cache: dict[tuple[str, int, int], str] = {}
+# 所有同步实例的累计指标
+_totals: Counter = Counter()
+
+
+def file_sha256(path: str) -> str:
+    """分块计算文件的 sha256，按 (大小, 修改时间) 缓存"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _hash_cache.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _hash_cache[key] = digest
+    return digest
+
+
+def sync_metrics() -> dict:
+    return dict(_totals)
+
+
+def _signature(entry) -> list:
+    modified = getattr(entry, "modified_time", None)
+    return [entry.size, modified.isoformat() if modified else None]
+
+
+class SandboxSync:
+    """本地工作目录与 E2B 沙箱之间的增量文件同步
+
+    上传：数据集与字体并发上传（信号量限制并发数），大文件以文件对象流式上传；
+    沙箱内的清单文件记录每个已上传文件的 sha256 与上传后的 (大小, 修改时间)，
+    复用的沙箱中内容未变且未被改写的文件直接跳过。
+    下载：上传完成后记录沙箱文件的基线，之后每次只下载新增或改动的文件（图片、清洗后的 CSV 等），
+    大文件分块流式写入本地。
+    """
+
+    def __init__(
+        self,
+        files,
+        work_dir: str,
+        remote_dir: str = "/home/user",
+        concurrency: int | None = None,
+        stream_threshold: int | None = None,
+    ):
+        self.files = files  # AsyncSandbox.files
+        self.work_dir = work_dir
+        self.remote_dir = remote_dir.rstrip("/")
+        self.concurrency = concurrency or settings.E2B_SYNC_CONCURRENCY
+        self.stream_threshold = (
+            stream_threshold
+            if stream_threshold is not None
+            else settings.E2B_SYNC_STREAM_MB * 1024 * 1024
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._manifest: dict[str, dict] = {}
+        # 沙箱顶层文件名 -> 已同步时的 (大小, 修改时间)
+        self._seen: dict[str, list] = {}
+        self._download_lock = asyncio.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return f"{self.remote_dir}/{MANIFEST_NAME}"
+
+    def remote_path(self, name: str) -> str:
+        # 字体文件放入 fonts 目录，由预执行代码注册到 matplotlib
+        if name.lower().endswith(FONT_EXTENSIONS):
+            return f"{self.remote_dir}/fonts/{name}"
+        return f"{self.remote_dir}/{name}"
+
+    async def upload(self) -> list[str]:
+        """上传工作目录中的数据集与字体，返回实际上传的文件名"""
+        names = sorted(
+            name
+            for name in os.listdir(self.work_dir)
+            if name.endswith(UPLOAD_EXTENSIONS)
+            and os.path.isfile(os.path.join(self.work_dir, name))
+        )
+        logger.info(f"工作目录中的文件列表: {names}")
+        self._manifest = await self._load_manifest()
+        remote = await self._list_signatures(depth=2)
+        digests = await asyncio.gather(
+            *(asyncio.to_thread(file_sha256, os.path.join(self.work_dir, n)) for n in names)
+        )
+
+        pending = []
+        for name, digest in zip(names, digests):
+            path = self.remote_path(name)
+            entry = self._manifest.get(path)
+            if entry and entry["sha256"] == digest and remote.get(path) == entry["signature"]:
+                _totals["upload_skipped"] += 1
+                continue
+            pending.append((name, path, digest))
+        if len(pending) < len(names):
+            logger.info(f"沙箱中已有相同内容，跳过上传 {len(names) - len(pending)} 个文件")
+
+        await asyncio.gather(*(self._upload_one(name, path) for name, path, _ in pending))
+
+        remote = await self._list_signatures(depth=2)
+        if pending:
+            for _, path, digest in pending:
+                self._manifest[path] = {"sha256": digest, "signature": remote.get(path)}
+            await self.files.write(self.manifest_path, json.dumps(self._manifest))
+        # 上传完成后的沙箱文件作为下载基线
+        self._seen = {
+            posixpath.basename(path): signature
+            for path, signature in remote.items()
+            if posixpath.dirname(path) == self.remote_dir
+        }
+        return [name for name, _, _ in pending]
+
+    async def _upload_one(self, name: str, path: str):
+        local_path = os.path.join(self.work_dir, name)
+        size = os.path.getsize(local_path)
+        async with self._semaphore:
+            try:
+                if size >= self.stream_threshold:
+                    with open(local_path, "rb") as f:
+                        await self.files.write(path, f)
+                else:
+                    content = await asyncio.to_thread(_read_bytes, local_path)
+                    await self.files.write(path, content)
+            except Exception as e:
+                logger.error(f"上传文件 {name} 失败: {str(e)}")
+                raise
+        _totals["uploaded"] += 1
+        _totals["bytes_uploaded"] += size
+        logger.info(f"成功上传文件到沙箱: {name}")
+
+    async def download(self) -> list[str]:
+        """下载沙箱顶层目录中新增或改动的文件，返回下载的文件名"""
+        async with self._download_lock:
+            entries = await self.files.list(self.remote_dir)
+            changed = [
+                entry
+                for entry in entries
+                if entry.type == FileType.FILE
+                and entry.name not in SKIP_NAMES
+                and self._seen.get(entry.name) != _signature(entry)
+            ]
+            _totals["download_unchanged"] += len(entries) - len(changed)
+            if not changed:
+                return []
+            os.makedirs(self.work_dir, exist_ok=True)
+            results = await asyncio.gather(
+                *(self._download_one(entry) for entry in changed), return_exceptions=True
+            )
+            downloaded = []
+            for entry, result in zip(changed, results):
+                if isinstance(result, Exception):
+                    logger.error(f"同步文件 {entry.name} 失败: {str(result)}")
+                    continue
+                self._seen[entry.name] = _signature(entry)
+                downloaded.append(entry.name)
+            return downloaded
+
+    async def _download_one(self, entry):
+        local_path = os.path.join(self.work_dir, entry.name)
+        tmp_path = f"{local_path}.part"
+        async with self._semaphore:
+            try:
+                if entry.size >= self.stream_threshold:
+                    stream = await self.files.read(entry.path, format="stream")
+                    try:
+                        with open(tmp_path, "wb") as f:
+                            async for chunk in stream:
+                                await asyncio.to_thread(f.write, chunk)
+                    finally:
+                        if hasattr(stream, "aclose"):
+                            await stream.aclose()
+                else:
+                    content = await self.files.read(entry.path, format="bytes")
+                    await asyncio.to_thread(_write_bytes, tmp_path, content)
+                os.replace(tmp_path, local_path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        _totals["downloaded"] += 1
+        _totals["bytes_downloaded"] += entry.size
+        logger.info(f"同步文件: {entry.name}")
+
+    async def _load_manifest(self) -> dict[str, dict]:
+        try:
+            return json.loads(await self.files.read(self.manifest_path))
+        except Exception:
+            # 新沙箱没有清单
+            return {}
+
+    async def _list_signatures(self, depth: int) -> dict[str, list]:
+        entries = await self.files.list(self.remote_dir, depth=depth)
+        return {e.path: _signature(e) for e in entries if e.type == FileType.FILE}
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _write_bytes(path: str, content: bytes):
+    with open(path, "wb") as f:
+        f.write(content)
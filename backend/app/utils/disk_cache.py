@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any
+from app.utils.log_util import logger
+
+
+class DiskCache:
+    """本地磁盘 JSON 缓存，按总大小做 LRU 淘汰，可选过期时间
+
+    每个键一个文件（按键前两位分目录），写入先写临时文件再原子替换。
+    LRU 顺序保存在内存中，启动时按文件修改时间重建；命中时更新修改时间，
+    重启后仍能保持近似的 LRU 顺序。
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        max_bytes: int,
+        ttl: float | None = None,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._index: OrderedDict[str, int] | None = None  # key -> 文件大小
+        self._total = 0
+        self._lock = threading.Lock()
+        # 指标
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Any | None:
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"缓存文件损坏，已删除: {path}: {e}")
+            self.delete(key)
+            self.misses += 1
+            return None
+
+        if self.ttl is not None and time.time() - entry.get("created", 0) > self.ttl:
+            self.delete(key)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        with self._lock:
+            index = self._load_index()
+            if key in index:
+                index.move_to_end(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry.get("value")
+
+    def set(self, key: str, value: Any):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(
+            {"created": time.time(), "value": value}, ensure_ascii=False
+        ).encode("utf-8")
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.writes += 1
+
+        with self._lock:
+            index = self._load_index()
+            self._total -= index.pop(key, 0)
+            index[key] = len(data)
+            self._total += len(data)
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            index = self._load_index()
+            self._total -= index.pop(key, 0)
+        self.path(key).unlink(missing_ok=True)
+
+    async def aget(self, key: str) -> Any | None:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any):
+        await asyncio.to_thread(self.set, key, value)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            index = self._load_index()
+            entries = len(index)
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self._total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def _load_index(self) -> OrderedDict[str, int]:
+        # 需持有 self._lock
+        if self._index is not None:
+            return self._index
+        files = []
+        if self.directory.exists():
+            for path in self.directory.glob("*/*.json"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, path.stem, stat.st_size))
+        files.sort()
+        self._index = OrderedDict((key, size) for _, key, size in files)
+        self._total = sum(size for _, _, size in files)
+        return self._index
+
+    def _evict(self):
+        # 需持有 self._lock
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            self.path(key).unlink(missing_ok=True)
+            self.evictions += 1
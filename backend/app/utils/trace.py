@@ -0,0 +1,53 @@
+from app.config.setting import settings
+from app.utils.log_util import logger
+
+
+def _parse_tasks(value: str | None) -> set[str]:
+    return {item.strip() for item in (value or "").split(",") if item.strip()}
+
+
+class Tracer:
+    """按任务开关的调试追踪，替代热路径上的 ic(f"...")
+
+    未开启时调用只做一次集合查找：消息使用 % 占位符，参数不做格式化，
+    也不检查调用栈。参数本身需要较多计算时，先用 enabled() 判断：
+
+        trace(self.task_id, "添加消息: role=%s", msg.get("role"))
+        if trace.enabled(self.task_id):
+            trace(self.task_id, "请求: %s", expensive_dump())
+
+    初始开启的任务由 settings.TRACE_TASKS 指定（逗号分隔，"*" 表示全部），
+    运行时可通过 /trace 接口开关。
+    """
+
+    ALL = "*"
+
+    def __init__(self, tasks: str | None = None):
+        self._tasks = _parse_tasks(settings.TRACE_TASKS if tasks is None else tasks)
+
+    def enabled(self, task_id: str | None) -> bool:
+        tasks = self._tasks
+        return bool(tasks) and (task_id in tasks or self.ALL in tasks)
+
+    def __call__(self, task_id: str | None, msg: str, *args):
+        if not self._tasks or (task_id not in self._tasks and self.ALL not in self._tasks):
+            return
+        if args:
+            msg = msg % args
+        logger.opt(depth=1).debug("[trace {}] {}", task_id, msg)
+
+    def enable(self, task_id: str = ALL):
+        self._tasks.add(task_id)
+
+    def disable(self, task_id: str | None = None):
+        """关闭某个任务的追踪；不指定任务时全部关闭"""
+        if task_id is None:
+            self._tasks.clear()
+        else:
+            self._tasks.discard(task_id)
+
+    def tasks(self) -> list[str]:
+        return sorted(self._tasks)
+
+
+trace = Tracer()
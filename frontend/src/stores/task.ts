@@ -6,6 +6,9 @@ import type { Message, CoderMessage, WriterMessage, UserMessage, ModelerMessage,
 // import messageData from '@/test/20250524-115938-d4c84576.json'
 import { AgentType } from '@/utils/enum'
 
+// 与后端 ws_hub.RESYNC_CLOSE_CODE 一致
+const RESYNC_CLOSE_CODE = 4409
+
 export const useTaskStore = defineStore('task', () => {
   // 初始化时直接加载测试数据，确保页面首次渲染时有数据
   // const messages = ref<Message[]>(messageData as Message[])
@@ -38,18 +41,63 @@ export const useTaskStore = defineStore('task', () => {
     }
 
     // 2) 再建立 WebSocket，若任务仍在运行可继续接收增量消息
-    ws = new TaskWebSocket(wsUrl, (data) => {
-      console.log(data)
-      messages.value.push(data)
-    })
+    openWebSocket(wsUrl)
     // 初始化测试数据（已在上面初始化，这里可以注释掉）
     // messages.value = messageData as Message[]
-    ws.connect()
+  }
+
+  // 带上最后一条消息的 stream_id，后端只补发其后的消息
+  function openWebSocket(wsUrl: string) {
+    const lastId = [...messages.value].reverse().find(m => (m as any).stream_id)?.stream_id
+    const url = lastId ? `${wsUrl}?last_id=${encodeURIComponent(lastId)}` : wsUrl
+    const socket = new TaskWebSocket(
+      url,
+      (data) => {
+        console.log(data)
+        mergeMessage(data)
+      },
+      (event) => {
+        // 后端发送队列溢出：重连并从事件流补回缺失的消息
+        if (event.code === RESYNC_CLOSE_CODE && ws === socket) {
+          openWebSocket(wsUrl)
+        }
+      },
+    )
+    ws = socket
+    socket.connect()
+  }
+
+  // 合并消息：流式片段按 id 追加到同一条消息，最终完整消息覆盖片段
+  function mergeMessage(data: any) {
+    // 正在生成的消息通常在末尾，从后往前查找
+    let index = -1
+    if (data?.id) {
+      for (let i = messages.value.length - 1; i >= 0; i--) {
+        if (messages.value[i].id === data.id) {
+          index = i
+          break
+        }
+      }
+    }
+    if (index === -1) {
+      messages.value.push(data)
+      return
+    }
+    const existing = messages.value[index] as any
+    if (data.streaming) {
+      // 已收到完整消息后迟到的片段直接忽略
+      if (!existing.streaming) return
+      existing.content = data.delta_offset ? (existing.content || '') + (data.content || '') : data.content
+    } else {
+      messages.value[index] = data
+    }
   }
 
   // 关闭 WebSocket
   function closeWebSocket() {
-    ws?.close()
+    const socket = ws
+    ws = null
+    socket?.close()
   }
 
   function addUserMessage(content: string) {
@@ -9,6 +9,8 @@ export interface BaseMessage {
   id: string;
   msg_type: 'system' | 'agent' | 'user' | 'tool';
   content?: string | null;
+  // 后端事件流中的位置，用于 WebSocket 断线续传
+  stream_id?: string;
 }
 
 export interface ToolMessage extends BaseMessage {
@@ -38,6 +40,9 @@ export interface UserMessage extends BaseMessage {
 export interface AgentMessage extends BaseMessage {
   msg_type: 'agent';
   agent_type: AgentType;
+  // 流式输出的增量片段：content 为新增文本，delta_offset 为 0 表示重新开始
+  streaming?: boolean;
+  delta_offset?: number | null;
 }
 
 export interface ModelerMessage extends AgentMessage {
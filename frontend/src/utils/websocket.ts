@@ -1,13 +1,16 @@
 type MessageHandler = (data: any) => void;
+type CloseHandler = (event: CloseEvent) => void;
 
 export class TaskWebSocket {
   private socket: WebSocket | null = null;
   private url: string;
   private onMessage: MessageHandler;
+  private onClose?: CloseHandler;
 
-  constructor(url: string, onMessage: MessageHandler) {
+  constructor(url: string, onMessage: MessageHandler, onClose?: CloseHandler) {
     this.url = url;
     this.onMessage = onMessage;
+    this.onClose = onClose;
   }
 
   connect() {
@@ -21,6 +24,7 @@ export class TaskWebSocket {
     };
     this.socket.onclose = (event) => {
       console.log('WebSocket 连接已关闭', event.code, event.reason);
+      this.onClose?.(event);
     };
     this.socket.onerror = (error) => {
       console.error('WebSocket 错误:', error);